@@ -1,17 +1,32 @@
+from __future__ import annotations
+
+import importlib.util
 import json
 import os
+import re
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Any, Dict, List
-from json_repair import repair_json
-
-from langchain_core.tools import tool
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
-from langchain_openai import ChatOpenAI
-from langgraph.graph import END, StateGraph, MessagesState
-from langgraph.prebuilt import ToolNode
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
 from system_promt import SYSTEM_PROMPT
+from project_summary import ProjectAnalysis, summarize_scan
+from project_watcher import ProjectWatcher
+from file_reader import read_file_range
+from file_cache import CONTENT_CACHE
+from code_search import CodeSearchIndex
+from trigram_index import TrigramIndex
+from symbol_index import SymbolIndex
+from instrumentation import TRACER, default_spans_path, format_summary, token_usage
+from file_editor import EditJournal, atomic_write, default_journal_dir, edit_files
+from tool_call_stream import ToolCallStream
+
+# LangChain, LangGraph и клиент API импортируются в load_runtime: вместе это секунды до первого приглашения
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langgraph.graph import MessagesState
 
 load_dotenv()
 
@@ -19,108 +34,83 @@ YOU_COLOR = "\u001b[94m"
 ASSISTANT_COLOR = "\u001b[93m"
 RESET_COLOR = "\u001b[0m"
 
+# Дополнительные исключения для сканера проекта через запятую, например "dist/,*.log"
+SCAN_EXCLUDE = [p.strip() for p in os.getenv("AGENT_SCAN_EXCLUDE", "").split(",") if p.strip()]
+# Потоки для обхода проекта (имеет смысл на NFS и других медленных ФС) и предельная глубина
+SCAN_WORKERS = int(os.getenv("AGENT_SCAN_WORKERS", "1"))
+SCAN_MAX_DEPTH = int(os.getenv("AGENT_SCAN_MAX_DEPTH", "0")) or None
+# Сколько секунд первый запрос ждет фоновый анализ проекта; не дождался - модели уходит частичное описание
+SCAN_WAIT = float(os.getenv("AGENT_SCAN_WAIT", "2"))
+# Наблюдение за файлами проекта после запуска: "auto" - inotify или опрос, "poll" - только опрос, "0" - выключено
+WATCH_MODE = os.getenv("AGENT_WATCH", "auto")
+# Период опроса mtime директорий, когда inotify недоступен
+WATCH_POLL_INTERVAL = float(os.getenv("AGENT_WATCH_POLL", "2"))
+# Бюджет токенов на описание проекта в системном промпте
+PROJECT_CONTEXT_TOKENS = int(os.getenv("AGENT_PROJECT_CONTEXT_TOKENS", "4000"))
+# Размер общего кэша содержимого файлов для read_file
+CONTENT_CACHE.max_bytes = int(os.getenv("AGENT_READ_CACHE_MB", "32")) * 1024 * 1024
+# Сколько вызовов инструментов одного шага может выполняться одновременно
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+# Печатать ответ модели по мере генерации
+STREAM_OUTPUT = os.getenv("AGENT_STREAM", "1") != "0"
+# Бюджет токенов на историю в одном запросе к модели (0 - без ограничения) и сколько последних ходов не сжимать
+CONTEXT_TOKENS = int(os.getenv("AGENT_CONTEXT_TOKENS", "16000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("AGENT_CONTEXT_KEEP_TURNS", "3"))
+# Процессы для построения векторного индекса (0 - по числу ядер)
+INDEX_WORKERS = int(os.getenv("AGENT_INDEX_WORKERS", "0")) or None
+# Файл с чекпоинтами сессий (по умолчанию .agent_cache/checkpoints.sqlite, "0" - не сохранять)
+CHECKPOINT_DB = os.getenv("AGENT_CHECKPOINT_DB", "")
+# id сессии для продолжения; "last" - последняя сохраненная
+SESSION_ID = os.getenv("AGENT_SESSION", "")
+# JSONL-файл замеров узлов, модели и инструментов (по умолчанию .agent_cache/spans.jsonl, "0" - только сводка)
+SPANS_FILE = os.getenv("AGENT_SPANS_FILE", "")
+TRACER.configure(None if SPANS_FILE == "0" else Path(SPANS_FILE) if SPANS_FILE else default_spans_path())
+
 def resolve_abs_path(path_str: str) -> Path:
     path = Path(path_str).expanduser()
     if not path.is_absolute():
         path = (Path.cwd() / path).resolve()
     return path
 
-def analyze_project_structure(root_path: Path = None) -> str:
-    """Анализирует структуру проекта и создает контекстное описание"""
-    if root_path is None:
-        root_path = Path.cwd()
-    
-    project_context = []
-    project_context.append(f"=== СТРУКТУРА ПРОЕКТА: {root_path.name} ===\n")
-    
-    def scan_directory(directory: Path, prefix: str = "", is_last: bool = True):
-        if directory.name.startswith('.') or directory.name == '__pycache__':
-            return
-        
-        # Добавляем текущую директорию
-        connector = "└── " if is_last else "├── "
-        project_context.append(f"{prefix}{connector}{directory.name}/")
-        
-        # Получаем все элементы в директории
-        try:
-            items = list(directory.iterdir())
-        except PermissionError:
-            project_context.append(f"{prefix}{'    ' if is_last else '│   '}[Нет доступа]")
-            return
-        
-        # Сортируем: сначала директории, потом файлы
-        dirs = [item for item in items if item.is_dir()]
-        files = [item for item in items if item.is_file()]
-        
-        dirs.sort(key=lambda x: x.name.lower())
-        files.sort(key=lambda x: x.name.lower())
-        
-        all_items = dirs + files
-        
-        for i, item in enumerate(all_items):
-            is_last_item = (i == len(all_items) - 1)
-            extension = "    " if is_last else "│   "
-            
-            if item.is_dir():
-                scan_directory(item, prefix + extension, is_last_item)
-            else:
-                # Для файлов показываем расширение и размер
-                file_size = item.stat().st_size if item.exists() else 0
-                size_str = f" ({file_size} bytes)" if file_size > 0 else ""
-                file_connector = "└── " if is_last_item else "├── "
-                project_context.append(f"{prefix}{extension}{file_connector}{item.name}{size_str}")
-    
-    # Начинаем сканирование с корневой директории
-    scan_directory(root_path)
-    
-    # Добавляем информацию о типах файлов
-    file_types = {}
-    total_files = 0
-    
-    for file_path in root_path.rglob('*'):
-        if file_path.is_file() and not str(file_path).startswith('.') and '__pycache__' not in str(file_path):
-            suffix = file_path.suffix or 'no_extension'
-            if suffix not in file_types:
-                file_types[suffix] = 0
-            file_types[suffix] += 1
-            total_files += 1
-    
-    project_context.append(f"\n=== СТАТИСТИКА ПРОЕКТА ===")
-    project_context.append(f"Всего файлов: {total_files}")
-    project_context.append("Типы файлов:")
-    for ext, count in sorted(file_types.items(), key=lambda x: x[1], reverse=True):
-        project_context.append(f"  {ext}: {count}")
-    
-    # Добавляем информацию о ключевых файлах
-    project_context.append(f"\n=== КЛЮЧЕВЫЕ ФАЙЛЫ ПРОЕКТА ===")
-    key_files = []
-    for file_path in root_path.rglob('*'):
-        if file_path.is_file() and file_path.suffix == '.py':
-            key_files.append(file_path)
-    
-    # Сортируем по размеру (сначала самые большие)
-    key_files.sort(key=lambda x: x.stat().st_size, reverse=True)
-    
-    for i, file_path in enumerate(key_files[:5]):  # Показываем 5 самых больших файлов
-        rel_path = file_path.relative_to(root_path)
-        size = file_path.stat().st_size
-        project_context.append(f"{i+1}. {rel_path} ({size} bytes)")
-    
-    return '\n'.join(project_context)
+# Живое дерево проекта; CLI запускает его после старта, до этого инструменты работают как без него
+WATCHER = None if WATCH_MODE == "0" else ProjectWatcher(
+    Path.cwd(), exclude=SCAN_EXCLUDE, max_depth=SCAN_MAX_DEPTH, backend=WATCH_MODE, poll_interval=WATCH_POLL_INTERVAL
+)
+
+def invalidate_changed(rel_paths: Set[str]):
+    # Файлы, измененные вне агента, сразу уходят из кэша чтения
+    for rel_path in rel_paths:
+        CONTENT_CACHE.invalidate(WATCHER.root / rel_path)
+
+if WATCHER is not None:
+    WATCHER.subscribe(invalidate_changed)
+
+def note_written(paths: List[Path]):
+    """Сбрасывает записанные инструментами файлы в кэше чтения и сообщает о них наблюдателю,
+    чтобы следующий поиск увидел правку, не дожидаясь события файловой системы"""
+    rel_paths = []
+    for full_path in paths:
+        CONTENT_CACHE.invalidate(full_path)
+        if WATCHER is not None and WATCHER.ready:
+            try:
+                rel_paths.append(full_path.relative_to(WATCHER.root).as_posix())
+            except ValueError:
+                pass
+    if rel_paths:
+        WATCHER.touch(rel_paths)
 
-@tool
-def read_file(filename: str) -> Dict[str, Any]:
-    """Gets the full content of a file provided by the user."""
+def read_file(filename: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+              offset: Optional[int] = None, length: Optional[int] = None) -> Dict[str, Any]:
+    """Gets the content of a file provided by the user.
+
+    Optionally reads only lines start_line..end_line (1-based, inclusive) or length bytes from offset.
+    Large results are truncated; continue with the returned next_line or next_offset.
+    """
     full_path = resolve_abs_path(filename)
     print(full_path)
-    with open(str(full_path), "r") as f:
-        content = f.read()
-    return {
-        "file_path": str(full_path),
-        "content": content
-    }
+    return read_file_range(full_path, start_line=start_line, end_line=end_line,
+                           offset=offset, length=length)
 
-@tool
 def list_files(path: str) -> Dict[str, Any]:
     """Lists the files in a directory provided by the user."""
     full_path = resolve_abs_path(path)
@@ -135,12 +125,12 @@ def list_files(path: str) -> Dict[str, Any]:
         "files": all_files
     }
 
-@tool
 def edit_file(path: str, old_str: str, new_str: str) -> Dict[str, Any]:
     """Replaces first occurrence of old_str with new_str in file. If old_str is empty, create/overwrite file with new_str."""
     full_path = resolve_abs_path(path)
     if old_str == "":
-        full_path.write_text(new_str, encoding="utf-8")
+        atomic_write(full_path, new_str)
+        note_written([full_path])
         return {
             "path": str(full_path),
             "action": "created_file"
@@ -152,97 +142,355 @@ def edit_file(path: str, old_str: str, new_str: str) -> Dict[str, Any]:
             "action": "old_str not found"
         }
     edited = original.replace(old_str, new_str, 1)
-    full_path.write_text(edited, encoding="utf-8")
+    atomic_write(full_path, edited)
+    note_written([full_path])
     return {
         "path": str(full_path),
         "action": "edited"
     }
 
-tools = [read_file, list_files, edit_file]
+def edit_file_batch(edits: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Applies an ordered list of edits atomically. Each edit is {"path": ..., "old_str": ..., "new_str": ...}
+    and replaces the first occurrence of old_str with new_str (empty old_str creates/overwrites the file).
+    If any old_str is not found, no file is changed."""
+    resolved = [(resolve_abs_path(e["path"]), e.get("old_str", ""), e.get("new_str", "")) for e in edits]
+    result = edit_files(resolved)
+    note_written([full_path for full_path, _, _ in resolved])
+    return result
 
+# id индекса -> поколение наблюдателя, с которым индекс последний раз сверен
+_INDEX_GENERATIONS: Dict[int, int] = {}
 
+def refresh_index(index: Any):
+    """Обновляет индекс перед поиском: с живым наблюдателем - только если проект изменился
+    и по версиям файлов из памяти, иначе - обходом проекта"""
+    generation = None
+    versions = None
+    if WATCHER is not None and WATCHER.live:
+        generation = WATCHER.generation
+        if _INDEX_GENERATIONS.get(id(index)) == generation:
+            return
+        versions = WATCHER.versions()
+    index.update(versions=versions)
+    if versions is not None:
+        _INDEX_GENERATIONS[id(index)] = generation
 
-llm = ChatOpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    model="meta-llama/llama-3.1-8b-instruct"
-)
+SEARCH_INDEX = CodeSearchIndex(Path.cwd(), exclude=SCAN_EXCLUDE, workers=SCAN_WORKERS)
 
-def call_model(state: MessagesState) -> Dict[str, List[AIMessage]]:
-    messages = state["messages"]
-    raw_response = llm.invoke(messages)
-    
+def search_code(query: str, max_results: int = 10) -> Dict[str, Any]:
+    """Searches all project files for code matching the query (identifiers or words, ranked by BM25).
+    Returns file paths with the best matching line and other matching lines;
+    read the surrounding code with read_file start_line/end_line."""
+    # Индекс обновляется только по изменившимся файлам, поэтому обновляем перед каждым поиском
+    refresh_index(SEARCH_INDEX)
+    return {
+        "query": query,
+        "results": SEARCH_INDEX.search(query, max_results=max_results)
+    }
+
+GREP_INDEX = TrigramIndex(Path.cwd(), exclude=SCAN_EXCLUDE, workers=INDEX_WORKERS)
+
+def grep(pattern: str, path: str = ".", ignore_case: bool = False, max_results: int = 50) -> Dict[str, Any]:
+    """Searches project files under path for lines matching a Python regular expression.
+    Returns matches with path, line number and line text."""
+    try:
+        prefix = resolve_abs_path(path).relative_to(Path.cwd().resolve()).as_posix()
+    except ValueError:
+        return {"pattern": pattern, "error": f"{path} is outside the project"}
+    refresh_index(GREP_INDEX)
+    try:
+        return GREP_INDEX.grep(pattern, path_prefix=prefix, ignore_case=ignore_case, max_results=max_results)
+    except re.error as e:
+        return {"pattern": pattern, "error": f"invalid regex: {e}"}
+
+SYMBOL_INDEX = SymbolIndex(Path.cwd(), exclude=SCAN_EXCLUDE, workers=INDEX_WORKERS)
+
+def find_symbol(name: str, include_references: bool = False, max_results: int = 20) -> Dict[str, Any]:
+    """Finds Python definitions (classes, functions, methods, module variables) by name or qualified name,
+    e.g. "search", "CodeSearchIndex.search" or "code_search.CodeSearchIndex.search".
+    Returns path, start_line and end_line of each definition: read just that range with read_file.
+    With include_references also returns files and lines where the name is used."""
+    refresh_index(SYMBOL_INDEX)
+    return SYMBOL_INDEX.find(name, include_references=include_references, max_results=max_results)
+
+def outline(path: str) -> Dict[str, Any]:
+    """Lists classes, functions, methods and module variables of a Python file with their line ranges,
+    without the file content."""
+    full_path = resolve_abs_path(path)
+    try:
+        rel = full_path.relative_to(Path.cwd().resolve()).as_posix()
+    except ValueError:
+        return {"path": str(full_path), "error": "outside the project"}
+    if not full_path.is_file():
+        return {"path": str(full_path), "error": "file not found"}
+    return {"path": rel, "symbols": SYMBOL_INDEX.outline(rel)}
+
+# Векторный индекс (и NumPy) создает load_runtime, если NumPy установлен
+HAS_VECTOR_INDEX = importlib.util.find_spec("numpy") is not None
+
+def semantic_search(query: str, max_results: int = 5) -> Dict[str, Any]:
+    """Finds project code fragments most similar in meaning to a natural-language query.
+    Returns fragments with path, start_line, end_line and content."""
+    refresh_index(VECTOR_INDEX)
+    return {
+        "query": query,
+        "results": VECTOR_INDEX.query(query, max_results=max_results)
+    }
+
+# Функции инструментов; обертки LangChain для модели создает load_runtime
+TOOL_FUNCTIONS = [read_file, list_files, edit_file, edit_file_batch, search_code, grep, find_symbol, outline]
+if HAS_VECTOR_INDEX:
+    TOOL_FUNCTIONS.append(semantic_search)
+
+# OpenAI-совместимый API модели; для прогонов без сети - benchmarks/fake_llm_server.py
+LLM_BASE_URL = os.getenv("AGENT_LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = os.getenv("AGENT_LLM_MODEL", "meta-llama/llama-3.1-8b-instruct")
+
+def to_tool_call(tool: Any) -> Optional[Dict[str, Any]]:
+    """Переводит объект вызова из ответа модели в формат tool_call LangChain"""
+    if not isinstance(tool, dict) or "function" not in tool:
+        return None
+    func = tool["function"]
+    args = func.get("arguments", {})
+    if isinstance(args, str):
+        args = json.loads(args)
+    elif not isinstance(args, dict):
+        args = {}
+    return {
+        "name": func["name"],
+        "args": args,
+        "id": str(tool.get("id", "call_" + str(hash(func["name"])))),
+        "type": "tool_call"
+    }
+
+def build_response(content: str, parsed_tools: Optional[List[Any]],
+                   metadata: Optional[Dict[str, Any]] = None) -> AIMessage:
+    """Собирает AIMessage из текста ответа и разобранных объектов вызовов"""
+    from langchain_core.messages import AIMessage
+    tool_calls = []
+    seen_ids = set()
+    for tool in parsed_tools or []:
+        try:
+            tool_call = to_tool_call(tool)
+        except (ValueError, KeyError, TypeError):
+            tool_call = None
+        if tool_call is None:
+            continue
+        # Модели часто повторяют один и тот же id, а результаты сопоставляются по нему
+        if tool_call["id"] in seen_ids:
+            tool_call["id"] = f"{tool_call['id']}_{len(tool_calls)}"
+        seen_ids.add(tool_call["id"])
+        tool_calls.append(tool_call)
+    if tool_calls:
+        return AIMessage(content="", tool_calls=tool_calls)
+    # Обычный текст (или JSON без единого корректного вызова) отдаем как есть
+    return AIMessage(content=content, response_metadata=metadata or {})
+
+def clean_content(content: Any) -> Any:
     # Clean the content to remove invalid Unicode characters BEFORE processing
-    content = raw_response.content
     if isinstance(content, str):
         # Remove surrogate characters that cause encoding issues
         content = content.encode('utf-8', 'ignore').decode('utf-8', 'ignore')
-    
-    # Create a new AIMessage with the cleaned content
-    cleaned_response = AIMessage(content=content, tool_calls=raw_response.tool_calls)
-    
-    fixed_content = repair_json(content)
-    if fixed_content.strip():
-        try:
-            parsed_tools = json.loads(fixed_content)
-            if not isinstance(parsed_tools, list):
-                parsed_tools = [parsed_tools]
-            tool_calls = []
-            for tool in parsed_tools:
-                if isinstance(tool, dict) and "function" in tool:
-                    func = tool["function"]
-                    args = func.get("arguments", {})
-                    if isinstance(args, str):
-                        args = json.loads(args)
-                    elif not isinstance(args, dict):
-                        args = {}
-                    tool_calls.append({
-                        "name": func["name"],
-                        "args": args,
-                        "id": str(tool.get("id", "call_" + str(hash(func["name"])))),
-                        "type": "tool_call"
-                    })
-            response = AIMessage(content="", tool_calls=tool_calls)
-        except json.JSONDecodeError:
-            response = AIMessage(content=fixed_content)
-    else:
-        response = AIMessage(content="")
-    return {"messages": [response]}
-
-tool_node = ToolNode(tools)
-
-def should_continue(state: MessagesState) -> str:
+    return content
+
+def parse_model_output(content: Any) -> Optional[List[Any]]:
+    """Разбирает готовый ответ модели в объекты вызовов, замеряя разбор"""
+    if not isinstance(content, str):
+        return None
+    with TRACER.span("tool_calls", "parse", chars=len(content)) as span:
+        stream = ToolCallStream()
+        stream.feed(content)
+        parsed = stream.finish()
+        span.update(calls=len(parsed or []), repaired=stream.repaired)
+    return parsed
+
+def stream_model_response(messages: List[Any]) -> Tuple[str, bool, Optional[List[Any]], Optional[Dict[str, int]]]:
+    """Печатает текст ответа по мере генерации; вызовы инструментов только для чтения
+    запускаются, как только их объект в JSON-массиве закрыт.
+    Возвращает (ответ, был ли он напечатан, разобранные объекты вызовов или None для текста, usage)."""
+    stream = ToolCallStream()
+    pieces = []
+    printed = False
+    usage = None
+    # Разбор идет вперемешку с приемом ответа, поэтому его время накапливается по кускам
+    parse_seconds = 0.0
+    # Заранее запускаем только чтения, идущие до первой записи: дальше порядок важен
+    can_prefetch = True
+    for chunk in llm.stream(messages):
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if not text:
+            continue
+        pieces.append(text)
+        started = time.perf_counter()
+        prose, completed = stream.feed(text)
+        parse_seconds += time.perf_counter() - started
+        if prose:
+            if not printed:
+                print(f"{ASSISTANT_COLOR}Assistant:{RESET_COLOR} ", end="")
+                printed = True
+            print(prose, end="", flush=True)
+        for tool in completed:
+            try:
+                call = to_tool_call(tool)
+            except (ValueError, KeyError, TypeError):
+                call = None
+            if can_prefetch and call is not None:
+                can_prefetch = TOOL_PREFETCHER.start(call, tools)
+    if printed:
+        print()
+    started = time.perf_counter()
+    parsed = stream.finish()
+    content = "".join(pieces)
+    TRACER.record("tool_calls", "parse", parse_seconds + time.perf_counter() - started,
+                  chars=len(content), calls=len(parsed or []), repaired=stream.repaired)
+    return content, printed, parsed, usage
+
+def call_model(state: MessagesState) -> Dict[str, List[AIMessage]]:
+    # История в состоянии полная, модели уходит ее сжатое под бюджет представление
+    with TRACER.span("context_window", "step", messages=len(state["messages"])) as span:
+        messages = CONTEXT_WINDOW.fit(state["messages"])
+        span["sent_messages"] = len(messages)
+    streamed = False
+    with TRACER.span("model", "llm", model=LLM_MODEL, stream=STREAM_OUTPUT) as span:
+        if STREAM_OUTPUT:
+            TOOL_PREFETCHER.clear()
+            content, streamed, parsed_tools, usage = stream_model_response(messages)
+        else:
+            response = llm.invoke(messages)
+            content, usage = response.content, response.usage_metadata
+        span.update(token_usage(usage, messages, content))
+    if not STREAM_OUTPUT:
+        parsed_tools = parse_model_output(content)
+    content = clean_content(content)
+    # Уже напечатанный при потоковом выводе текст цикл не выводит повторно
+    metadata = {"streamed": True} if streamed else {}
+    return {"messages": [build_response(content, parsed_tools, metadata)]}
+
+def tool_node(state: MessagesState) -> Dict[str, List[ToolMessage]]:
+    from tool_runner import run_tool_calls
+    # Независимые чтения идут параллельно, записи в один файл - по порядку
+    tool_calls = state["messages"][-1].tool_calls
+    return {"messages": run_tool_calls(tool_calls, tools, resolve_abs_path, max_workers=TOOL_WORKERS,
+                                       prefetcher=TOOL_PREFETCHER)}
+
+def dedupe_tool_results(state: MessagesState) -> Dict[str, List[ToolMessage]]:
+    from payload_store import PAYLOAD_STORE
+    # Повторно прочитанное без изменений содержимое заменяется ссылкой на первый результат
+    return {"messages": PAYLOAD_STORE.dedupe(state["messages"])}
+
+# LangGraph разрешает аннотации условного перехода при сборке графа, а MessagesState здесь импортируется лениво
+def should_continue(state: Dict[str, Any]) -> str:
+    from langgraph.graph import END
     messages = state["messages"]
     last_message = messages[-1]
     if last_message.tool_calls:
         return "tools"
     return END
 
-workflow = StateGraph(state_schema=MessagesState)
+def build_graph(checkpointer: Any = None):
+    from langgraph.graph import END, StateGraph, MessagesState
 
-workflow.add_node("agent", call_model)
-workflow.add_node("tools", tool_node)
+    workflow = StateGraph(state_schema=MessagesState)
 
-workflow.set_entry_point("agent")
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        END: END,
-    },
-)
-workflow.add_edge("tools", "agent")
+    # Каждый узел замеряется; замеры пишутся в SPANS_FILE и сводятся по сессии в конце
+    workflow.add_node("agent", TRACER.instrument_node("agent", call_model))
+    workflow.add_node("tools", TRACER.instrument_node("tools", tool_node))
+    workflow.add_node("dedupe", TRACER.instrument_node("dedupe", dedupe_tool_results))
 
-app = workflow.compile()
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "tools": "tools",
+            END: END,
+        },
+    )
+    workflow.add_edge("tools", "dedupe")
+    workflow.add_edge("dedupe", "agent")
+    return workflow.compile(checkpointer=checkpointer)
 
-def run_coding_agent_loop():
-    # Автоматически анализируем структуру проекта при запуске
-    print(f"{ASSISTANT_COLOR}Анализирую структуру проекта...{RESET_COLOR}")
-    project_structure = analyze_project_structure()
-    
-    # Создаем улучшенный системный промпт с информацией о проекте
-    enhanced_system_prompt = f"""{SYSTEM_PROMPT}
+# Создаются load_runtime; из других модулей доступны как agent.app и т.п. (см. __getattr__ ниже)
+RUNTIME_NAMES = ("llm", "app", "CONTEXT_WINDOW", "CHECKPOINTER", "TOOL_PREFETCHER")
+# Создаются load_tools - без клиента модели и чекпоинтера; их же берет асинхронный граф
+TOOL_NAMES = ("tools", "VECTOR_INDEX")
+_RUNTIME_LOCK = threading.Lock()
+_RUNTIME_READY = threading.Event()
+_TOOLS_LOCK = threading.Lock()
+_TOOLS_READY = threading.Event()
+
+def load_tools() -> list:
+    """Создает инструменты LangChain и векторный индекс, которым пользуется semantic_search.
+    Повторные вызовы возвращают тот же список."""
+    global tools, VECTOR_INDEX
+    if _TOOLS_READY.is_set():
+        return tools
+    with _TOOLS_LOCK:
+        if not _TOOLS_READY.is_set():
+            from langchain_core.tools import tool
+
+            tools = [tool(func) for func in TOOL_FUNCTIONS]
+            VECTOR_INDEX = None
+            if HAS_VECTOR_INDEX:
+                from vector_index import VectorIndex
+                VECTOR_INDEX = VectorIndex(Path.cwd(), exclude=SCAN_EXCLUDE, workers=INDEX_WORKERS)
+            _TOOLS_READY.set()
+    return tools
+
+def build_context_window():
+    """Новое окно контекста с настройками из окружения; у каждого графа свой кэш сводок"""
+    from context_window import ContextWindow
+    return ContextWindow(token_budget=CONTEXT_TOKENS, keep_turns=CONTEXT_KEEP_TURNS)
+
+def open_checkpointer():
+    """Чекпоинтер из AGENT_CHECKPOINT_DB или None, если сохранение сессий выключено"""
+    if CHECKPOINT_DB == "0":
+        return None
+    from checkpointer import SqliteCheckpointSaver
+    return SqliteCheckpointSaver(Path(CHECKPOINT_DB) if CHECKPOINT_DB else None)
+
+def load_runtime():
+    """Импортирует LangChain и LangGraph, создает клиент модели, инструменты, окно контекста,
+    чекпоинтер и компилирует граф. Повторные вызовы ничего не делают, параллельные ждут первого;
+    CLI запускает ее в фоновом потоке, пока пользователь набирает первый запрос."""
+    global llm, app, CONTEXT_WINDOW, CHECKPOINTER, TOOL_PREFETCHER
+    if _RUNTIME_READY.is_set():
+        return
+    with _RUNTIME_LOCK:
+        if _RUNTIME_READY.is_set():
+            return
+        with TRACER.span("runtime", "startup"):
+            from langchain_openai import ChatOpenAI
+            from tool_runner import ToolPrefetcher
+
+            llm = ChatOpenAI(
+                base_url=LLM_BASE_URL,
+                api_key=os.getenv("OPENROUTER_API_KEY"),
+                model=LLM_MODEL,
+                # Число токенов приходит и в потоковом ответе - последним куском
+                stream_usage=True
+            )
+            load_tools()
+            CONTEXT_WINDOW = build_context_window()
+            TOOL_PREFETCHER = ToolPrefetcher(max_workers=TOOL_WORKERS)
+            CHECKPOINTER = open_checkpointer()
+            app = build_graph(CHECKPOINTER)
+        _RUNTIME_READY.set()
+
+def __getattr__(name: str) -> Any:
+    # Модуль импортируется быстро; окружение создается при первом обращении к agent.app, agent.tools и т.п.
+    if name in TOOL_NAMES:
+        load_tools()
+        return globals()[name]
+    if name in RUNTIME_NAMES:
+        load_runtime()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def build_system_prompt(project_structure: str) -> str:
+    return f"""{SYSTEM_PROMPT}
 
 === КОНТЕКСТ ПРОЕКТА ===
 {project_structure}
@@ -256,10 +504,63 @@ def run_coding_agent_loop():
 
 Помни эту информацию на протяжении всей сессии.
 """
-    
-    messages = [SystemMessage(content=enhanced_system_prompt)]
-    
-    print(f"{ASSISTANT_COLOR}Проект проанализирован! Могу помочь с любыми задачами по кодингу.{RESET_COLOR}")
+
+def print_new_messages(new_messages: List[Any]):
+    from langchain_core.messages import AIMessage, ToolMessage
+    for msg in new_messages:
+        if isinstance(msg, AIMessage):
+            if msg.tool_calls:
+                print(f"{ASSISTANT_COLOR}Assistant tool calls:{RESET_COLOR} {json.dumps(msg.tool_calls, indent=2)}")
+            if msg.content and not msg.response_metadata.get("streamed"):
+                print(f"{ASSISTANT_COLOR}Assistant:{RESET_COLOR} {msg.content}")
+        elif isinstance(msg, ToolMessage):
+            print(f"{ASSISTANT_COLOR}Tool result:{RESET_COLOR} {msg.content}")
+
+def run_coding_agent_loop():
+    # Структура проекта анализируется в фоне, пока пользователь набирает первый запрос
+    analysis = ProjectAnalysis(
+        token_budget=PROJECT_CONTEXT_TOKENS,
+        exclude=SCAN_EXCLUDE, workers=SCAN_WORKERS, max_depth=SCAN_MAX_DEPTH
+    ).start()
+    # Тяжелые импорты и компиляция графа тоже идут в фоне
+    runtime = threading.Thread(target=load_runtime, name="agent-runtime", daemon=True)
+    runtime.start()
+
+    # Откатываем пакетные правки, прерванные падением прошлой сессии
+    restored = EditJournal.recover(default_journal_dir())
+    if restored:
+        print(f"{ASSISTANT_COLOR}Откачены незавершенные правки: {', '.join(restored)}{RESET_COLOR}")
+
+    # Системное сообщение с описанием проекта добавляется к первому запросу
+    messages: List[Any] = []
+    # Описание проекта в системном сообщении полное; пока нет - обновляется на каждом ходу
+    context_complete = False
+    # Поколение наблюдателя, по которому построено описание проекта; после изменений дерева оно обновляется
+    context_generation = None
+    # Сколько сообщений истории уже сохранено в чекпоинте: их граф берет оттуда сам
+    persisted = 0
+    config = None
+    # Без чекпоинтера id нужен только для замеров
+    session_id = uuid.uuid4().hex
+    if CHECKPOINT_DB != "0":
+        thread_id = session_id
+        if SESSION_ID:
+            # Историю продолжаемой сессии читает чекпоинтер - его приходится дождаться
+            load_runtime()
+            thread_id = (CHECKPOINTER.latest_thread() if SESSION_ID == "last" else SESSION_ID) or session_id
+        session_id = thread_id
+        config = {"configurable": {"thread_id": thread_id}}
+        saved = app.get_state(config).values.get("messages") if SESSION_ID else None
+        if saved:
+            messages = saved
+            persisted = len(saved)
+            # Продолжаемая сессия остается с описанием проекта, с которым была начата
+            context_complete = True
+            print(f"{ASSISTANT_COLOR}Продолжаю сессию {thread_id}: {persisted} сообщений{RESET_COLOR}")
+        else:
+            print(f"{ASSISTANT_COLOR}Сессия {thread_id} (продолжить: AGENT_SESSION={thread_id}){RESET_COLOR}")
+
+    print(f"{ASSISTANT_COLOR}Анализирую структуру проекта в фоне - можно сразу описывать задачу.{RESET_COLOR}")
     print(f"{ASSISTANT_COLOR}Доступные команды:{RESET_COLOR}")
     print("  - Просто опиши задачу, которую нужно решить")
     print("  - Спроси о структуре проекта")
@@ -275,20 +576,70 @@ def run_coding_agent_loop():
             break
         if not user_input.strip():
             continue
+        if not _RUNTIME_READY.is_set():
+            # Запрос отправлен раньше, чем фоновая загрузка закончилась: ждем ее (или повторяем с ошибкой)
+            with TRACER.session(session_id), TRACER.span("runtime_wait", "startup"):
+                runtime.join()
+                load_runtime()
+        if WATCHER is not None and not WATCHER.started:
+            # Наблюдатель повторяет обход проекта, поэтому стартует после первого запроса, а не рядом с анализом
+            WATCHER.start()
+        from langchain_core.messages import HumanMessage, SystemMessage
+        # Уже сохраненные в чекпоинте сообщения, которые надо заменить (системное с новым описанием проекта)
+        replaced = []
+        project_summary = None
+        if not context_complete:
+            # Полного описания первый запрос ждет не дольше SCAN_WAIT, следующие не ждут
+            wait = 0 if messages else SCAN_WAIT
+            with TRACER.session(session_id), TRACER.span("scan_wait", "startup", waited=not analysis.done) as span:
+                project_summary = analysis.summary(timeout=wait)
+                span["complete"] = project_summary.complete
+            context_complete = project_summary.complete
+            if context_complete:
+                with TRACER.session(session_id):
+                    TRACER.record("project_analysis", "startup", analysis.seconds, tokens=project_summary.tokens)
+            print(f"{ASSISTANT_COLOR}Контекст проекта: {project_summary.tokens} из {project_summary.token_budget} "
+                  f"токенов (свернуто папок: {project_summary.collapsed_dirs}, "
+                  f"скрыто файлов: {project_summary.hidden_files})"
+                  f"{'' if context_complete else ', анализ еще идет - описание частичное'}{RESET_COLOR}")
+        elif WATCHER is not None and WATCHER.ready and WATCHER.generation != context_generation:
+            # Файлы создавались, удалялись или менялись: описание строится из дерева наблюдателя без обхода
+            context_generation = WATCHER.generation
+            with TRACER.session(session_id), TRACER.span("project_context", "watch") as span:
+                project_summary = summarize_scan(WATCHER.snapshot(), PROJECT_CONTEXT_TOKENS)
+                span["tokens"] = project_summary.tokens
+        if project_summary is not None:
+            system_prompt = build_system_prompt(project_summary.text)
+            # Тот же id: add_messages заменит системное сообщение на месте, а не добавит второе
+            if not messages or messages[0].content != system_prompt:
+                system_message = SystemMessage(content=system_prompt, id=messages[0].id if messages else None)
+                if not messages:
+                    messages.append(system_message)
+                else:
+                    messages[0] = system_message
+                    if persisted:
+                        replaced.append(system_message)
         messages.append(HumanMessage(content=user_input))
         old_len = len(messages)
         # Run the graph
-        final_state = app.invoke({"messages": messages})
+        with TRACER.session(session_id):
+            final_state = app.invoke({"messages": replaced + messages[persisted:]}, config)
         messages = final_state["messages"]
+        if config is not None:
+            persisted = len(messages)
         # Print the new messages from this invocation
-        for msg in messages[old_len:]:
-            if isinstance(msg, AIMessage):
-                if msg.tool_calls:
-                    print(f"{ASSISTANT_COLOR}Assistant tool calls:{RESET_COLOR} {json.dumps(msg.tool_calls, indent=2)}")
-                if msg.content:
-                    print(f"{ASSISTANT_COLOR}Assistant:{RESET_COLOR} {msg.content}")
-            elif isinstance(msg, ToolMessage):
-                print(f"{ASSISTANT_COLOR}Tool result:{RESET_COLOR} {msg.content}")
+        print_new_messages(messages[old_len:])
+
+    if WATCHER is not None and WATCHER.started:
+        WATCHER.stop()
+        watch_stats = WATCHER.stats()
+        print(f"{ASSISTANT_COLOR}Наблюдение за проектом ({watch_stats['backend']}): событий {watch_stats['events']}, "
+              f"изменений дерева {watch_stats['generation']}{RESET_COLOR}")
+    cache_stats = CONTENT_CACHE.stats()
+    print(f"{ASSISTANT_COLOR}Кэш файлов: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}, "
+          f"{cache_stats['bytes']} из {cache_stats['max_bytes']} байт{RESET_COLOR}")
+    print(format_summary(TRACER.summary(session_id), f"ЗАМЕРЫ СЕССИИ {session_id}"))
+    TRACER.close()
 
 if __name__ == "__main__":
-    run_coding_agent_loop()
\ No newline at end of file
+    run_coding_agent_loop()
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_openai import ChatOpenAI
+from langgraph.graph import END, StateGraph, MessagesState
+
+from agent import (
+    ASSISTANT_COLOR, LLM_BASE_URL, LLM_MODEL, PROJECT_CONTEXT_TOKENS, RESET_COLOR, SCAN_EXCLUDE,
+    SCAN_MAX_DEPTH, SCAN_WORKERS, TOOL_WORKERS, YOU_COLOR, build_context_window, build_response,
+    build_system_prompt, clean_content, load_tools, parse_model_output, print_new_messages, resolve_abs_path,
+    should_continue,
+)
+from instrumentation import TRACER, format_summary, token_usage
+from payload_store import PAYLOAD_STORE
+from project_summary import summarize_project_structure
+from tool_runner import arun_tool_calls
+
+# Общий пул HTTP-соединений для всех сессий процесса
+HTTP_MAX_CONNECTIONS = int(os.getenv("AGENT_HTTP_MAX_CONNECTIONS", "100"))
+
+
+def build_async_llm(base_url: str = LLM_BASE_URL, model: str = LLM_MODEL,
+                    api_key: Optional[str] = None,
+                    http_client: Optional[httpx.AsyncClient] = None) -> ChatOpenAI:
+    """ChatOpenAI, который ходит в API через общий httpx.AsyncClient"""
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+    return ChatOpenAI(
+        base_url=base_url,
+        api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
+        model=model,
+        http_async_client=http_client,
+    )
+
+
+def build_async_app(async_llm: ChatOpenAI, checkpointer: Any = None, limiter: Any = None):
+    """Тот же граф, что и в agent.py, но с асинхронными узлами.
+
+    limiter - асинхронный контекстный менеджер, общий для всех копий графа (например,
+    batch_runner.ModelLimiter): в нем выполняется каждый запрос к модели. Синхронный клиент
+    и граф agent.py при этом не создаются.
+    """
+    tools = load_tools()
+    context_window = build_context_window()
+
+    async def call_model(state: MessagesState) -> Dict[str, List[AIMessage]]:
+        with TRACER.span("context_window", "step", messages=len(state["messages"])) as span:
+            messages = context_window.fit(state["messages"])
+            span["sent_messages"] = len(messages)
+        # Ожидание лимита не входит в замер модели
+        async with limiter or contextlib.nullcontext():
+            with TRACER.span("model", "llm", model=async_llm.model_name, stream=False) as span:
+                raw_response = await async_llm.ainvoke(messages)
+                span.update(token_usage(raw_response.usage_metadata, messages, raw_response.content))
+        parsed_tools = parse_model_output(raw_response.content)
+        content = clean_content(raw_response.content)
+        return {"messages": [build_response(content, parsed_tools)]}
+
+    async def tool_node(state: MessagesState) -> Dict[str, List[ToolMessage]]:
+        tool_calls = state["messages"][-1].tool_calls
+        return {"messages": await arun_tool_calls(tool_calls, tools, resolve_abs_path,
+                                                  max_concurrency=TOOL_WORKERS)}
+
+    async def dedupe_tool_results(state: MessagesState) -> Dict[str, List[ToolMessage]]:
+        return {"messages": PAYLOAD_STORE.dedupe(state["messages"])}
+
+    workflow = StateGraph(state_schema=MessagesState)
+    workflow.add_node("agent", TRACER.instrument_node("agent", call_model))
+    workflow.add_node("tools", TRACER.instrument_node("tools", tool_node))
+    workflow.add_node("dedupe", TRACER.instrument_node("dedupe", dedupe_tool_results))
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges("agent", should_continue, {"tools": "tools", END: END})
+    workflow.add_edge("tools", "dedupe")
+    workflow.add_edge("dedupe", "agent")
+    return workflow.compile(checkpointer=checkpointer)
+
+
+class AgentSession:
+    """История одного пользователя; много сессий обслуживаются одним графом и одним пулом соединений"""
+
+    def __init__(self, app: Any, system_prompt: str, thread_id: Optional[str] = None):
+        self.app = app
+        self.messages: List[BaseMessage] = [SystemMessage(content=system_prompt)]
+        # С чекпоинтером граф хранит историю сам, и ему передаются только новые сообщения
+        self.config = {"configurable": {"thread_id": thread_id}} if thread_id else None
+        # Под этим id замеры сессии попадают в сводку
+        self.session_id = thread_id or uuid.uuid4().hex
+        self._persisted = 0
+        # Запросы одной сессии выполняются по очереди, разные сессии - параллельно
+        self._lock = asyncio.Lock()
+
+    async def ask(self, user_input: str) -> List[BaseMessage]:
+        """Отправляет сообщение пользователя и возвращает новые сообщения этого шага"""
+        async with self._lock:
+            messages = self.messages + [HumanMessage(content=user_input)]
+            with TRACER.session(self.session_id):
+                final_state = await self.app.ainvoke({"messages": messages[self._persisted:]}, self.config)
+            self.messages = final_state["messages"]
+            if self.config is not None:
+                self._persisted = len(self.messages)
+            return self.messages[len(messages):]
+
+
+async def arun_coding_agent_loop():
+    """Интерактивный цикл на asyncio; ввод читается в отдельном потоке"""
+    app = build_async_app(build_async_llm())
+    print(f"{ASSISTANT_COLOR}Анализирую структуру проекта...{RESET_COLOR}")
+    project_summary = await asyncio.to_thread(
+        summarize_project_structure, token_budget=PROJECT_CONTEXT_TOKENS,
+        exclude=SCAN_EXCLUDE, workers=SCAN_WORKERS, max_depth=SCAN_MAX_DEPTH,
+    )
+    session = AgentSession(app, build_system_prompt(project_summary.text))
+    print(f"{ASSISTANT_COLOR}Проект проанализирован! Могу помочь с любыми задачами по кодингу.{RESET_COLOR}")
+    while True:
+        try:
+            user_input = await asyncio.to_thread(input, f"{YOU_COLOR}You:{RESET_COLOR} ")
+        except (KeyboardInterrupt, EOFError):
+            break
+        if not user_input.strip():
+            continue
+        print_new_messages(await session.ask(user_input))
+    print(format_summary(TRACER.summary(session.session_id), f"ЗАМЕРЫ СЕССИИ {session.session_id}"))
+
+
+if __name__ == "__main__":
+    asyncio.run(arun_coding_agent_loop())
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from agent import (
+    ASSISTANT_COLOR, PROJECT_CONTEXT_TOKENS, RESET_COLOR, SCAN_EXCLUDE, SCAN_MAX_DEPTH, SCAN_WORKERS,
+    WATCHER, build_system_prompt, open_checkpointer,
+)
+from async_agent import build_async_app, build_async_llm
+from file_editor import EditJournal, default_journal_dir
+from instrumentation import TRACER, percentile
+from project_summary import summarize_project_structure
+
+# Сколько задач выполняется одновременно
+BATCH_WORKERS = int(os.getenv("AGENT_BATCH_WORKERS", "8"))
+# Предел шагов графа на один ход задачи (recursion_limit LangGraph)
+BATCH_MAX_STEPS = int(os.getenv("AGENT_BATCH_MAX_STEPS", "50"))
+
+
+@dataclass
+class BatchTask:
+    """Задача пакета: запросы пользователя по ходам одной сессии"""
+    id: str
+    prompts: List[str]
+
+
+def load_tasks(path: Path) -> List[BatchTask]:
+    """Читает задачи из JSONL: {"id": ..., "prompt": "..."} или {"id": ..., "prompts": ["...", ...]}.
+
+    Без id задача получает номер строки; id должны быть уникальны - по ним продолжается пакет.
+    """
+    tasks: List[BatchTask] = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as exc:
+                raise ValueError(f"{path}:{lineno}: не JSON: {exc}") from None
+            if not isinstance(raw, dict):
+                raise ValueError(f"{path}:{lineno}: задача должна быть объектом JSON, а не {type(raw).__name__}")
+            prompts = raw.get("prompts") or ([raw["prompt"]] if raw.get("prompt") else [])
+            if (not isinstance(prompts, list) or not prompts
+                    or not all(isinstance(p, str) and p.strip() for p in prompts)):
+                raise ValueError(f"{path}:{lineno}: нужен непустой prompt или список prompts")
+            task_id = str(raw.get("id", f"line-{lineno}"))
+            if task_id in seen:
+                raise ValueError(f"{path}:{lineno}: id {task_id!r} уже встречался")
+            seen.add(task_id)
+            tasks.append(BatchTask(task_id, prompts))
+    return tasks
+
+
+def read_results(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Последний результат каждой задачи из выходного JSONL; оборванная при падении строка пропускается"""
+    results: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return results
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "id" in record:
+                results[record["id"]] = record
+    return results
+
+
+class ModelLimiter:
+    """Общий для всех задач лимит запросов к модели: не больше max_concurrency одновременно
+    и не чаще rate_per_minute в минуту (запросы равномерно разносятся по времени).
+
+    Ожидание записывается замером kind="wait" в сессию задачи, которая ждала.
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_minute: float = 0.0):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        await self._semaphore.acquire()
+        if self._interval:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+        TRACER.record("model_slot", "wait", time.perf_counter() - start)
+        return self
+
+    async def __aexit__(self, *exc: Any):
+        self._semaphore.release()
+
+
+def task_metrics(spans: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Число вызовов, токены и время модели, инструментов и ожидания лимита по замерам задачи"""
+    model = [s for s in spans if s["kind"] == "llm"]
+    tools = [s for s in spans if s["kind"] == "tool"]
+    return {
+        "model_calls": len(model),
+        "tool_calls": len(tools),
+        "tool_errors": sum(s["status"] != "ok" for s in tools),
+        "prompt_tokens": sum(s["attrs"].get("prompt_tokens", 0) for s in model),
+        "completion_tokens": sum(s["attrs"].get("completion_tokens", 0) for s in model),
+        "model_ms": round(sum(s["ms"] for s in model), 3),
+        "tools_ms": round(sum(s["ms"] for s in tools), 3),
+        "wait_ms": round(sum(s["ms"] for s in spans if s["kind"] == "wait"), 3),
+    }
+
+
+class BatchRunner:
+    """Выполняет задачи пакета на ограниченном пуле из workers асинхронных исполнителей.
+
+    Каждая задача - отдельная сессия со своей копией скомпилированного графа; общими остаются
+    клиент модели с пулом соединений, лимит запросов и чекпоинтер. Результат каждой задачи сразу
+    дописывается строкой в выходной JSONL.
+
+    Продолжение: задачи с результатом status="ok" в выходном файле пропускаются, остальные
+    выполняются заново. С чекпоинтером прерванная задача продолжается с последнего шага, а не
+    с начала: thread_id задачи зависит только от выходного файла и id задачи. Новый пакет (выходного
+    файла еще нет) начинает сессии заново, даже если в чекпоинтере остались старые с теми же id.
+
+    Задачи работают в одном рабочем дереве: правки параллельных задач в одни и те же файлы
+    друг друга не видят, такие задачи лучше разносить по разным пакетам.
+    """
+
+    def __init__(self, tasks: Sequence[BatchTask], output: Path, system_prompt: str,
+                 llm: Any, checkpointer: Any = None, workers: int = BATCH_WORKERS,
+                 limiter: Optional[ModelLimiter] = None, timeout: Optional[float] = None,
+                 max_steps: int = BATCH_MAX_STEPS):
+        self.tasks = list(tasks)
+        self.output = output
+        self.system_prompt = system_prompt
+        self.llm = llm
+        self.checkpointer = checkpointer
+        self.workers = workers
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.fresh = not output.exists()
+        self.batch_id = hashlib.sha1(str(output.resolve()).encode("utf-8")).hexdigest()[:12]
+        self.results: List[Dict[str, Any]] = []
+        self._file = None
+
+    def pending(self) -> List[BatchTask]:
+        finished = {task_id for task_id, record in read_results(self.output).items() if record.get("status") == "ok"}
+        return [task for task in self.tasks if task.id not in finished]
+
+    async def run(self) -> List[Dict[str, Any]]:
+        """Выполняет невыполненные задачи и возвращает их результаты в порядке завершения"""
+        pending = self.pending()
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in pending:
+            queue.put_nowait(task)
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        # Строка, оборванная при прошлом падении, не должна склеиться с первой новой
+        torn = False
+        if self.output.exists() and self.output.stat().st_size:
+            with open(self.output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        with open(self.output, "a", encoding="utf-8") as self._file:
+            if torn:
+                self._file.write("\n")
+            await asyncio.gather(*(self._worker(queue, len(pending)) for _ in range(min(self.workers, len(pending)))))
+        self._file = None
+        return self.results
+
+    async def _worker(self, queue: asyncio.Queue, total: int):
+        while not queue.empty():
+            task = queue.get_nowait()
+            record = await self.run_task(task)
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            # Результат должен попасть в файл, даже если процесс убьют следующей же задачей
+            self._file.flush()
+            self.results.append(record)
+            print(f"{ASSISTANT_COLOR}[{len(self.results)}/{total}] {task.id}: {record['status']}, "
+                  f"{record['seconds']:.1f} s{', продолжена' if record['resumed'] else ''}"
+                  f"{': ' + record['error'] if record['error'] else ''}{RESET_COLOR}")
+
+    async def run_task(self, task: BatchTask) -> Dict[str, Any]:
+        thread_id = f"batch-{self.batch_id}-{task.id}"
+        # Своя копия графа на задачу: общими у задач остаются только клиент модели, лимит и чекпоинтер
+        app = build_async_app(self.llm, self.checkpointer, self.limiter)
+        config = {"configurable": {"thread_id": thread_id}, "recursion_limit": self.max_steps}
+        started = time.time()
+        start = time.perf_counter()
+        status, error, messages, resumed = "ok", None, [], False
+        try:
+            with TRACER.session(thread_id):
+                messages, resumed = await asyncio.wait_for(self._run_turns(app, task, config), self.timeout)
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"не уложилась в {self.timeout:g} s"
+        except Exception as exc:
+            status, error = "error", f"{type(exc).__name__}: {exc}"
+        answer = next((m.content for m in reversed(messages) if isinstance(m, AIMessage)), None)
+        return {
+            "id": task.id,
+            "status": status,
+            "answer": answer,
+            "error": error,
+            "thread_id": thread_id,
+            "resumed": resumed,
+            "turns": len(task.prompts),
+            "messages": len(messages),
+            **task_metrics(TRACER.pop_spans(thread_id)),
+            "seconds": round(time.perf_counter() - start, 3),
+            "started": round(started, 3),
+        }
+
+    async def _run_turns(self, app: Any, task: BatchTask, config: Dict[str, Any]) -> Tuple[List[BaseMessage], bool]:
+        """Выполняет ходы задачи; с чекпоинтером пропускает сохраненные и доигрывает прерванный ход"""
+        messages: List[BaseMessage] = [SystemMessage(content=self.system_prompt)]
+        persisted = 0
+        resumed = False
+        if self.checkpointer is not None:
+            if self.fresh:
+                await self.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+            else:
+                state = await app.aget_state(config)
+                if state.next:
+                    # Процесс убили посреди хода: граф продолжает с последнего чекпоинта
+                    resumed = True
+                    await app.ainvoke(None, config)
+                    state = await app.aget_state(config)
+                saved = state.values.get("messages") or []
+                if saved:
+                    resumed = True
+                    messages = saved
+                    persisted = len(saved)
+        done_turns = sum(isinstance(m, HumanMessage) for m in messages)
+        for prompt in task.prompts[done_turns:]:
+            messages = messages + [HumanMessage(content=prompt)]
+            final_state = await app.ainvoke({"messages": messages[persisted:]}, config)
+            messages = final_state["messages"]
+            if self.checkpointer is not None:
+                persisted = len(messages)
+        return messages, resumed
+
+
+def format_batch_summary(results: Sequence[Dict[str, Any]], seconds: float) -> str:
+    if not results:
+        return "=== ПАКЕТ: нечего выполнять ==="
+    durations = [r["seconds"] for r in results]
+    statuses: Dict[str, int] = {}
+    for record in results:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    return "\n".join([
+        f"=== ПАКЕТ: {len(results)} задач за {seconds:.1f} s ({len(results) / seconds * 60:.1f} в минуту) ===",
+        "статусы: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())),
+        f"задача: p50 {percentile(durations, 0.5):.1f} s, p95 {percentile(durations, 0.95):.1f} s",
+        f"модель: {sum(r['model_calls'] for r in results)} запросов, "
+        f"prompt {sum(r['prompt_tokens'] for r in results)}, "
+        f"completion {sum(r['completion_tokens'] for r in results)} токенов; "
+        f"ожидание лимита {sum(r['wait_ms'] for r in results) / 1000:.1f} s",
+        f"инструменты: {sum(r['tool_calls'] for r in results)} вызовов, "
+        f"ошибок {sum(r['tool_errors'] for r in results)}",
+    ])
+
+
+async def arun_batch(args: argparse.Namespace):
+    tasks = load_tasks(args.tasks)
+    # Откатываем пакетные правки, прерванные падением прошлого запуска. Журналы живых процессов
+    # (CLI или другой пакет в том же проекте) заблокированы ими и пропускаются
+    restored = EditJournal.recover(default_journal_dir())
+    if restored:
+        print(f"{ASSISTANT_COLOR}Откачены незавершенные правки: {', '.join(restored)}{RESET_COLOR}")
+    if WATCHER is not None:
+        # Поиски сотен задач берут версии файлов у наблюдателя, а не обходят проект каждый раз
+        WATCHER.start()
+    project_summary = await asyncio.to_thread(
+        summarize_project_structure, token_budget=PROJECT_CONTEXT_TOKENS,
+        exclude=SCAN_EXCLUDE, workers=SCAN_WORKERS, max_depth=SCAN_MAX_DEPTH,
+    )
+    limiter = ModelLimiter(args.model_concurrency or args.workers, args.rpm)
+    # Свой чекпоинтер, а не agent.CHECKPOINTER: тот создается вместе с синхронным клиентом и графом
+    checkpointer = open_checkpointer()
+    runner = BatchRunner(tasks, args.output, build_system_prompt(project_summary.text), build_async_llm(),
+                         checkpointer=checkpointer, workers=args.workers, limiter=limiter,
+                         timeout=args.timeout or None, max_steps=args.max_steps)
+    pending = runner.pending()
+    print(f"{ASSISTANT_COLOR}Задач: {len(tasks)}, к выполнению: {len(pending)}, результаты: {args.output}"
+          f"{'' if checkpointer is not None else ' (без чекпоинтера прерванные задачи начнутся заново)'}"
+          f"{RESET_COLOR}")
+    start = time.perf_counter()
+    try:
+        results = await runner.run()
+    finally:
+        if WATCHER is not None:
+            WATCHER.stop()
+        if checkpointer is not None:
+            checkpointer.close()
+    print(format_batch_summary(results, time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выполняет задачи из JSONL без участия пользователя; "
+                                                 "повторный запуск с тем же --output продолжает пакет")
+    parser.add_argument("tasks", type=Path, help='JSONL: {"id": ..., "prompt": "..."} или "prompts": [...]')
+    parser.add_argument("--output", "-o", type=Path, help="JSONL результатов (по умолчанию <tasks>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="задач одновременно")
+    parser.add_argument("--model-concurrency", type=int, default=0,
+                        help="запросов к модели одновременно на весь пакет (0 - по числу задач)")
+    parser.add_argument("--rpm", type=float, default=0, help="запросов к модели в минуту (0 - без лимита)")
+    parser.add_argument("--timeout", type=float, default=0, help="предел на задачу, s (0 - без предела)")
+    parser.add_argument("--max-steps", type=int, default=BATCH_MAX_STEPS, help="предел шагов графа на ход")
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = args.tasks.with_name(f"{args.tasks.stem}.results.jsonl")
+    try:
+        asyncio.run(arun_batch(args))
+    except KeyboardInterrupt:
+        print(f"{ASSISTANT_COLOR}Прервано: повторный запуск с тем же --output продолжит пакет{RESET_COLOR}")
+    finally:
+        TRACER.close()
+
+
+if __name__ == "__main__":
+    main()
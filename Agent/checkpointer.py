@@ -0,0 +1,370 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from scan_cache import CACHE_DIR_NAME
+
+CHECKPOINT_FILE_NAME = "checkpoints.sqlite"
+# Канал истории: хранится построчно, по сообщению на строку
+MESSAGES_CHANNEL = "messages"
+# Тип blob-а, вместо значения которого записаны (длина истории, ревизия строк)
+MESSAGE_ROWS_TYPE = "message_rows"
+# Быстрое сжатие: на JSON сообщений уровень выше почти не выигрывает в размере
+ZLIB_LEVEL = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, parent_id TEXT,
+    checkpoint_type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, type TEXT, data BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT, checkpoint_ns TEXT, position INTEGER, rev INTEGER, type TEXT, data BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, position, rev)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER,
+    channel TEXT, type TEXT, data BLOB, task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+_CHECKPOINT_COLUMNS = "checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata"
+
+
+def default_checkpoint_path() -> Path:
+    return Path.cwd() / CACHE_DIR_NAME / CHECKPOINT_FILE_NAME
+
+
+class _Head:
+    """Последний записанный чекпоинт ветки и история на момент записи"""
+    __slots__ = ("checkpoint_id", "messages")
+
+    def __init__(self, checkpoint_id: str, messages: Optional[List[Any]]):
+        self.checkpoint_id = checkpoint_id
+        self.messages = messages
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Чекпоинты графа в SQLite (WAL), история сообщений хранится дельтами.
+
+    Каждое сообщение канала messages записывается отдельной сжатой строкой
+    (позиция, ревизия) один раз; чекпоинт хранит только длину истории и ревизию.
+    Поэтому шаг пишет только новые и замененные сообщения, а не всю историю,
+    и объем записи не растет с длиной сессии. Значение на чекпоинте - последняя
+    ревизия каждой позиции, не превышающая ревизию чекпоинта. При продолжении
+    не с последнего записанного чекпоинта (ветвление) история пишется целиком.
+
+    Записи одного шага идут одной транзакцией; промежуточные записи задач
+    (put_writes) фиксируются вместе со следующим чекпоинтом.
+    """
+
+    def __init__(self, path: Optional[Path] = None, *, serde: Any = None):
+        super().__init__(serde=serde)
+        self.path = Path(path) if path is not None else default_checkpoint_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Граф может сохранять чекпоинты из рабочих потоков
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL-режиме NORMAL не делает fsync на каждую транзакцию, но не теряет целостность
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._heads: Dict[Tuple[str, str], _Head] = {}
+        self._revs: Dict[Tuple[str, str], int] = {}
+        self.rows_written = 0
+        self.bytes_written = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def get_next_version(self, current: Optional[Any], channel: None = None) -> str:
+        """Номер версии канала со случайным хвостом, как у InMemorySaver.
+
+        blobs адресуются версией канала; при ветвлении с раннего чекпоинта целые версии
+        повторились бы, и запись новой ветки заменила бы значения старой.
+        """
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            # Базы, записанные до перехода на строковые версии
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- сериализация ---
+
+    def _pack(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        data = zlib.compress(data, ZLIB_LEVEL)
+        self.bytes_written += len(data)
+        return type_, data
+
+    def _unpack(self, type_: str, data: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(data)))
+
+    # --- запись ---
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")
+        key = (thread_id, checkpoint_ns)
+        with self._lock:
+            head = self._heads.get(key)
+            if head is not None and head.checkpoint_id != parent_id:
+                # Продолжаем не с последнего записанного чекпоинта - дельта не применима
+                head = None
+            blob_rows = []
+            for channel, version in new_versions.items():
+                if channel not in values:
+                    type_, data = "empty", b""
+                elif channel == MESSAGES_CHANNEL and isinstance(values[channel], list):
+                    type_, data = self._put_messages(key, head, values[channel])
+                    head = _Head(checkpoint["id"], list(values[channel]))
+                else:
+                    type_, data = self._pack(values[channel])
+                blob_rows.append((thread_id, checkpoint_ns, channel, str(version), type_, data))
+            self._heads[key] = _Head(checkpoint["id"], head.messages if head is not None else None)
+            self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blob_rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id,
+                 *self._pack(c), *self._pack(get_checkpoint_metadata(config, metadata))),
+            )
+            self._conn.commit()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def _next_rev(self, key: Tuple[str, str]) -> int:
+        if key not in self._revs:
+            row = self._conn.execute(
+                "SELECT MAX(rev) FROM messages WHERE thread_id = ? AND checkpoint_ns = ?", key
+            ).fetchone()
+            self._revs[key] = row[0] or 0
+        self._revs[key] += 1
+        return self._revs[key]
+
+    def _put_messages(self, key: Tuple[str, str], head: Optional[_Head], messages: List[Any]) -> Tuple[str, bytes]:
+        """Пишет сообщения, которых не было в истории головы ветки; возвращает blob-ссылку"""
+        rev = self._next_rev(key)
+        previous = head.messages if head is not None and head.messages is not None else []
+        rows = []
+        for position, message in enumerate(messages):
+            # add_messages сохраняет объекты старых сообщений, поэтому достаточно сравнения по ссылке
+            if position < len(previous) and previous[position] is message:
+                continue
+            rows.append((*key, position, rev, *self._pack(message)))
+        self._conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.rows_written += len(rows)
+        return MESSAGE_ROWS_TYPE, json.dumps([len(messages), rev]).encode("ascii")
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Специальные записи (ошибки, прерывания) заменяют прежние, обычные - только добавляются
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+             channel, *self._pack(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "messages", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+            for key in [k for k in self._heads if k[0] == thread_id]:
+                del self._heads[key]
+            for key in [k for k in self._revs if k[0] == thread_id]:
+                del self._revs[key]
+
+    # --- чтение ---
+
+    def _load_messages(self, thread_id: str, checkpoint_ns: str, length: int, rev: int) -> List[Any]:
+        latest: Dict[int, Tuple[str, bytes]] = {}
+        for position, type_, data in self._conn.execute(
+            "SELECT position, type, data FROM messages "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND position < ? AND rev <= ? ORDER BY position, rev",
+            (thread_id, checkpoint_ns, length, rev),
+        ):
+            latest[position] = (type_, data)
+        return [self._unpack(*latest[position]) for position in range(length)]
+
+    def _load_values(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                     versions: ChannelVersions) -> Dict[str, Any]:
+        head = self._heads.get((thread_id, checkpoint_ns))
+        values = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT type, data FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == MESSAGE_ROWS_TYPE:
+                length, rev = json.loads(row[1])
+                if (head is not None and head.checkpoint_id == checkpoint_id and head.messages is not None
+                        and len(head.messages) == length):
+                    # Продолжение сессии в том же процессе: история уже в памяти
+                    values[channel] = list(head.messages)
+                else:
+                    values[channel] = self._load_messages(thread_id, checkpoint_ns, length, rev)
+            else:
+                values[channel] = self._unpack(*row)
+        return values
+
+    def _build_tuple(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, parent_id: Optional[str],
+                     checkpoint_type: str, checkpoint_blob: bytes, metadata_type: str, metadata_blob: bytes,
+                     metadata: Any = None) -> CheckpointTuple:
+        checkpoint = self._unpack(checkpoint_type, checkpoint_blob)
+        checkpoint["channel_values"] = self._load_values(thread_id, checkpoint_ns, checkpoint_id,
+                                                         checkpoint["channel_versions"])
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, data FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=metadata if metadata is not None else self._unpack(metadata_type, metadata_blob),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._unpack(type_, data)) for task_id, channel, type_, data in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            result = self._build_tuple(thread_id, checkpoint_ns, *row)
+            if not checkpoint_id:
+                # Граф продолжит с последнего чекпоинта теми же объектами сообщений - следующий шаг запишет только новые
+                messages = result.checkpoint["channel_values"].get(MESSAGES_CHANNEL)
+                self._heads[(thread_id, checkpoint_ns)] = _Head(
+                    result.config["configurable"]["checkpoint_id"], messages if isinstance(messages, list) else None
+                )
+            return result
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = f"SELECT thread_id, checkpoint_ns, {_CHECKPOINT_COLUMNS} FROM checkpoints"
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self._unpack(row[6], row[7])
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                item = self._build_tuple(*row, metadata=metadata)
+            yield item
+
+    def latest_thread(self) -> Optional[str]:
+        """thread_id последней сохраненной сессии"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT thread_id FROM checkpoints WHERE checkpoint_ns = '' ORDER BY checkpoint_id DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    # --- асинхронные варианты: SQLite работает в потоке, чтобы не блокировать цикл событий ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
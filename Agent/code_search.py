@@ -0,0 +1,208 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from project_scanner import file_versions, load_project_scan
+from scan_cache import CACHE_DIR_NAME, RACY_MTIME_WINDOW_NS
+
+SEARCH_INDEX_FILE_NAME = "search_index.sqlite"
+# Файлы крупнее не индексируются: обычно это данные или сгенерированный код
+MAX_INDEXED_FILE_BYTES = 1024 * 1024
+# Сколько номеров строк хранить для пары (термин, файл) - по ним строятся сниппеты
+MAX_LINES_PER_TERM = 8
+MAX_SNIPPET_CHARS = 200
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+")
+# Части идентификатора: HTTPResponse -> HTTP, Response; parse_json -> parse, json
+_SUBWORD = re.compile(r"[A-ZА-ЯЁ]+(?![a-zа-яё])|[A-ZА-ЯЁ]?[a-zа-яё]+|\d+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, rel TEXT UNIQUE, mtime_ns INTEGER, size INTEGER, length INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT, file_id INTEGER, tf INTEGER, lines TEXT,
+    PRIMARY KEY (term, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+
+@lru_cache(maxsize=65536)
+def _expand(word: str) -> Tuple[str, ...]:
+    """Токены одного слова; идентификаторы в коде повторяются, поэтому разбор кэшируется"""
+    parts = [p.lower() for p in _SUBWORD.findall(word)]
+    lower = word.lower()
+    tokens = [lower] if parts != [lower] and len(lower) > 1 else []
+    tokens.extend(p for p in parts if len(p) > 1)
+    return tuple(tokens)
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста в нижнем регистре; составные идентификаторы дают и себя целиком, и свои части"""
+    tokens = []
+    for word in _WORD.findall(text):
+        tokens.extend(_expand(word))
+    return tokens
+
+
+def index_text(text: str) -> Tuple[int, Dict[str, Tuple[int, List[int]]]]:
+    """Длина документа в токенах и термин -> (частота, первые номера строк)"""
+    terms: Dict[str, List[Any]] = {}
+    length = 0
+    for lineno, line in enumerate(text.splitlines(), 1):
+        for word in _WORD.findall(line):
+            for token in _expand(word):
+                length += 1
+                entry = terms.get(token)
+                if entry is None:
+                    terms[token] = [1, [lineno]]
+                    continue
+                entry[0] += 1
+                lines = entry[1]
+                if lines[-1] != lineno and len(lines) < MAX_LINES_PER_TERM:
+                    lines.append(lineno)
+    return length, {term: (tf, lines) for term, (tf, lines) in terms.items()}
+
+
+def read_text(path: Path, max_bytes: int = MAX_INDEXED_FILE_BYTES) -> Optional[str]:
+    """Текст файла для индексации; None для больших и двоичных файлов"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return None
+    if len(data) > max_bytes or b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class CodeSearchIndex:
+    """Инвертированный индекс проекта на диске с ранжированием BM25.
+
+    Файлы берутся тем же обходом, что и структура проекта (те же исключения и
+    .gitignore). update() переиндексирует только файлы с изменившимися mtime или
+    размером и удаляет пропавшие, поэтому повторные вызовы дешевые.
+    """
+
+    def __init__(self, root: Path, index_path: Optional[Path] = None,
+                 exclude: Optional[Sequence[str]] = None, workers: int = 1,
+                 max_file_bytes: int = MAX_INDEXED_FILE_BYTES):
+        self.root = root
+        self.index_path = index_path or root / CACHE_DIR_NAME / SEARCH_INDEX_FILE_NAME
+        self.exclude = exclude
+        self.workers = workers
+        self.max_file_bytes = max_file_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        # id -> (rel, length); держим в памяти, чтобы запрос не ходил за длинами документов
+        self._files: Dict[int, Tuple[str, int]] = {}
+        # Инструмент может вызываться из нескольких потоков одного шага
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._files = {file_id: (rel, length) for file_id, rel, length
+                           in self._conn.execute("SELECT id, rel, length FROM files")}
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def update(self, versions: Optional[Dict[str, Tuple[int, int]]] = None) -> Dict[str, int]:
+        """Приводит индекс в соответствие с файлами проекта; возвращает число обновленных и удаленных.
+
+        versions - готовые версии файлов (например, от ProjectWatcher) вместо обхода проекта.
+        """
+        if versions is None:
+            versions = file_versions(load_project_scan(self.root, exclude=self.exclude, workers=self.workers))
+        racy_after = time.time_ns() - RACY_MTIME_WINDOW_NS
+        with self._lock:
+            conn = self._connect()
+            stored = {rel: (file_id, mtime_ns, size) for file_id, rel, mtime_ns, size
+                      in conn.execute("SELECT id, rel, mtime_ns, size FROM files")}
+            changed = [rel for rel, version in versions.items()
+                       if rel not in stored or stored[rel][1:] != version]
+            removed = [stored[rel][0] for rel in stored.keys() - versions.keys()]
+            with conn:
+                for file_id in removed + [stored[rel][0] for rel in changed if rel in stored]:
+                    conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                    self._files.pop(file_id, None)
+                for rel in changed:
+                    text = read_text(self.root / rel, self.max_file_bytes)
+                    length, terms = index_text(text) if text is not None else (0, {})
+                    mtime_ns, size = versions[rel]
+                    if mtime_ns > racy_after:
+                        # Файл мог измениться еще раз в тот же квант mtime - проверим его снова при следующем обновлении
+                        mtime_ns = -1
+                    file_id = conn.execute(
+                        "INSERT INTO files (rel, mtime_ns, size, length) VALUES (?, ?, ?, ?)",
+                        (rel, mtime_ns, size, length),
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT INTO postings (term, file_id, tf, lines) VALUES (?, ?, ?, ?)",
+                        [(term, file_id, tf, ",".join(map(str, lines))) for term, (tf, lines) in terms.items()],
+                    )
+                    self._files[file_id] = (rel, length)
+        return {"files": len(versions), "updated": len(changed), "removed": len(removed)}
+
+    def search(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
+        """Файлы, лучше всего подходящие под запрос, с номером и текстом самой подходящей строки"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            conn = self._connect()
+            documents = sum(1 for _, length in self._files.values() if length)
+            if not documents:
+                return []
+            avg_length = sum(length for _, length in self._files.values()) / documents
+            scores: Dict[int, float] = defaultdict(float)
+            term_lines: Dict[int, Dict[str, List[int]]] = defaultdict(dict)
+            for term in terms:
+                rows = conn.execute("SELECT file_id, tf, lines FROM postings WHERE term = ?", (term,)).fetchall()
+                idf = math.log(1 + (documents - len(rows) + 0.5) / (len(rows) + 0.5))
+                for file_id, tf, lines in rows:
+                    length = self._files[file_id][1]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[file_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    term_lines[file_id][term] = [int(n) for n in lines.split(",")]
+            top = sorted(scores.items(), key=lambda item: (-item[1], self._files[item[0]][0]))[:max_results]
+            return [self._result(file_id, score, term_lines[file_id]) for file_id, score in top]
+
+    def _result(self, file_id: int, score: float, term_lines: Dict[str, List[int]]) -> Dict[str, Any]:
+        rel = self._files[file_id][0]
+        # Лучшая строка - та, где встречается больше разных терминов запроса
+        line_hits: Dict[int, int] = defaultdict(int)
+        for lines in term_lines.values():
+            for lineno in lines:
+                line_hits[lineno] += 1
+        ranked = sorted(line_hits, key=lambda n: (-line_hits[n], n))
+        best = ranked[0]
+        text = read_text(self.root / rel, self.max_file_bytes) or ""
+        file_lines = text.splitlines()
+        snippet = file_lines[best - 1].strip() if best <= len(file_lines) else ""
+        return {
+            "path": rel,
+            "line": best,
+            "score": round(score, 3),
+            "snippet": snippet[:MAX_SNIPPET_CHARS],
+            "other_lines": sorted(ranked[1:6]),
+        }
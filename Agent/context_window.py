@@ -0,0 +1,232 @@
+import json
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from payload_store import reference_target
+from tokens import count_tokens
+
+# Служебные токены на каждое сообщение (роль, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Длина строковых аргументов старых вызовов, после которой они сворачиваются
+MAX_OLD_ARG_CHARS = 200
+# Сколько символов реплик попадает в строку краткого содержания
+SUMMARY_SNIPPET_CHARS = 200
+SUMMARY_HEADER = "=== КРАТКОЕ СОДЕРЖАНИЕ РАННЕЙ ЧАСТИ ДИАЛОГА ==="
+
+Turn = List[BaseMessage]
+
+
+def _snippet(text: Any, limit: int = SUMMARY_SNIPPET_CHARS) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _call_target(call: Dict[str, Any]) -> str:
+    args = call.get("args") or {}
+    if call.get("name") == "edit_file_batch":
+        paths = [e.get("path") for e in args.get("edits") or [] if isinstance(e, dict)]
+        return ", ".join(str(p) for p in paths if p)
+    for key in ("filename", "path", "query", "pattern", "name"):
+        if isinstance(args.get(key), str):
+            return args[key]
+    return ""
+
+
+def summarize_turn(turn: Turn) -> str:
+    """Одна строка краткого содержания хода: запрос, вызванные инструменты и ответ"""
+    parts = []
+    calls = []
+    answer = ""
+    for message in turn:
+        if isinstance(message, HumanMessage):
+            parts.append(f"Пользователь: {_snippet(message.content)}")
+        elif isinstance(message, AIMessage):
+            calls.extend(f"{c['name']}({_call_target(c)})" for c in message.tool_calls)
+            if message.content:
+                answer = message.content
+    if calls:
+        parts.append(f"инструменты: {', '.join(calls)}")
+    if answer:
+        parts.append(f"ответ: {_snippet(answer)}")
+    return "- " + "; ".join(parts)
+
+
+class ContextWindow:
+    """Укладывает историю в бюджет токенов перед каждым запросом к модели.
+
+    Системный промпт и последние keep_turns ходов (ход начинается с сообщения
+    пользователя) идут без изменений. В более старых ходах результаты инструментов
+    и длинные аргументы вызовов заменяются пометкой; если этого мало, самые старые
+    ходы целиком сворачиваются в краткое содержание в конце системного промпта.
+    Сама история не меняется - модель получает ее сжатое представление.
+    """
+
+    def __init__(self, token_budget: int = 16000, keep_turns: int = 3,
+                 summarizer: Callable[[Turn], str] = summarize_turn):
+        self.token_budget = token_budget
+        self.keep_turns = max(keep_turns, 1)
+        self.summarizer = summarizer
+        # id сообщения -> (хэш содержимого, токены); история дописывается, поэтому сообщение считается один раз.
+        # Хэш нужен системному сообщению: CLI заменяет его с тем же id, когда готово полное описание проекта
+        self._token_counts: Dict[str, Tuple[int, int]] = {}
+        # id первого сообщения хода -> (строка краткого содержания, ее токены)
+        self._summaries: Dict[str, Tuple[str, int]] = {}
+
+    def count(self, message: BaseMessage) -> int:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        # Хэш строки Python кэширует в самом объекте, повторная проверка дешевая
+        key = hash(content)
+        cached = self._token_counts.get(message.id) if message.id else None
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            tokens += count_tokens(json.dumps(message.tool_calls, ensure_ascii=False))
+        if message.id:
+            self._token_counts[message.id] = (key, tokens)
+        return tokens
+
+    def total(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.count(m) for m in messages)
+
+    def fit(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Сообщения для запроса к модели, укладывающиеся в token_budget, если это возможно"""
+        messages = list(messages)
+        if self.token_budget <= 0 or self.total(messages) <= self.token_budget:
+            return messages
+
+        head_len = 0
+        while head_len < len(messages) and isinstance(messages[head_len], SystemMessage):
+            head_len += 1
+        head, turns = messages[:head_len], self._split_turns(messages[head_len:])
+        recent = turns[-self.keep_turns:]
+        old = [self._compact_turn(turn) for turn in turns[:-self.keep_turns]]
+        summarized = 0
+
+        def assemble() -> List[BaseMessage]:
+            result = self._with_summary(head, turns[:summarized])
+            for turn in old + recent:
+                result.extend(turn)
+            return self._resolve_references(result, messages)
+
+        view = assemble()
+        # Сначала сворачиваем старые ходы, затем - недавние, кроме текущего
+        while self.total(view) > self.token_budget and summarized < len(turns) - 1:
+            (old or recent).pop(0)
+            summarized += 1
+            view = assemble()
+        if self.total(view) > self.token_budget and recent:
+            # Остался один текущий ход: убираем результаты его прошлых шагов, кроме последнего
+            recent[-1] = self._compact_turn(recent[-1], keep_last_step=True)
+            view = assemble()
+        return view
+
+    @staticmethod
+    def _split_turns(messages: Sequence[BaseMessage]) -> List[Turn]:
+        turns: List[Turn] = []
+        for message in messages:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _compact_turn(self, turn: Turn, keep_last_step: bool = False) -> Turn:
+        """Ход без результатов инструментов и длинных аргументов; пары вызов-результат сохраняются"""
+        last_ai = max((i for i, m in enumerate(turn) if isinstance(m, AIMessage)), default=len(turn))
+        limit = last_ai if keep_last_step else len(turn)
+        compacted = []
+        for i, message in enumerate(turn):
+            if i >= limit:
+                compacted.append(message)
+            elif isinstance(message, ToolMessage):
+                compacted.append(self._elide_result(message))
+            elif isinstance(message, AIMessage) and message.tool_calls:
+                compacted.append(self._elide_args(message))
+            else:
+                compacted.append(message)
+        return compacted
+
+    def _elide_result(self, message: ToolMessage) -> ToolMessage:
+        tokens = self.count(message)
+        if tokens <= MESSAGE_OVERHEAD_TOKENS + 32:
+            return message
+        return ToolMessage(
+            content=f"[elided: {message.name} result from an earlier step ({tokens} tokens); call the tool again if needed]",
+            tool_call_id=message.tool_call_id,
+            name=message.name,
+            id=f"{message.id}:elided" if message.id else None,
+        )
+
+    @staticmethod
+    def _elide_args(message: AIMessage) -> AIMessage:
+        def shrink(value: Any) -> Any:
+            if isinstance(value, str) and len(value) > MAX_OLD_ARG_CHARS:
+                return f"[elided: {len(value)} chars]"
+            if isinstance(value, dict):
+                return {k: shrink(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [shrink(v) for v in value]
+            return value
+
+        calls = [{**call, "args": shrink(call.get("args") or {})} for call in message.tool_calls]
+        if calls == message.tool_calls:
+            return message
+        return AIMessage(content=message.content, tool_calls=calls,
+                         id=f"{message.id}:elided" if message.id else None)
+
+    def _with_summary(self, head: List[BaseMessage], summarized: List[Turn]) -> List[BaseMessage]:
+        if not summarized:
+            return list(head)
+        lines: List[Tuple[str, int]] = []
+        for turn in summarized:
+            key = turn[0].id
+            entry = self._summaries.get(key) if key is not None else None
+            if entry is None:
+                line = self.summarizer(turn)
+                entry = (line, count_tokens(line))
+                if key is not None:
+                    self._summaries[key] = entry
+            lines.append(entry)
+        # Само краткое содержание тоже ограничено: самые ранние строки отбрасываются.
+        # Токены складываются из посчитанных строк (плюс по токену на перевод строки), а не
+        # пересчитываются по всему тексту: fit() собирает сводку заново на каждом шаге цикла
+        limit = self.token_budget // 4
+        tokens = sum(t for _, t in lines) + len(lines) - 1
+        dropped = 0
+        while len(lines) > 1 and tokens > limit:
+            tokens -= lines.pop(0)[1] + 1
+            dropped += 1
+        text_lines = [line for line, _ in lines]
+        if dropped:
+            text_lines.insert(0, f"- (еще {dropped} ранних ходов опущено)")
+            tokens += count_tokens(text_lines[0]) + 1
+        summary = f"{SUMMARY_HEADER}\n" + "\n".join(text_lines)
+        tokens += count_tokens(SUMMARY_HEADER) + 1
+        if head:
+            system = head[-1]
+            content = system.content if isinstance(system.content, str) else json.dumps(system.content)
+            message = SystemMessage(content=f"{content}\n\n{summary}", id=f"{system.id or 'system'}:summary")
+            tokens += self.count(system) + 1
+            head = head[:-1]
+        else:
+            message = SystemMessage(content=summary, id="summary")
+            tokens += MESSAGE_OVERHEAD_TOKENS
+        # Токены сообщения уже известны по частям: с ними в кэше total() не считает текст заново
+        self._token_counts[message.id] = (hash(message.content), tokens)
+        return list(head) + [message]
+
+    @staticmethod
+    def _resolve_references(view: List[BaseMessage], history: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Ссылка PayloadStore на результат, который был свернут, заменяется самим результатом"""
+        # Свернутые копии получают id с суффиксом ":elided", поэтому в visible не попадают
+        visible = {m.id for m in view if isinstance(m, ToolMessage)}
+        originals = {m.id: m for m in history if isinstance(m, ToolMessage) and m.id}
+        resolved = []
+        for message in view:
+            target = reference_target(message) if isinstance(message, ToolMessage) else None
+            if target is not None and target not in visible and target in originals:
+                message = ToolMessage(content=originals[target].content, tool_call_id=message.tool_call_id,
+                                      name=message.name, id=f"{message.id}:inlined" if message.id else None)
+            resolved.append(message)
+        return resolved
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+# Файлы крупнее читаются через mmap и в кэш не попадают
+DEFAULT_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# Файлы, измененные недавно, не кэшируем: повторная запись в тот же квант mtime с тем же
+# размером была бы не видна
+RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+
+class CachedFile:
+    __slots__ = ("data", "text")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        # Полный декодированный текст, заполняется при первом чтении файла целиком
+        self.text: Optional[str] = None
+
+
+class FileContentCache:
+    """LRU-кэш содержимого файлов с ограничением по байтам.
+
+    Ключ - разрешенный путь, запись действительна, пока у файла те же (st_mtime_ns, st_size).
+    Потокобезопасен: инструменты могут читать файлы параллельно.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES,
+                 max_entry_bytes: int = DEFAULT_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], CachedFile]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> Optional[CachedFile]:
+        """Содержимое файла из кэша или с диска; None для файлов крупнее max_entry_bytes"""
+        key = str(path)
+        st = os.stat(key)
+        version = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            if cached is not None:
+                # Файл изменился - устаревшая запись больше не нужна
+                del self._entries[key]
+                self.current_bytes -= len(cached[1].data)
+        if st.st_size > self.max_entry_bytes:
+            return None
+        with open(key, "rb") as f:
+            entry = CachedFile(f.read())
+        if time.time_ns() - st.st_mtime_ns > RACY_MTIME_WINDOW_NS and len(entry.data) == st.st_size:
+            self._store(key, version, entry)
+        return entry
+
+    def _store(self, key: str, version: Tuple[int, int], entry: CachedFile):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[1].data)
+            self._entries[key] = (version, entry)
+            self.current_bytes += len(entry.data)
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted.data)
+                self.evictions += 1
+
+    def invalidate(self, path: Path):
+        with self._lock:
+            old = self._entries.pop(str(path), None)
+            if old is not None:
+                self.current_bytes -= len(old[1].data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Общий кэш процесса для read_file и edit_file
+CONTENT_CACHE = FileContentCache()
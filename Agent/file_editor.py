@@ -0,0 +1,216 @@
+import json
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from scan_cache import CACHE_DIR_NAME
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+JOURNAL_DIR_NAME = "edit_journal"
+
+# umask процесса читается один раз при импорте: os.umask умеет только менять маску, а
+# поменять и вернуть ее, пока работают потоки инструментов, небезопасно
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(path: Path, text: str):
+    """Пишет файл через временный файл в той же директории и os.replace - файл никогда не остается обрезанным.
+
+    Ссылка сохраняется: пишется файл, на который она указывает. Новый файл получает права
+    0o666 & ~umask, как при обычном open(), существующий - свои прежние права.
+    """
+    path = Path(os.path.realpath(path))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            # mkstemp создает файл с правами 0o600
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def apply_replacements(text: str, edits: Sequence[Tuple[str, str]]) -> Tuple[str, Optional[int]]:
+    """Применяет замены по порядку к тексту в памяти; возвращает текст и индекс первой ненайденной"""
+    for i, (old_str, new_str) in enumerate(edits):
+        if old_str == "":
+            text = new_str
+            continue
+        pos = text.find(old_str)
+        if pos == -1:
+            return text, i
+        text = text[:pos] + new_str + text[pos + len(old_str):]
+    return text, None
+
+
+class EditJournal:
+    """Журнал отката для пакетной правки: исходное содержимое файлов до записи.
+
+    Журнал лежит на диске, пока пакет не записан целиком, поэтому после падения
+    процесса незавершенный пакет можно откатить через recover(). Пока пакет пишется,
+    процесс держит на журнале блокировку flock: другой агент или пакетный запуск в том
+    же проекте не примет журнал живого процесса за брошенный.
+    """
+
+    def __init__(self, journal_dir: Path):
+        self.journal_dir = journal_dir
+        self.path: Optional[Path] = None
+        self.originals: List[Tuple[Path, Optional[str]]] = []
+        self._fd: Optional[int] = None
+
+    def begin(self, originals: List[Tuple[Path, Optional[str]]]):
+        self.originals = originals
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        # Пишется под именем, которое recover() не подбирает, и переименовывается уже заблокированным
+        fd, tmp_name = tempfile.mkstemp(prefix=".batch-", suffix=".tmp", dir=str(self.journal_dir))
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            payload = json.dumps([[str(p), text] for p, text in originals], ensure_ascii=False)
+            os.write(fd, zlib.compress(payload.encode("utf-8")))
+            os.fsync(fd)
+            path = Path(tmp_name).with_name(Path(tmp_name).name[1:-len(".tmp")] + ".journal")
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.close(fd)
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        self._fd = fd
+        self.path = path
+
+    def rollback(self, written: Sequence[Path]):
+        """Возвращает уже записанные файлы к исходному содержимому; созданные файлы удаляет"""
+        originals = dict(self.originals)
+        for path in written:
+            original = originals.get(path)
+            if original is None:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            else:
+                atomic_write(path, original)
+        self.commit()
+
+    def commit(self):
+        if self.path is not None:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self.path = None
+        # Блокировка снимается только после удаления журнала
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @classmethod
+    def recover(cls, journal_dir: Path) -> List[str]:
+        """Откатывает пакеты, оставшиеся незавершенными после падения; возвращает восстановленные пути.
+
+        Журналы, заблокированные живым процессом, пропускаются. Без fcntl (Windows) живой
+        владелец не определяется, и откатываются все журналы.
+        """
+        restored = []
+        if not journal_dir.is_dir():
+            return restored
+        for journal_path in sorted(journal_dir.glob("batch-*.journal")):
+            try:
+                fd = os.open(journal_path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                # Владелец мог успеть завершить пакет и удалить журнал, пока мы ждали блокировку
+                if os.fstat(fd).st_nlink == 0:
+                    continue
+                try:
+                    with os.fdopen(os.dup(fd), "rb") as f:
+                        entries = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+                except (OSError, ValueError, zlib.error):
+                    journal_path.unlink()
+                    continue
+                journal = cls(journal_dir)
+                journal.path = journal_path
+                journal.originals = [(Path(p), text) for p, text in entries]
+                journal.rollback([p for p, _ in journal.originals])
+                restored.extend(p for p, _ in entries)
+            finally:
+                os.close(fd)
+        return restored
+
+
+def default_journal_dir() -> Path:
+    return Path.cwd() / CACHE_DIR_NAME / JOURNAL_DIR_NAME
+
+
+def edit_files(edits: Sequence[Tuple[Path, str, str]], journal_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Атомарно применяет упорядоченный список замен (path, old_str, new_str), возможно к нескольким файлам.
+
+    Каждый файл читается и пишется один раз. Если какая-то замена не найдена, ничего
+    не записывается; если запись упала посередине, уже записанные файлы откатываются.
+    """
+    by_path: Dict[Path, List[Tuple[str, str]]] = {}
+    for path, old_str, new_str in edits:
+        by_path.setdefault(path, []).append((old_str, new_str))
+
+    originals: List[Tuple[Path, Optional[str]]] = []
+    updated: List[Tuple[Path, str]] = []
+    for path, file_edits in by_path.items():
+        original = path.read_text(encoding="utf-8") if path.exists() else None
+        if original is None and file_edits[0][0] != "":
+            return {"path": str(path), "action": "file not found", "applied": False}
+        text, failed = apply_replacements(original or "", file_edits)
+        if failed is not None:
+            return {
+                "path": str(path),
+                "action": "old_str not found",
+                "old_str": file_edits[failed][0],
+                "applied": False,
+            }
+        originals.append((path, original))
+        updated.append((path, text))
+
+    journal = EditJournal(journal_dir or default_journal_dir())
+    journal.begin(originals)
+    written: List[Path] = []
+    try:
+        for path, text in updated:
+            atomic_write(path, text)
+            written.append(path)
+    except OSError as e:
+        journal.rollback(written)
+        return {"action": "rolled back", "error": str(e), "applied": False}
+    journal.commit()
+    return {
+        "action": "edited",
+        "applied": True,
+        "files": [str(p) for p, _ in updated],
+        "edits": len(edits),
+    }
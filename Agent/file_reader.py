@@ -0,0 +1,125 @@
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from file_cache import CONTENT_CACHE, FileContentCache
+
+# Больше этого в один ответ инструмента не попадает, остальное - через курсор
+READ_LIMIT_BYTES = 64 * 1024
+
+# Содержимое из кэша (bytes) или отображение файла (mmap) - интерфейс поиска и срезов одинаковый
+Buffer = Union[bytes, mmap.mmap]
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _line_start(mm: Buffer, line: int) -> int:
+    """Смещение начала строки line (нумерация с 1); -1, если в файле меньше строк"""
+    pos = 0
+    for _ in range(line - 1):
+        pos = mm.find(b"\n", pos)
+        if pos == -1:
+            return -1
+        pos += 1
+    return pos if pos < len(mm) or line == 1 else -1
+
+
+def _read_lines(mm: Buffer, start_line: int, end_line: Optional[int], limit: int) -> Dict[str, Any]:
+    start = _line_start(mm, start_line)
+    if start == -1:
+        return {"content": "", "start_line": start_line, "end_line": start_line - 1}
+    pos = start
+    line = start_line - 1
+    while pos < len(mm) and (end_line is None or line < end_line):
+        newline = mm.find(b"\n", pos)
+        stop = len(mm) if newline == -1 else newline + 1
+        if stop - start > limit:
+            if line >= start_line:
+                break
+            # Первая же строка длиннее лимита: отдаем ее начало и байтовый курсор на продолжение
+            return {"content": _decode(mm[start:start + limit]), "start_line": start_line, "end_line": start_line,
+                    "truncated": True, "next_offset": start + limit}
+        pos = stop
+        line += 1
+    result = {"content": _decode(mm[start:pos]), "start_line": start_line, "end_line": line}
+    if pos < len(mm) and (end_line is None or line < end_line):
+        result["truncated"] = True
+        result["next_line"] = line + 1
+    return result
+
+
+def _read_bytes(mm: Buffer, offset: int, length: Optional[int], limit: int) -> Dict[str, Any]:
+    size = len(mm)
+    offset = min(max(offset, 0), size)
+    stop = size if length is None else min(size, offset + max(length, 0))
+    truncated = stop - offset > limit
+    if truncated:
+        stop = offset + limit
+    result = {"content": _decode(mm[offset:stop]), "offset": offset}
+    if truncated or (length is None and stop < size):
+        result["truncated"] = True
+        result["next_offset"] = stop
+    return result
+
+
+def _read_head_tail(mm: Buffer, limit: int) -> Dict[str, Any]:
+    """Начало и конец большого файла, обрезанные по границам строк, и курсор на пропуск"""
+    size = len(mm)
+    half = limit // 2
+    head_end = mm.rfind(b"\n", 0, half) + 1 or half
+    tail_start = mm.find(b"\n", size - half) + 1 or size - half
+    skipped = tail_start - head_end
+    marker = f"\n... [truncated {skipped} bytes; call read_file with offset={head_end} to continue] ...\n"
+    return {
+        "content": _decode(mm[:head_end]) + marker + _decode(mm[tail_start:]),
+        "truncated": True,
+        "next_offset": head_end,
+    }
+
+
+def _read_buffer(mm: Buffer, start_line: Optional[int], end_line: Optional[int],
+                 offset: Optional[int], length: Optional[int], limit: int) -> Dict[str, Any]:
+    if start_line is not None or end_line is not None:
+        return _read_lines(mm, max(start_line or 1, 1), end_line, limit)
+    if offset is not None or length is not None:
+        return _read_bytes(mm, offset or 0, length, limit)
+    if len(mm) > limit:
+        return _read_head_tail(mm, limit)
+    return {"content": _decode(mm[:])}
+
+
+def read_file_range(path: Path, start_line: Optional[int] = None, end_line: Optional[int] = None,
+                    offset: Optional[int] = None, length: Optional[int] = None,
+                    limit: int = READ_LIMIT_BYTES,
+                    cache: Optional[FileContentCache] = CONTENT_CACHE) -> Dict[str, Any]:
+    """Читает файл целиком, диапазон строк или диапазон байт, не больше limit байт за раз.
+
+    Небольшие файлы берутся из cache, крупные отображаются через mmap, поэтому в память
+    попадает только возвращаемый кусок.
+    Если ответ обрезан, в нем есть truncated и курсор next_line/next_offset.
+    """
+    entry = cache.get(path) if cache is not None else None
+    if entry is not None:
+        result: Dict[str, Any] = {"file_path": str(path), "total_bytes": len(entry.data)}
+        is_full_read = start_line is None and end_line is None and offset is None and length is None
+        if is_full_read and len(entry.data) <= limit:
+            # Целиком файл читают чаще всего - декодируем его один раз
+            if entry.text is None:
+                entry.text = _decode(entry.data)
+            result["content"] = entry.text
+        else:
+            result.update(_read_buffer(entry.data, start_line, end_line, offset, length, limit))
+        return result
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        result = {"file_path": str(path), "total_bytes": size}
+        if size == 0:
+            result["content"] = ""
+            return result
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            result.update(_read_buffer(mm, start_line, end_line, offset, length, limit))
+    return result
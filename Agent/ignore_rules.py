@@ -0,0 +1,141 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Pattern, Sequence
+
+IGNORE_FILE_NAMES = (".gitignore", ".ignore")
+
+# То, что сканер пропускал всегда, плюс типичные тяжелые каталоги
+DEFAULT_EXCLUDES = (".*/", "__pycache__/", "node_modules/")
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+    # Путь директории (относительно корня), в которой объявлено правило
+    base: str
+
+
+def _translate(pattern: str) -> str:
+    """Переводит glob в стиле .gitignore в регулярное выражение"""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                before_ok = i == 0 or pattern[i - 1] == "/"
+                after = pattern[i + 2:i + 3]
+                if before_ok and after == "/":
+                    parts.append("(?:.*/)?")
+                    i += 3
+                    continue
+                if before_ok and after == "":
+                    parts.append(".*")
+                    i += 2
+                    continue
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    return f"^{prefix}{''.join(parts)}$"
+
+
+def parse_rule(line: str, base: str = "") -> Optional[IgnoreRule]:
+    """Разбирает одну строку .gitignore, для пустых строк и комментариев возвращает None"""
+    line = line.rstrip("\n\r")
+    if not line or line.startswith("#"):
+        return None
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    return IgnoreRule(re.compile(_translate(line)), negate, dir_only, base)
+
+
+def _read_rules(path: str, base: str) -> List[IgnoreRule]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        rule = parse_rule(line, base)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+class IgnoreMatcher:
+    """Набор правил исключения, скомпилированный один раз на директорию.
+
+    Правила проверяются с конца: побеждает последнее совпавшее, как в git.
+    Пути передаются относительно корня проекта через "/".
+    """
+
+    def __init__(self, rules: Sequence[IgnoreRule] = (), use_ignore_files: bool = True):
+        self.rules = tuple(rules)
+        self.use_ignore_files = use_ignore_files
+
+    @classmethod
+    def from_excludes(cls, exclude: Optional[Iterable[str]] = None,
+                      use_ignore_files: bool = True) -> "IgnoreMatcher":
+        """Матчер корня: DEFAULT_EXCLUDES плюс пользовательские исключения"""
+        patterns = DEFAULT_EXCLUDES + tuple(exclude or ())
+        rules = [r for r in (parse_rule(p) for p in patterns) if r is not None]
+        return cls(rules, use_ignore_files)
+
+    def child(self, abs_dir: str, rel_dir: str, names: Iterable[str]) -> "IgnoreMatcher":
+        """Матчер для поддиректории: добавляет её .gitignore/.ignore, если они есть среди names"""
+        if not self.use_ignore_files:
+            return self
+        found = [n for n in IGNORE_FILE_NAMES if n in names]
+        if not found:
+            return self
+        rules = list(self.rules)
+        for name in found:
+            rules.extend(_read_rules(os.path.join(abs_dir, name), rel_dir))
+        return IgnoreMatcher(rules, self.use_ignore_files)
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.base:
+                if not rel_path.startswith(rule.base + "/"):
+                    continue
+                candidate = rel_path[len(rule.base) + 1:]
+            else:
+                candidate = rel_path
+            if rule.regex.match(candidate):
+                return not rule.negate
+        return False
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from scan_cache import CACHE_DIR_NAME
+from tokens import count_tokens
+
+SPANS_FILE_NAME = "spans.jsonl"
+# Сколько последних замеров одной сессии держать в памяти; в файл пишутся все
+MAX_SESSION_SPANS = 10000
+
+# Сессия, к которой относятся замеры текущего потока или задачи; узлы графа берут ее из thread_id
+_SESSION: contextvars.ContextVar = contextvars.ContextVar("agent_span_session", default="")
+
+
+def default_spans_path() -> Path:
+    return Path.cwd() / CACHE_DIR_NAME / SPANS_FILE_NAME
+
+
+def token_usage(usage: Optional[Dict[str, Any]], messages: Iterable[Any], completion: Any) -> Dict[str, Any]:
+    """Атрибуты токенов вызова модели: из usage ответа API, а если API его не вернул - оценка"""
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+    return {
+        "prompt_tokens": sum(count_tokens(m.content if isinstance(m.content, str) else str(m.content))
+                             for m in messages),
+        "completion_tokens": count_tokens(completion if isinstance(completion, str) else str(completion)),
+        "estimated": True,
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize_spans(spans: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Сводка по сессиям: для каждого (kind, name) число замеров, p50/p95/сумма в мс и суммы числовых атрибутов"""
+    durations: Dict[str, Dict[tuple, List[float]]] = defaultdict(lambda: defaultdict(list))
+    totals: Dict[str, Dict[tuple, Dict[str, float]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+    for span in spans:
+        session, key = span.get("session", ""), (span["kind"], span["name"])
+        durations[session][key].append(span["ms"])
+        for attr, value in span.get("attrs", {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[session][key][attr] += value
+    summary = {}
+    for session, by_key in durations.items():
+        rows = []
+        for (kind, name), values in sorted(by_key.items()):
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.5), 3),
+                "p95_ms": round(percentile(values, 0.95), 3),
+                "total_ms": round(sum(values), 3),
+                **{attr: round(value, 3) for attr, value in sorted(totals[session][(kind, name)].items())},
+            })
+        summary[session] = rows
+    return summary
+
+
+def format_summary(rows: List[Dict[str, Any]], title: str) -> str:
+    lines = [f"=== {title} ===",
+             f"{'замер':<28}{'раз':>6}{'p50, ms':>10}{'p95, ms':>10}{'всего, ms':>11}  токены/байты"]
+    for row in rows:
+        extra = []
+        if "prompt_tokens" in row or "completion_tokens" in row:
+            extra.append(f"prompt {row.get('prompt_tokens', 0):.0f}, completion {row.get('completion_tokens', 0):.0f}")
+        if "result_bytes" in row:
+            extra.append(f"{row['result_bytes']:.0f} B")
+        lines.append(f"{row['kind'] + ':' + row['name']:<28}{row['count']:>6}{row['p50_ms']:>10.1f}"
+                     f"{row['p95_ms']:>10.1f}{row['total_ms']:>11.1f}  {'; '.join(extra)}")
+    return "\n".join(lines)
+
+
+class SpanRecorder:
+    """Замеры узлов графа, вызовов модели, разбора ответа и инструментов.
+
+    Каждый замер - строка JSONL {"ts", "session", "kind", "name", "ms", "status", "attrs"}
+    в файле (если он задан) и запись в памяти для сводки по сессии. В памяти замеры
+    лежат по сессиям, не больше max_spans последних на сессию; pop_spans забирает
+    замеры сессии и забывает их. Запись из нескольких потоков и задач безопасна.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_spans: int = MAX_SESSION_SPANS):
+        self.path = path
+        self.max_spans = max_spans
+        self._file = None
+        self._sessions: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, path: Optional[Path]):
+        """Меняет файл замеров; None - только в памяти"""
+        with self._lock:
+            self._close_file()
+            self.path = path
+
+    def close(self):
+        with self._lock:
+            self._close_file()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[None]:
+        token = _SESSION.set(session_id)
+        try:
+            yield
+        finally:
+            _SESSION.reset(token)
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Замер блока; в возвращенный словарь можно дописать атрибуты (токены, байты)"""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(name, kind, time.perf_counter() - start, status=status, **attrs)
+
+    def record(self, name: str, kind: str, seconds: float, status: str = "ok", **attrs: Any):
+        span = {
+            "ts": round(time.time(), 6),
+            "session": _SESSION.get(),
+            "kind": kind,
+            "name": name,
+            "ms": round(seconds * 1000, 3),
+            "status": status,
+            "attrs": attrs,
+        }
+        with self._lock:
+            session = self._sessions.get(span["session"])
+            if session is None:
+                session = self._sessions[span["session"]] = deque(maxlen=self.max_spans)
+            session.append(span)
+            if self.path is None:
+                return
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+            # Строка должна попасть в файл, даже если процесс убьют
+            self._file.flush()
+
+    def spans(self, session: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if session is not None:
+                return list(self._sessions.get(session, ()))
+            return sorted((s for spans in self._sessions.values() for s in spans), key=lambda s: s["ts"])
+
+    def pop_spans(self, session: str) -> List[Dict[str, Any]]:
+        """Замеры сессии, после которых память о ней освобождается (пакет - после итогов задачи)"""
+        with self._lock:
+            return list(self._sessions.pop(session, ()))
+
+    def summary(self, session: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Сводка по одной сессии (или по всем замерам процесса, если session=None)"""
+        spans = self.spans(session)
+        if session is None:
+            spans = [{**s, "session": ""} for s in spans]
+        return summarize_spans(spans).get(session or "", [])
+
+    def instrument_node(self, name: str, node: Callable) -> Callable:
+        """Оборачивает узел графа замером; сессия берется из thread_id конфигурации запуска.
+
+        Обертка объявляет параметр config явно: по нему LangGraph решает, передавать ли конфигурацию.
+        """
+        def session_of(config: Optional[Dict[str, Any]]) -> str:
+            return ((config or {}).get("configurable") or {}).get("thread_id") or _SESSION.get()
+
+        if asyncio.iscoroutinefunction(node):
+            async def async_wrapper(state, config):
+                with self.session(session_of(config)), self.span(name, "node"):
+                    return await node(state)
+            return async_wrapper
+
+        def wrapper(state, config):
+            with self.session(session_of(config)), self.span(name, "node"):
+                return node(state)
+        return wrapper
+
+
+# Общий регистратор процесса; файл задается в agent.py
+TRACER = SpanRecorder()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка замеров из JSONL-файла по сессиям")
+    parser.add_argument("path", type=Path, nargs="?", default=default_spans_path())
+    parser.add_argument("--session", help="только эта сессия")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    for session, rows in summarize_spans(spans).items():
+        if args.session is None or session == args.session:
+            print(format_summary(rows, f"СЕССИЯ {session or '-'}"))
+            print()
+
+
+if __name__ == "__main__":
+    main()
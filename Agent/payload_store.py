@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+# Короткие результаты дешевле переслать, чем заменять ссылкой
+MIN_DEDUP_CHARS = 256
+# Сколько последних посчитанных хэшей помнить: один процесс пакетного режима обслуживает тысячи
+# сессий, а вытесненный хэш просто посчитается заново
+MAX_CACHED_DIGESTS = 20000
+# id вызова не уникален в истории (модель повторяет "call_1" на каждом шаге), поэтому цель ссылки -
+# id сообщения с исходным результатом; имя и id вызова оставлены для модели
+_REFERENCE = re.compile(r"\[unchanged: identical to an earlier result of [^\]]*\(message ([^)\]]+)\)\]")
+
+
+def _payload_text(message: ToolMessage) -> Optional[str]:
+    """Текст, по которому сравниваются результаты: поле content из JSON read_file или весь ответ"""
+    raw = message.content
+    if not isinstance(raw, str):
+        return None
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        content = parsed.get("content")
+        return content if isinstance(content, str) else None
+    return raw
+
+
+def reference_target(message: ToolMessage) -> Optional[str]:
+    """id сообщения с исходным результатом, на который ссылается замененное сообщение, или None"""
+    if not isinstance(message.content, str):
+        return None
+    match = _REFERENCE.search(message.content)
+    return match.group(1) if match else None
+
+
+class PayloadStore:
+    """Адресация результатов инструментов по содержимому.
+
+    Повторный результат с тем же содержимым заменяется ссылкой на первый вызов,
+    поэтому история растет с числом различных файлов, а не с числом чтений. Хэши
+    сообщений кэшируются по id, не больше max_digests последних.
+    """
+
+    def __init__(self, max_digests: int = MAX_CACHED_DIGESTS):
+        self.max_digests = max_digests
+        # id сообщения -> sha256 его содержимого ("" - не участвует в дедупликации), LRU
+        self._digests: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, message: ToolMessage) -> str:
+        if message.id:
+            with self._lock:
+                digest = self._digests.get(message.id)
+                if digest is not None:
+                    self._digests.move_to_end(message.id)
+                    return digest
+        text = _payload_text(message)
+        if text is None or len(text) < MIN_DEDUP_CHARS:
+            digest = ""
+        else:
+            digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+        if message.id:
+            self._remember(message.id, digest)
+        return digest
+
+    def _remember(self, message_id: str, digest: str):
+        with self._lock:
+            self._digests[message_id] = digest
+            self._digests.move_to_end(message_id)
+            while len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+
+    def dedupe(self, messages: Sequence[BaseMessage]) -> List[ToolMessage]:
+        """Замены для результатов последнего шага, повторяющих уже имеющиеся в истории"""
+        last_ai = max((i for i, m in enumerate(messages) if isinstance(m, AIMessage)), default=-1)
+        # digest -> первое сообщение с таким содержимым
+        seen: Dict[str, ToolMessage] = {}
+        for message in messages[:last_ai]:
+            if isinstance(message, ToolMessage) and message.id:
+                digest = self.digest(message)
+                if digest:
+                    seen.setdefault(digest, message)
+
+        replacements = []
+        for message in messages[last_ai + 1:]:
+            # Без id на сообщение нельзя сослаться, а замену нельзя поставить на его место
+            if not isinstance(message, ToolMessage) or not message.id:
+                continue
+            digest = self.digest(message)
+            if not digest:
+                continue
+            if digest not in seen:
+                seen[digest] = message
+                continue
+            replacements.append(ToolMessage(
+                content=self._reference(message, seen[digest]),
+                tool_call_id=message.tool_call_id,
+                name=message.name,
+                id=message.id,
+            ))
+            # Ссылка короче MIN_DEDUP_CHARS, так что и после вытеснения хэш у нее будет пустой
+            self._remember(message.id, "")
+        return replacements
+
+    @staticmethod
+    def _reference(message: ToolMessage, original: ToolMessage) -> str:
+        note = (f"[unchanged: identical to an earlier result of {original.name or 'tool'} "
+                f"call {original.tool_call_id} (message {original.id})]")
+        try:
+            parsed = json.loads(message.content)
+        except ValueError:
+            return note
+        if not isinstance(parsed, dict):
+            return note
+        parsed["content"] = note
+        return json.dumps(parsed, ensure_ascii=False)
+
+
+PAYLOAD_STORE = PayloadStore()
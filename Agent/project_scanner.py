@@ -0,0 +1,248 @@
+import heapq
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ignore_rules import IgnoreMatcher
+from scan_cache import DirListing, ScanCache, read_listing
+
+TOP_FILES_COUNT = 5
+
+
+# rel_dir -> (директории, файлы) после фильтрации; None, если директорию не удалось прочитать
+CollectedTree = Dict[str, Optional[Tuple[DirListing, DirListing]]]
+
+
+@dataclass
+class ProjectScan:
+    """Результат одного прохода по дереву проекта"""
+    root: Path
+    collected: CollectedTree = field(default_factory=dict)
+    file_types: Dict[str, int] = field(default_factory=dict)
+    total_files: int = 0
+    # Куча (size, rel_path) с самыми большими .py файлами
+    largest_files: List[Tuple[int, str]] = field(default_factory=list)
+    # False - снимок незаконченного обхода: часть директорий еще не прочитана
+    complete: bool = True
+
+
+def file_suffix(name: str) -> str:
+    """То же, что Path.suffix, но без создания объекта Path на каждый файл; без расширения - 'no_extension'"""
+    dot = name.rfind('.')
+    return name[dot:] if 0 < dot < len(name) - 1 else 'no_extension'
+
+
+def split_entries(listing: DirListing, directory: str, rel_dir: str,
+                  matcher: IgnoreMatcher) -> Tuple[DirListing, DirListing, IgnoreMatcher]:
+    """Отбрасывает исключенные элементы директории и делит их на директории и файлы"""
+    matcher = matcher.child(directory, rel_dir, {name for name, _, _ in listing})
+    rel_prefix = f"{rel_dir}/" if rel_dir else ""
+    dirs = []
+    files = []
+    for item in listing:
+        name, is_dir, _ = item
+        # Исключенная директория отсекается целиком, внутрь не спускаемся
+        if matcher.is_ignored(rel_prefix + name, is_dir):
+            continue
+        if is_dir:
+            dirs.append(item)
+        else:
+            files.append(item)
+    dirs.sort(key=lambda x: x[0].lower())
+    files.sort(key=lambda x: x[0].lower())
+    return dirs, files, matcher
+
+
+def collect_tree(root_path: Path, matcher: IgnoreMatcher,
+                 cache: Optional[ScanCache] = None,
+                 workers: int = 1,
+                 max_depth: Optional[int] = None,
+                 collected: Optional[CollectedTree] = None) -> CollectedTree:
+    """Читает все директории проекта; при workers > 1 - параллельно в пуле потоков.
+
+    Порядок обхода на результат не влияет: дерево потом строится по отсортированным спискам.
+    Если передан collected, директории добавляются в него по мере чтения - другой поток
+    может снимать с него копию и строить описание незаконченного обхода.
+    """
+    if collected is None:
+        collected = {}
+
+    def list_directory(path: str, rel_dir: str) -> DirListing:
+        if cache is not None:
+            return cache.listing(path, rel_dir)
+        return read_listing(path)
+
+    def visit(path: str, rel_dir: str, dir_matcher: IgnoreMatcher, depth: int):
+        try:
+            dirs, files, dir_matcher = split_entries(list_directory(path, rel_dir), path, rel_dir, dir_matcher)
+        except (PermissionError, FileNotFoundError):
+            collected[rel_dir] = None
+            return []
+        collected[rel_dir] = (dirs, files)
+        if max_depth is not None and depth >= max_depth:
+            return []
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        return [(os.path.join(path, name), rel_prefix + name, dir_matcher, depth + 1)
+                for name, _, _ in dirs]
+
+    root_task = (str(root_path), "", matcher, 0)
+    if workers <= 1:
+        # В ширину: у незаконченного обхода прочитаны верхние уровни, а не одна глубокая ветка
+        queue = deque([root_task])
+        while queue:
+            queue.extend(visit(*queue.popleft()))
+        return collected
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(visit, *root_task)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for task in future.result():
+                    pending.add(pool.submit(visit, *task))
+    return collected
+
+
+def scan_from_tree(root_path: Path, collected: CollectedTree, top_n: int = TOP_FILES_COUNT,
+                   complete: bool = True) -> ProjectScan:
+    """Собирает статистику расширений и самые большие файлы по прочитанным директориям"""
+    scan = ProjectScan(root=root_path, collected=collected, complete=complete)
+
+    for rel_dir, entries in collected.items():
+        if entries is None:
+            continue
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        for name, _, size in entries[1]:
+            suffix = file_suffix(name)
+            scan.file_types[suffix] = scan.file_types.get(suffix, 0) + 1
+            scan.total_files += 1
+            if suffix == '.py':
+                item = (size, rel_prefix + name)
+                if len(scan.largest_files) < top_n:
+                    heapq.heappush(scan.largest_files, item)
+                elif item > scan.largest_files[0]:
+                    heapq.heapreplace(scan.largest_files, item)
+    return scan
+
+
+def scan_project(root_path: Path, top_n: int = TOP_FILES_COUNT,
+                 exclude: Optional[Sequence[str]] = None,
+                 use_gitignore: bool = True,
+                 cache: Optional[ScanCache] = None,
+                 workers: int = 1,
+                 max_depth: Optional[int] = None,
+                 collected: Optional[CollectedTree] = None) -> ProjectScan:
+    """Обходит проект один раз и собирает дерево, статистику расширений и самые большие файлы.
+
+    exclude - дополнительные glob-шаблоны в синтаксисе .gitignore,
+    use_gitignore - учитывать ли .gitignore/.ignore внутри проекта,
+    cache - ScanCache, из которого берутся неизменившиеся директории,
+    workers - число потоков для чтения директорий (полезно на NFS),
+    max_depth - глубже этого уровня директории не раскрываются,
+    collected - словарь, который заполняется по мере обхода (см. collect_tree).
+    """
+    matcher = IgnoreMatcher.from_excludes(exclude, use_gitignore)
+    collected = collect_tree(root_path, matcher, cache, workers, max_depth, collected)
+    return scan_from_tree(root_path, collected, top_n)
+
+
+def file_versions(scan: ProjectScan) -> Dict[str, Tuple[int, int]]:
+    """Версии всех файлов обхода: rel_path -> (st_mtime_ns, st_size); по ним индексы обновляются инкрементально"""
+    versions = {}
+    for rel_dir, entries in scan.collected.items():
+        if entries is None:
+            continue
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        for name, _, _ in entries[1]:
+            rel_path = rel_prefix + name
+            try:
+                st = os.stat(os.path.join(scan.root, rel_path))
+            except OSError:
+                continue
+            versions[rel_path] = (st.st_mtime_ns, st.st_size)
+    return versions
+
+
+def render_tree(scan: ProjectScan) -> List[str]:
+    """Строит полное дерево проекта из собранных списков директорий"""
+    tree_lines = []
+
+    def render_directory(rel_dir: str, name: str, prefix: str = "", is_last: bool = True):
+        connector = "└── " if is_last else "├── "
+        tree_lines.append(f"{prefix}{connector}{name}/")
+        extension = "    " if is_last else "│   "
+
+        if rel_dir not in scan.collected:
+            # Директория глубже max_depth или еще не прочитана незаконченным обходом
+            tree_lines.append(f"{prefix}{extension}...")
+            return
+        entries = scan.collected[rel_dir]
+        if entries is None:
+            tree_lines.append(f"{prefix}{extension}[Нет доступа]")
+            return
+        dirs, files = entries
+
+        last_index = len(dirs) + len(files) - 1
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        for i, (dir_name, _, _) in enumerate(dirs):
+            render_directory(rel_prefix + dir_name, dir_name, prefix + extension, i == last_index)
+        for i, (file_name, _, file_size) in enumerate(files, start=len(dirs)):
+            size_str = f" ({file_size} bytes)" if file_size > 0 else ""
+            file_connector = "└── " if i == last_index else "├── "
+            tree_lines.append(f"{prefix}{extension}{file_connector}{file_name}{size_str}")
+
+    render_directory("", scan.root.name)
+    return tree_lines
+
+
+def format_project_structure(scan: ProjectScan, tree_lines: Optional[List[str]] = None) -> str:
+    """Собирает текстовое описание проекта; без tree_lines выводится полное дерево"""
+    if tree_lines is None:
+        tree_lines = render_tree(scan)
+    project_context = [f"=== СТРУКТУРА ПРОЕКТА: {scan.root.name} ===\n"]
+    project_context.extend(tree_lines)
+    if not scan.complete:
+        project_context.append("\n[Обход проекта еще не закончен: показаны уже прочитанные директории, "
+                               "статистика неполная]")
+
+    project_context.append(f"\n=== СТАТИСТИКА ПРОЕКТА ===")
+    project_context.append(f"Всего файлов: {scan.total_files}")
+    project_context.append("Типы файлов:")
+    # Обход может быть параллельным, поэтому при равенстве сортируем по имени
+    for ext, count in sorted(scan.file_types.items(), key=lambda x: (-x[1], x[0])):
+        project_context.append(f"  {ext}: {count}")
+
+    project_context.append(f"\n=== КЛЮЧЕВЫЕ ФАЙЛЫ ПРОЕКТА ===")
+    largest = sorted(scan.largest_files, reverse=True)
+    for i, (size, rel_path) in enumerate(largest):
+        project_context.append(f"{i+1}. {rel_path} ({size} bytes)")
+
+    return '\n'.join(project_context)
+
+
+def load_project_scan(root_path: Optional[Path] = None,
+                      exclude: Optional[Sequence[str]] = None,
+                      use_gitignore: bool = True,
+                      use_cache: bool = True,
+                      workers: int = 1,
+                      max_depth: Optional[int] = None,
+                      collected: Optional[CollectedTree] = None) -> ProjectScan:
+    """Сканирует проект через постоянный кэш (если он включен) и сохраняет кэш обратно"""
+    if root_path is None:
+        root_path = Path.cwd()
+    cache = ScanCache(root_path) if use_cache else None
+    try:
+        return scan_project(root_path, exclude=exclude, use_gitignore=use_gitignore, cache=cache,
+                            workers=workers, max_depth=max_depth, collected=collected)
+    finally:
+        if cache is not None:
+            cache.save()
+            cache.close()
+
+
+def analyze_project_structure(root_path: Optional[Path] = None, **scan_options) -> str:
+    """Анализирует структуру проекта и создает контекстное описание"""
+    return format_project_structure(load_project_scan(root_path, **scan_options))
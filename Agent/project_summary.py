@@ -0,0 +1,248 @@
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from project_scanner import CollectedTree, ProjectScan, format_project_structure, load_project_scan, scan_from_tree
+from scan_cache import DirListing
+from tokens import count_tokens
+
+DEFAULT_TOKEN_BUDGET = 4000
+# Сколько файлов показывать в одной раскрытой директории, остальные сворачиваются в одну строку
+MAX_FILES_PER_DIR = 40
+
+# Файлы, которые почти всегда важны для понимания проекта
+KEY_FILE_NAMES = {
+    "readme.md", "readme.rst", "readme.txt", "readme", "pyproject.toml", "setup.py", "setup.cfg",
+    "requirements.txt", "package.json", "cargo.toml", "go.mod", "makefile", "dockerfile",
+    "main.py", "app.py", "manage.py", "__main__.py", "__init__.py", "plan.md",
+}
+SOURCE_SUFFIXES = {".py", ".js", ".ts", ".tsx", ".go", ".rs", ".java", ".c", ".cpp", ".h", ".rb"}
+# Директории, которые раскрываются раньше соседей на той же глубине
+KEY_DIR_NAMES = {"src", "lib", "app", "agent", "core", "pkg", "cmd", "api"}
+LOW_PRIORITY_DIR_NAMES = {"tests", "test", "docs", "examples", "benchmarks", "vendor", "third_party"}
+
+
+@dataclass
+class ProjectSummary:
+    """Описание проекта, уложенное в бюджет токенов"""
+    text: str
+    tokens: int
+    token_budget: int
+    collapsed_dirs: int
+    hidden_files: int
+    # False - описание снято с незаконченного обхода (см. ProjectAnalysis)
+    complete: bool = True
+
+
+def _file_rank(name: str, size: int) -> Tuple[int, int]:
+    lower = name.lower()
+    if lower in KEY_FILE_NAMES:
+        return (0, -size)
+    dot = lower.rfind('.')
+    if dot > 0 and lower[dot:] in SOURCE_SUFFIXES:
+        return (1, -size)
+    return (2, -size)
+
+
+def _dir_rank(name: str) -> int:
+    lower = name.lower()
+    if lower in KEY_DIR_NAMES:
+        return 0
+    if lower in LOW_PRIORITY_DIR_NAMES:
+        return 2
+    return 1
+
+
+def _subtree_counts(scan: ProjectScan) -> Dict[str, Tuple[int, int]]:
+    """Для каждой директории - (файлов, поддиректорий) во всем поддереве"""
+    counts: Dict[str, Tuple[int, int]] = {}
+    # Длинные пути обрабатываются раньше, поэтому дети всегда посчитаны до родителя
+    for rel_dir in sorted(scan.collected, key=len, reverse=True):
+        entries = scan.collected[rel_dir]
+        if entries is None:
+            counts[rel_dir] = (0, 0)
+            continue
+        dirs, files = entries
+        total_files = len(files)
+        total_dirs = len(dirs)
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        for name, _, _ in dirs:
+            child_files, child_dirs = counts.get(rel_prefix + name, (0, 0))
+            total_files += child_files
+            total_dirs += child_dirs
+        counts[rel_dir] = (total_files, total_dirs)
+    return counts
+
+
+def _collapsed_label(name: str, counts: Tuple[int, int]) -> str:
+    files, dirs = counts
+    return f"{name}/ (файлов: {files}, папок: {dirs})"
+
+
+def _file_label(name: str, size: int) -> str:
+    return f"{name} ({size} bytes)" if size > 0 else name
+
+
+class _TreeBudgeter:
+    """Раскрывает директории в порядке важности, пока дерево укладывается в бюджет"""
+
+    def __init__(self, scan: ProjectScan, counts: Dict[str, Tuple[int, int]]):
+        self.scan = scan
+        self.counts = counts
+        # rel_dir -> (показанные файлы, сколько файлов скрыто)
+        self.expanded: Dict[str, Tuple[DirListing, int]] = {}
+
+    def _line_cost(self, depth: int, label: str) -> int:
+        return count_tokens("│   " * depth + "├── " + label)
+
+    def _listing_cost(self, rel_dir: str, depth: int, dirs: DirListing,
+                      files: DirListing) -> int:
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        cost = 0
+        for name, _, _ in dirs:
+            counts = self.counts.get(rel_prefix + name)
+            label = _collapsed_label(name, counts) if counts else f"{name}/"
+            cost += self._line_cost(depth, label)
+        for name, _, size in files:
+            cost += self._line_cost(depth, _file_label(name, size))
+        return cost
+
+    def expand(self, tree_budget: int):
+        remaining = tree_budget - self._line_cost(0, _collapsed_label(self.scan.root.name, self.counts.get("", (0, 0))))
+        queue = [(0, 0, "")]
+        while queue and remaining > 0:
+            depth, _, rel_dir = heapq.heappop(queue)
+            entries = self.scan.collected.get(rel_dir)
+            if entries is None:
+                continue
+            dirs, files = entries
+            ranked = sorted(files, key=lambda f: _file_rank(f[0], f[2]))
+            shown = ranked[:MAX_FILES_PER_DIR]
+            cost = self._listing_cost(rel_dir, depth + 1, dirs, shown)
+            # Не влезает целиком - оставляем поддиректории и столько важных файлов, сколько поместится
+            while shown and cost > remaining:
+                name, _, size = shown.pop()
+                cost -= self._line_cost(depth + 1, _file_label(name, size))
+            if cost > remaining:
+                continue
+            hidden = len(files) - len(shown)
+            if hidden:
+                cost += self._line_cost(depth + 1, f"... и еще файлов: {hidden}")
+            remaining -= cost
+            self.expanded[rel_dir] = (shown, hidden)
+            rel_prefix = f"{rel_dir}/" if rel_dir else ""
+            for name, _, _ in dirs:
+                heapq.heappush(queue, (depth + 1, _dir_rank(name), rel_prefix + name))
+
+    def render(self) -> List[str]:
+        tree_lines = []
+
+        def render_directory(rel_dir: str, name: str, prefix: str = "", is_last: bool = True):
+            connector = "└── " if is_last else "├── "
+            extension = "    " if is_last else "│   "
+            if rel_dir not in self.expanded:
+                counts = self.counts.get(rel_dir)
+                label = _collapsed_label(name, counts) if counts else f"{name}/"
+                tree_lines.append(f"{prefix}{connector}{label}")
+                if rel_dir in self.scan.collected and self.scan.collected[rel_dir] is None:
+                    tree_lines.append(f"{prefix}{extension}[Нет доступа]")
+                return
+            tree_lines.append(f"{prefix}{connector}{name}/")
+            dirs = self.scan.collected[rel_dir][0]
+            shown, hidden = self.expanded[rel_dir]
+            shown = sorted(shown, key=lambda x: x[0].lower())
+            children = [(n, True, 0) for n, _, _ in dirs] + shown
+            if hidden:
+                children.append((f"... и еще файлов: {hidden}", False, 0))
+            rel_prefix = f"{rel_dir}/" if rel_dir else ""
+            for i, (child, is_dir, size) in enumerate(children):
+                is_last_child = i == len(children) - 1
+                if is_dir:
+                    render_directory(rel_prefix + child, child, prefix + extension, is_last_child)
+                else:
+                    file_connector = "└── " if is_last_child else "├── "
+                    tree_lines.append(f"{prefix}{extension}{file_connector}{_file_label(child, size)}")
+
+        render_directory("", self.scan.root.name)
+        return tree_lines
+
+
+def summarize_scan(scan: ProjectScan, token_budget: int = DEFAULT_TOKEN_BUDGET) -> ProjectSummary:
+    """Укладывает описание проекта в token_budget: большие директории сворачиваются в счетчики"""
+    counts = _subtree_counts(scan)
+    base_tokens = count_tokens(format_project_structure(scan, tree_lines=[]))
+    tree_budget = token_budget - base_tokens
+    while True:
+        budgeter = _TreeBudgeter(scan, counts)
+        budgeter.expand(tree_budget)
+        text = format_project_structure(scan, tree_lines=budgeter.render())
+        tokens = count_tokens(text)
+        # Построчная оценка может немного разойтись с подсчетом по всему тексту
+        if tokens <= token_budget or not budgeter.expanded:
+            break
+        tree_budget -= tokens - token_budget
+    hidden_files = sum(hidden for _, hidden in budgeter.expanded.values())
+    collapsed_dirs = sum(1 for rel_dir, entries in scan.collected.items()
+                         if entries is not None and rel_dir not in budgeter.expanded)
+    return ProjectSummary(text, tokens, token_budget, collapsed_dirs, hidden_files, scan.complete)
+
+
+def summarize_project_structure(root_path: Optional[Path] = None,
+                                token_budget: int = DEFAULT_TOKEN_BUDGET,
+                                **scan_options) -> ProjectSummary:
+    """Сканирует проект и возвращает его описание, уложенное в бюджет токенов"""
+    return summarize_scan(load_project_scan(root_path, **scan_options), token_budget)
+
+
+class ProjectAnalysis:
+    """Анализ проекта в фоновом потоке.
+
+    Поток запускается start(); summary(timeout) ждет полного описания не дольше timeout
+    секунд, а если обход еще идет - строит частичное по уже прочитанным директориям.
+    """
+
+    def __init__(self, root_path: Optional[Path] = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 **scan_options):
+        self.root = root_path or Path.cwd()
+        self.token_budget = token_budget
+        self.scan_options = scan_options
+        # Длительность полного анализа, известна после done
+        self.seconds = 0.0
+        self._collected: CollectedTree = {}
+        self._summary: Optional[ProjectSummary] = None
+        self._error: Optional[BaseException] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="project-analysis", daemon=True)
+
+    def start(self) -> "ProjectAnalysis":
+        self._thread.start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            scan = load_project_scan(self.root, collected=self._collected, **self.scan_options)
+            self._summary = summarize_scan(scan, self.token_budget)
+        except BaseException as e:
+            # Ошибка обхода поднимется в потоке, который запросит описание
+            self._error = e
+        finally:
+            self.seconds = time.perf_counter() - started
+            self._done.set()
+
+    def summary(self, timeout: Optional[float] = None) -> ProjectSummary:
+        """Полное описание, если обход закончился за timeout секунд (None - ждать сколько нужно), иначе частичное"""
+        if self._done.wait(timeout):
+            if self._error is not None:
+                raise self._error
+            return self._summary
+        # Копия словаря под GIL атомарна; списки директорий после записи в словарь не меняются
+        scan = scan_from_tree(self.root, self._collected.copy(), complete=False)
+        return summarize_scan(scan, self.token_budget)
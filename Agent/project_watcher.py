@@ -0,0 +1,455 @@
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+import select
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from ignore_rules import IGNORE_FILE_NAMES, IgnoreMatcher
+from project_scanner import TOP_FILES_COUNT, CollectedTree, ProjectScan, file_suffix, split_entries
+from scan_cache import RACY_MTIME_WINDOW_NS, DirListing
+
+# Флаги inotify из <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct("iIII")
+
+# Сколько ждать продолжения пачки событий: сохранение файла редактором - это несколько событий подряд
+DEFAULT_DEBOUNCE = 0.05
+# Дольше пачка не копится, даже если события идут непрерывно (сборка, git checkout)
+MAX_BATCH_SECONDS = 1.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+# rel_path файла -> (st_mtime_ns, st_size), как в project_scanner.file_versions
+FileVersions = Dict[str, Tuple[int, int]]
+
+
+class Inotify:
+    """Минимальная обертка над inotify(7) через ctypes; OSError, если inotify недоступен"""
+
+    def __init__(self):
+        name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(name or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """События (wd, mask, имя) за время не больше timeout; пустой список, если их не было"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _read_dir(path: str) -> Tuple[DirListing, Dict[str, Tuple[int, int]]]:
+    """Содержимое директории, как scan_cache.read_listing, плюс (mtime_ns, size) каждого файла"""
+    listing: DirListing = []
+    versions = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                listing.append((entry.name, True, 0))
+            elif entry.is_file():
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                listing.append((entry.name, False, st.st_size))
+                versions[entry.name] = (st.st_mtime_ns, st.st_size)
+    return listing, versions
+
+
+def _depth(rel_dir: str) -> int:
+    return rel_dir.count("/") + 1 if rel_dir else 0
+
+
+class ProjectWatcher:
+    """Живое дерево проекта: после одного обхода изменения применяются по событиям файловой системы.
+
+    Следит за директориями через inotify, а если его нет (не Linux) или не хватило
+    лимита fs.inotify.max_user_watches - опрашивает mtime директорий раз в poll_interval.
+    На каждое изменение перечитывается только затронутая директория: обновляются дерево,
+    статистика расширений, самые большие .py файлы и версии файлов. Подписчики (кэши и
+    индексы) получают множество изменившихся путей относительно корня.
+
+    Опрос не видит перезаписи файла на месте (mtime директории не меняется) - в этом режиме
+    versions() возвращает None, и индексы проверяют файлы сами, как без наблюдателя.
+    """
+
+    def __init__(self, root: Optional[Path] = None,
+                 exclude: Optional[Sequence[str]] = None,
+                 use_gitignore: bool = True,
+                 max_depth: Optional[int] = None,
+                 backend: str = "auto",
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE):
+        self.root = (root or Path.cwd()).resolve()
+        self.exclude = exclude
+        self.use_gitignore = use_gitignore
+        self.max_depth = max_depth
+        # "auto" - inotify, если доступен; "inotify" или "poll" - принудительно
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        # Растет на каждую пачку изменений, по ней потребители понимают, что дерево изменилось
+        self.generation = 0
+        self.events = 0
+        # Читаются и другими потоками - меняются под self._lock
+        self._collected: CollectedTree = {}
+        self._file_types: Dict[str, int] = {}
+        self._total_files = 0
+        self._py_sizes: Dict[str, int] = {}
+        self._versions: FileVersions = {}
+        # Версии файлов, записанных самим агентом, до того как наблюдатель перечитает их директорию
+        self._overrides: FileVersions = {}
+        # Только для потока наблюдателя. rel_dir -> (матчер для ее элементов, глубина)
+        self._matchers: Dict[str, Tuple[IgnoreMatcher, int]] = {}
+        self._dir_mtimes: Dict[str, int] = {}
+        self._wd_dirs: Dict[int, str] = {}
+        self._dir_wds: Dict[str, int] = {}
+        self._inotify: Optional[Inotify] = None
+        self._subscribers: List[Callable[[Set[str]], None]] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def ready(self) -> bool:
+        """Первый обход закончен"""
+        return self._ready.is_set()
+
+    @property
+    def live(self) -> bool:
+        """Версии файлов точные: обход закончен и изменения приходят от inotify"""
+        return self._ready.is_set() and self._inotify is not None
+
+    def subscribe(self, callback: Callable[[Set[str]], None]):
+        """callback(пути) вызывается из потока наблюдателя после каждой пачки изменений"""
+        self._subscribers.append(callback)
+
+    def start(self) -> "ProjectWatcher":
+        self._thread = threading.Thread(target=self._run, name="project-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def snapshot(self) -> ProjectScan:
+        """Текущее дерево в виде ProjectScan для project_summary.summarize_scan"""
+        with self._lock:
+            largest = heapq.nlargest(TOP_FILES_COUNT, ((size, rel) for rel, size in self._py_sizes.items()))
+            return ProjectScan(root=self.root, collected=dict(self._collected), file_types=dict(self._file_types),
+                               total_files=self._total_files, largest_files=largest, complete=self.ready)
+
+    def versions(self) -> Optional[FileVersions]:
+        """Версии всех файлов проекта без обхода диска; None, если они могут быть неточными (см. live)
+        или неполными (при max_depth глубокие файлы не читаются, а индексы смотрят весь проект)"""
+        if not self.live or self.max_depth is not None:
+            return None
+        with self._lock:
+            versions = dict(self._versions)
+            versions.update(self._overrides)
+            return versions
+
+    def touch(self, rel_paths: Sequence[str]):
+        """Файлы, только что записанные агентом: индексы увидят их новые версии сразу, не дожидаясь событий"""
+        updates = {}
+        for rel_path in rel_paths:
+            try:
+                st = os.stat(self.root / rel_path)
+            except OSError:
+                continue
+            updates[rel_path] = (st.st_mtime_ns, st.st_size)
+        if updates:
+            with self._lock:
+                self._overrides.update(updates)
+                self.generation += 1
+
+    def _run(self):
+        if self.backend != "poll":
+            try:
+                self._inotify = Inotify()
+            except OSError:
+                if self.backend == "inotify":
+                    raise
+                self._inotify = None
+        self._add_subtree("", IgnoreMatcher.from_excludes(self.exclude, self.use_gitignore), 0, set())
+        self._ready.set()
+        while not self._stop.is_set():
+            if self._inotify is not None:
+                dirty, rewalk = self._read_events()
+            else:
+                self._stop.wait(self.poll_interval)
+                dirty, rewalk = self._poll(), set()
+            if not dirty:
+                continue
+            changed: Set[str] = set()
+            # Родители раньше детей: перечитанный родитель мог уже убрать или заново обойти поддиректорию
+            for rel_dir in sorted(dirty, key=_depth):
+                if rel_dir in rewalk:
+                    self._rewalk(rel_dir, changed)
+                else:
+                    self._relist(rel_dir, changed)
+            if changed:
+                with self._lock:
+                    self.generation += 1
+                for callback in self._subscribers:
+                    callback(changed)
+
+    def _read_events(self) -> Tuple[Set[str], Set[str]]:
+        """Директории, которые надо перечитать, и те, где изменились правила исключения"""
+        events = self._inotify.read(0.5)
+        if not events:
+            return set(), set()
+        # Дожидаемся конца пачки: создание, запись и переименование приходят отдельными событиями
+        deadline = time.monotonic() + MAX_BATCH_SECONDS
+        while time.monotonic() < deadline:
+            more = self._inotify.read(self.debounce)
+            if not more:
+                break
+            events.extend(more)
+        self.events += len(events)
+        dirty: Set[str] = set()
+        rewalk: Set[str] = set()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнилась, часть событий потеряна - сверяем все директории
+                dirty.update(self._matchers)
+                continue
+            if mask & IN_IGNORED:
+                rel_dir = self._wd_dirs.pop(wd, None)
+                if rel_dir is not None and self._dir_wds.get(rel_dir) == wd:
+                    del self._dir_wds[rel_dir]
+                continue
+            rel_dir = self._wd_dirs.get(wd)
+            if rel_dir is None:
+                continue
+            dirty.add(rel_dir)
+            if name in IGNORE_FILE_NAMES:
+                rewalk.add(rel_dir)
+        return dirty, rewalk
+
+    def _poll(self) -> Set[str]:
+        dirty = set()
+        for rel_dir, mtime_ns in list(self._dir_mtimes.items()):
+            try:
+                if os.stat(self._path(rel_dir)).st_mtime_ns != mtime_ns:
+                    dirty.add(rel_dir)
+            except OSError:
+                # Директория удалена - это увидит ее родитель
+                continue
+        return dirty
+
+    def _path(self, rel_dir: str) -> str:
+        return os.path.join(self.root, rel_dir) if rel_dir else str(self.root)
+
+    def _watch(self, rel_dir: str, path: str):
+        if self._inotify is None:
+            return
+        try:
+            wd = self._inotify.add_watch(path)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                # Кончился лимит наблюдений - дальше опрашиваем mtime директорий
+                self._inotify.close()
+                self._inotify = None
+            return
+        # Перенесенная директория сохраняет wd, поэтому он переходит к новому пути
+        self._wd_dirs[wd] = rel_dir
+        self._dir_wds[rel_dir] = wd
+
+    def _unwatch(self, rel_dir: str):
+        wd = self._dir_wds.pop(rel_dir, None)
+        # wd мог уже перейти к новому пути перенесенной директории - тогда наблюдение нужно
+        if wd is not None and self._wd_dirs.get(wd) == rel_dir and self._inotify is not None:
+            del self._wd_dirs[wd]
+            self._inotify.rm_watch(wd)
+
+    def _list(self, rel_dir: str) -> Tuple[Optional[Tuple[DirListing, DirListing]], Dict[str, Tuple[int, int]],
+                                           Optional[IgnoreMatcher]]:
+        """Читает директорию после постановки наблюдения: изменения после чтения придут событиями"""
+        matcher, _ = self._matchers[rel_dir]
+        path = self._path(rel_dir)
+        started_ns = time.time_ns()
+        try:
+            self._watch(rel_dir, path)
+            mtime_ns = os.stat(path).st_mtime_ns
+            listing, versions = _read_dir(path)
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            return None, {}, None
+        dirs, files, child_matcher = split_entries(listing, path, rel_dir, matcher)
+        # Директорию, измененную в тот же квант mtime, что и чтение, опрос проверит еще раз
+        self._dir_mtimes[rel_dir] = -1 if mtime_ns > started_ns - RACY_MTIME_WINDOW_NS else mtime_ns
+        return (dirs, files), versions, child_matcher
+
+    def _add_subtree(self, rel_dir: str, matcher: IgnoreMatcher, depth: int, changed: Set[str]):
+        queue = deque([(rel_dir, matcher, depth)])
+        while queue and not self._stop.is_set():
+            rel, dir_matcher, dir_depth = queue.popleft()
+            self._matchers[rel] = (dir_matcher, dir_depth)
+            entries, versions, child_matcher = self._list(rel)
+            with self._lock:
+                added, _ = self._apply_listing(rel, entries, versions, changed)
+            if self.max_depth is not None and dir_depth >= self.max_depth:
+                continue
+            rel_prefix = f"{rel}/" if rel else ""
+            queue.extend((rel_prefix + name, child_matcher, dir_depth + 1) for name in added)
+
+    def _relist(self, rel_dir: str, changed: Set[str]):
+        if rel_dir not in self._matchers:
+            # Директория уже убрана из дерева вместе с родителем
+            return
+        depth = self._matchers[rel_dir][1]
+        entries, versions, child_matcher = self._list(rel_dir)
+        with self._lock:
+            added, removed = self._apply_listing(rel_dir, entries, versions, changed)
+            rel_prefix = f"{rel_dir}/" if rel_dir else ""
+            for name in removed:
+                self._remove_subtree(rel_prefix + name, changed)
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+        for name in added:
+            self._add_subtree(rel_prefix + name, child_matcher, depth + 1, changed)
+
+    def _rewalk(self, rel_dir: str, changed: Set[str]):
+        """Изменился .gitignore: правила действуют на все поддерево, поэтому оно читается заново"""
+        if rel_dir not in self._matchers:
+            return
+        matcher, depth = self._matchers[rel_dir]
+        with self._lock:
+            self._remove_subtree(rel_dir, changed)
+        self._add_subtree(rel_dir, matcher, depth, changed)
+
+    def _apply_listing(self, rel_dir: str, entries: Optional[Tuple[DirListing, DirListing]],
+                       versions: Dict[str, Tuple[int, int]], changed: Set[str]) -> Tuple[List[str], List[str]]:
+        """Применяет новое содержимое директории к дереву и статистике (под self._lock).
+
+        Возвращает появившиеся и пропавшие поддиректории.
+        """
+        old = self._collected.get(rel_dir)
+        old_dirs = {name for name, _, _ in old[0]} if old else set()
+        old_files = {name for name, _, _ in old[1]} if old else set()
+        new_dirs = [name for name, _, _ in entries[0]] if entries else []
+        new_files = entries[1] if entries else []
+        rel_prefix = f"{rel_dir}/" if rel_dir else ""
+        for name in old_files - {name for name, _, _ in new_files}:
+            self._drop_file(rel_prefix + name, name)
+            changed.add(rel_prefix + name)
+        for name, _, size in new_files:
+            rel_path = rel_prefix + name
+            version = versions.get(name, (0, size))
+            previous = self._versions.get(rel_path)
+            if previous == version:
+                continue
+            if previous is None:
+                suffix = file_suffix(name)
+                self._file_types[suffix] = self._file_types.get(suffix, 0) + 1
+                self._total_files += 1
+            self._versions[rel_path] = version
+            if rel_path.endswith(".py"):
+                self._py_sizes[rel_path] = size
+            changed.add(rel_path)
+        # Директория перечитана - версии ее файлов теперь точные
+        for rel_path in [r for r in self._overrides if r.rpartition("/")[0] == rel_dir]:
+            del self._overrides[rel_path]
+        # Списки не меняются на месте: снимки дерева в других потоках остаются согласованными
+        self._collected[rel_dir] = entries
+        return [name for name in new_dirs if name not in old_dirs], sorted(old_dirs - set(new_dirs))
+
+    def _drop_file(self, rel_path: str, name: str):
+        if self._versions.pop(rel_path, None) is None:
+            return
+        suffix = file_suffix(name)
+        count = self._file_types.get(suffix, 0) - 1
+        if count > 0:
+            self._file_types[suffix] = count
+        else:
+            self._file_types.pop(suffix, None)
+        self._total_files -= 1
+        self._py_sizes.pop(rel_path, None)
+
+    def _remove_subtree(self, rel_dir: str, changed: Set[str]):
+        """Убирает директорию и все вложенные из дерева (под self._lock)"""
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        for rel in [rel for rel in self._collected if rel == rel_dir or rel.startswith(prefix)]:
+            entries = self._collected.pop(rel)
+            if entries is not None:
+                rel_prefix = f"{rel}/" if rel else ""
+                for name, _, _ in entries[1]:
+                    self._drop_file(rel_prefix + name, name)
+                    changed.add(rel_prefix + name)
+            self._matchers.pop(rel, None)
+            self._dir_mtimes.pop(rel, None)
+            self._unwatch(rel)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "backend": "inotify" if self._inotify is not None else "poll",
+                "dirs": len(self._collected),
+                "files": self._total_files,
+                "events": self.events,
+                "generation": self.generation,
+            }
+
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+CACHE_DIR_NAME = ".agent_cache"
+CACHE_FILE_NAME = "project_scan.sqlite"
+
+# Директории, измененные позже этого порога до начала сканирования, не кэшируем:
+# mtime может не поменяться при повторной записи в тот же квант времени
+RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+# (имя, это директория, размер)
+DirListing = List[Tuple[str, bool, int]]
+
+
+def read_listing(path: str) -> DirListing:
+    """Читает директорию через scandir, размеры берутся из кэшированного stat DirEntry"""
+    listing = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                listing.append((entry.name, True, 0))
+            elif entry.is_file():
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                listing.append((entry.name, False, size))
+    return listing
+
+
+def refresh_sizes(path: str, listing: DirListing) -> DirListing:
+    """Перечитывает размеры файлов кэшированного списка: перезапись файла на месте не меняет mtime
+    директории, и без этого дерево и самые большие файлы показывали бы старые размеры"""
+    refreshed = []
+    for name, is_dir, size in listing:
+        if not is_dir:
+            try:
+                size = os.stat(os.path.join(path, name)).st_size
+            except OSError:
+                pass
+        refreshed.append((name, is_dir, size))
+    return refreshed
+
+
+class ScanCache:
+    """Постоянный кэш содержимого директорий проекта, ключ - mtime директории.
+
+    Хранится в SQLite внутри проекта. Директория перечитывается, только если её
+    mtime изменился; удаленные директории вычищаются при сохранении. Из кэша берется
+    только состав директории: размеры файлов при попадании читаются заново через stat.
+    """
+
+    def __init__(self, root: Path, cache_path: Optional[Path] = None):
+        self.root = root
+        self.cache_path = cache_path or root / CACHE_DIR_NAME / CACHE_FILE_NAME
+        self.hits = 0
+        self.misses = 0
+        self._rows: Dict[str, Tuple[int, str]] = {}
+        self._dirty: Dict[str, Tuple[int, str]] = {}
+        self._seen: Set[str] = set()
+        self._started_ns = time.time_ns()
+        # listing() может вызываться из потоков параллельного обхода
+        self._lock = threading.Lock()
+        self._conn = None
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.cache_path))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (rel TEXT PRIMARY KEY, mtime_ns INTEGER, entries TEXT)"
+            )
+            self._rows = {rel: (mtime, entries) for rel, mtime, entries
+                          in self._conn.execute("SELECT rel, mtime_ns, entries FROM dirs")}
+        except (OSError, sqlite3.Error):
+            # Нет прав на запись или файл поврежден - работаем без кэша
+            self._conn = None
+            self._rows = {}
+
+    def listing(self, path: str, rel_dir: str) -> DirListing:
+        """Содержимое директории из кэша, если её mtime не изменился, иначе с диска"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            self._seen.add(rel_dir)
+            cached = self._rows.get(rel_dir)
+            hit = cached is not None and cached[0] == mtime_ns
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            return refresh_sizes(path, [tuple(item) for item in json.loads(cached[1])])
+        listing = read_listing(path)
+        if mtime_ns > self._started_ns - RACY_MTIME_WINDOW_NS:
+            mtime_ns = -1
+        with self._lock:
+            self._dirty[rel_dir] = (mtime_ns, json.dumps(listing, separators=(",", ":")))
+        return listing
+
+    def save(self):
+        """Записывает измененные директории и удаляет те, которых больше нет"""
+        if self._conn is None:
+            return
+        removed = [(rel,) for rel in self._rows.keys() - self._seen]
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dirs (rel, mtime_ns, entries) VALUES (?, ?, ?)",
+                    [(rel, mtime, entries) for rel, (mtime, entries) in self._dirty.items()],
+                )
+                self._conn.executemany("DELETE FROM dirs WHERE rel = ?", removed)
+        except sqlite3.Error:
+            pass
+        self._rows.update(self._dirty)
+        for (rel,) in removed:
+            self._rows.pop(rel, None)
+        self._dirty.clear()
+        self._seen.clear()
+        self._started_ns = time.time_ns()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,271 @@
+import ast
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from code_search import MAX_INDEXED_FILE_BYTES, read_text
+from project_scanner import file_versions, load_project_scan
+from scan_cache import CACHE_DIR_NAME, RACY_MTIME_WINDOW_NS
+
+SYMBOL_INDEX_FILE_NAME = "symbol_index.sqlite"
+PYTHON_SUFFIXES = (".py", ".pyi")
+# Сколько строк с упоминаниями имени хранить на файл
+MAX_REFERENCE_LINES = 8
+MAX_SIGNATURE_CHARS = 200
+# Меньше файлов дешевле разобрать в текущем процессе, чем поднимать пул
+MIN_FILES_FOR_POOL = 32
+# Без fork: процесс агента многопоточный, а дочерний процесс получил бы копии чужих блокировок
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, rel TEXT UNIQUE, module TEXT, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS symbols (
+    file_id INTEGER, qualname TEXT, name TEXT, kind TEXT, start_line INTEGER, end_line INTEGER, signature TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_file ON symbols (file_id);
+CREATE TABLE IF NOT EXISTS refs (name TEXT, file_id INTEGER, lines TEXT, PRIMARY KEY (name, file_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_file ON refs (file_id);
+"""
+
+# (qualname, kind, start_line, end_line, signature)
+Symbol = Tuple[str, str, int, int, str]
+
+
+def module_name(rel: str) -> str:
+    """Имя модуля по пути от корня проекта: pkg/sub/mod.py -> pkg.sub.mod, pkg/__init__.py -> pkg"""
+    parts = rel[:-len(Path(rel).suffix)].split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(parts)
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(b) for b in node.bases + node.keywords)
+        text = f"class {node.name}({bases})" if bases else f"class {node.name}"
+    elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        text = f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+    else:
+        text = ast.unparse(node).split("\n", 1)[0]
+    return text[:MAX_SIGNATURE_CHARS]
+
+
+def _collect(body: List[ast.stmt], prefix: str, in_class: bool, symbols: List[Symbol]):
+    for node in body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            qualname = prefix + node.name
+            if isinstance(node, ast.ClassDef):
+                kind = "class"
+            else:
+                kind = "method" if in_class else "function"
+            # Диапазон включает декораторы: его можно целиком передать в read_file
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            symbols.append((qualname, kind, start, node.end_lineno, _signature(node)))
+            _collect(node.body, qualname + ".", isinstance(node, ast.ClassDef), symbols)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and (in_class or not prefix):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    symbols.append((prefix + target.id, "attribute" if in_class else "variable",
+                                    node.lineno, node.end_lineno, _signature(node)))
+        elif isinstance(node, (ast.If, ast.Try, ast.With, ast.AsyncWith)):
+            # Определения внутри if/try/with (try: import ... except ..., if TYPE_CHECKING: ...)
+            for child in ("body", "orelse", "finalbody"):
+                _collect(getattr(node, child, []), prefix, in_class, symbols)
+            for handler in getattr(node, "handlers", []):
+                _collect(handler.body, prefix, in_class, symbols)
+
+
+def _references(tree: ast.AST) -> Dict[str, List[int]]:
+    refs: Dict[str, List[int]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            name, line = node.id, node.lineno
+        elif isinstance(node, ast.Attribute):
+            name, line = node.attr, node.end_lineno
+        elif isinstance(node, ast.alias):
+            name, line = node.asname or node.name.rsplit(".", 1)[-1], node.lineno
+        else:
+            continue
+        lines = refs.setdefault(name, [])
+        if line not in lines and len(lines) < MAX_REFERENCE_LINES:
+            lines.append(line)
+    return {name: sorted(lines) for name, lines in refs.items()}
+
+
+def parse_file(path: str, max_bytes: int = MAX_INDEXED_FILE_BYTES) -> Tuple[List[Symbol], Dict[str, List[int]]]:
+    """Определения и упоминания имен в Python-файле; вызывается и в пуле процессов"""
+    text = read_text(Path(path), max_bytes)
+    if not text:
+        return [], {}
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError, RecursionError):
+        return [], {}
+    symbols: List[Symbol] = []
+    _collect(tree.body, "", False, symbols)
+    return symbols, _references(tree)
+
+
+def _symbol_dict(rel: str, module: str, qualname: str, kind: str, start: int, end: int,
+                 signature: str) -> Dict[str, Any]:
+    return {
+        "path": rel,
+        "qualname": f"{module}.{qualname}" if module else qualname,
+        "kind": kind,
+        "start_line": start,
+        "end_line": end,
+        "signature": signature,
+    }
+
+
+class SymbolIndex:
+    """Таблица символов Python-файлов проекта, построенная модулем ast.
+
+    Для каждого файла хранятся определения (классы, функции, методы, переменные
+    модуля и атрибуты классов) с диапазонами строк и упоминания имен. Файлы
+    разбираются в пуле процессов; повторно - только при изменении mtime или размера.
+    """
+
+    def __init__(self, root: Path, index_path: Optional[Path] = None,
+                 exclude: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+                 max_file_bytes: int = MAX_INDEXED_FILE_BYTES):
+        self.root = root
+        self.index_path = index_path or root / CACHE_DIR_NAME / SYMBOL_INDEX_FILE_NAME
+        self.exclude = exclude
+        self.workers = workers or os.cpu_count() or 1
+        self.max_file_bytes = max_file_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _parse(self, rels: List[str]) -> List[Tuple[List[Symbol], Dict[str, List[int]]]]:
+        paths = [str(self.root / rel) for rel in rels]
+        if self.workers > 1 and len(paths) >= MIN_FILES_FOR_POOL:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=POOL_CONTEXT) as pool:
+                return list(pool.map(parse_file, paths, [self.max_file_bytes] * len(paths), chunksize=16))
+        return [parse_file(path, self.max_file_bytes) for path in paths]
+
+    def _store(self, rel: str, version: Tuple[int, int], symbols: List[Symbol], refs: Dict[str, List[int]]):
+        conn = self._conn
+        self._drop(rel)
+        mtime_ns, size = version
+        if mtime_ns > time.time_ns() - RACY_MTIME_WINDOW_NS:
+            # Файл мог измениться еще раз в тот же квант mtime - проверим его снова при следующем обновлении
+            mtime_ns = -1
+        file_id = conn.execute("INSERT INTO files (rel, module, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                               (rel, module_name(rel), mtime_ns, size)).lastrowid
+        conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(file_id, q, q.rsplit(".", 1)[-1], kind, s, e, sig) for q, kind, s, e, sig in symbols])
+        conn.executemany("INSERT INTO refs VALUES (?, ?, ?)",
+                         [(name, file_id, ",".join(map(str, lines))) for name, lines in refs.items()])
+
+    def _drop(self, rel: str):
+        row = self._conn.execute("SELECT id FROM files WHERE rel = ?", (rel,)).fetchone()
+        if row is None:
+            return
+        for table in ("symbols", "refs"):
+            self._conn.execute(f"DELETE FROM {table} WHERE file_id = ?", row)
+        self._conn.execute("DELETE FROM files WHERE id = ?", row)
+
+    def update(self, versions: Optional[Dict[str, Tuple[int, int]]] = None) -> Dict[str, int]:
+        """Разбирает измененные Python-файлы проекта и удаляет пропавшие.
+
+        versions - готовые версии файлов (например, от ProjectWatcher) вместо обхода проекта.
+        """
+        if versions is None:
+            versions = file_versions(load_project_scan(self.root, exclude=self.exclude))
+        versions = {rel: version for rel, version in versions.items() if rel.endswith(PYTHON_SUFFIXES)}
+        with self._lock:
+            conn = self._connect()
+            stored = {rel: (mtime_ns, size) for rel, mtime_ns, size
+                      in conn.execute("SELECT rel, mtime_ns, size FROM files")}
+        changed = [rel for rel, version in versions.items() if stored.get(rel) != version]
+        removed = [rel for rel in stored if rel not in versions]
+        parsed = self._parse(changed)
+        with self._lock, conn:
+            for rel in removed:
+                self._drop(rel)
+            for rel, (symbols, refs) in zip(changed, parsed):
+                self._store(rel, versions[rel], symbols, refs)
+        return {"files": len(versions), "updated": len(changed), "removed": len(removed)}
+
+    def find(self, name: str, include_references: bool = False, max_results: int = 20) -> Dict[str, Any]:
+        """Определения по имени или квалифицированному имени (суффиксу пути модуль.Класс.метод).
+
+        "search" найдет все определения search, "CodeSearchIndex.search" - только метод
+        этого класса, "code_search.CodeSearchIndex.search" - только в этом модуле.
+        """
+        name = name.strip().strip(".")
+        short = name.rsplit(".", 1)[-1]
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT f.rel, f.module, s.qualname, s.kind, s.start_line, s.end_line, s.signature "
+                "FROM symbols s JOIN files f ON f.id = s.file_id WHERE s.name = ?", (short,)).fetchall()
+            references = []
+            if include_references:
+                references = conn.execute(
+                    "SELECT f.rel, r.lines FROM refs r JOIN files f ON f.id = r.file_id WHERE r.name = ? "
+                    "ORDER BY f.rel", (short,)).fetchall()
+        matches = []
+        for rel, module, qualname, kind, start, end, signature in rows:
+            full = f"{module}.{qualname}" if module else qualname
+            if full == name or full.endswith("." + name):
+                matches.append((qualname.count("."), kind, rel, start,
+                                _symbol_dict(rel, module, qualname, kind, start, end, signature)))
+        # Сначала определения верхнего уровня, среди них классы и функции раньше переменных
+        kind_order = {"class": 0, "function": 1, "method": 1}
+        matches.sort(key=lambda m: (m[0], kind_order.get(m[1], 2), m[2], m[3]))
+        definitions = [m[-1] for m in matches]
+        result: Dict[str, Any] = {
+            "name": name,
+            "definitions": definitions[:max_results],
+            "truncated": len(definitions) > max_results,
+        }
+        if include_references:
+            result["references"] = [{"path": rel, "lines": [int(n) for n in lines.split(",")]}
+                                    for rel, lines in references[:max_results]]
+            result["reference_files"] = len(references)
+        return result
+
+    def outline(self, rel: str) -> List[Dict[str, Any]]:
+        """Символы одного файла по порядку; файл переразбирается, если изменился после индексации"""
+        path = self.root / rel
+        st = os.stat(path)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT id, module, mtime_ns, size FROM files WHERE rel = ?", (rel,)).fetchone()
+        if row is None or (row[2], row[3]) != (st.st_mtime_ns, st.st_size):
+            symbols, refs = parse_file(str(path), self.max_file_bytes)
+            with self._lock, conn:
+                self._store(rel, (st.st_mtime_ns, st.st_size), symbols, refs)
+            module = module_name(rel)
+        else:
+            with self._lock:
+                symbols = conn.execute("SELECT qualname, kind, start_line, end_line, signature FROM symbols "
+                                       "WHERE file_id = ? ORDER BY start_line", (row[0],)).fetchall()
+            module = row[1]
+        return [_symbol_dict(rel, module, *symbol) for symbol in sorted(symbols, key=lambda s: s[2])]
@@ -0,0 +1,29 @@
+import re
+from functools import lru_cache
+
+# Грубая модель BPE: слово дает токен на каждые ~4 символа, знак препинания - отдельный токен
+_TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken необязателен: без него (или без сети для словаря) используем оценку"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов в тексте: точное через tiktoken, если он установлен, иначе оценка"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    total = 0
+    for piece in _TOKEN_PIECE.findall(text):
+        total += (len(piece) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return total
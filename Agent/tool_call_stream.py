@@ -0,0 +1,203 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+UNDECIDED = "undecided"
+PROSE = "prose"
+CALLS = "calls"
+
+# Символы, меняющие состояние разбора; все остальное пропускается одним прыжком регулярки
+_SPECIAL = re.compile(r'[\[\]{}"\\]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Начало открывающей строки блока кода: пока в ответе только она, решать рано
+_FENCE_OPENING = "```json"
+# Вызовы после вступительного текста: блок кода или массив/объект вызова в тексте
+_FENCED_BLOCK = re.compile(r"```[^\n`]*\n(.*?)(?:```|\Z)", re.DOTALL)
+_CALLS_START = re.compile(r'\[\s*\{|\{\s*"')
+_DECODER = json.JSONDecoder()
+
+
+class ToolCallStream:
+    """Инкрементальный разбор ответа модели в формате [{"id": ..., "function": {...}}].
+
+    По первому значащему символу решает, это обычный текст или JSON-массив вызовов
+    инструментов. Текст отдается сразу, а из массива - каждый объект вызова, как только
+    закрылась его скобка. Разбор возобновляется с места остановки при каждом feed(),
+    поэтому каждый символ просматривается один раз. repair_json вызывается только
+    в finish() и только если массив действительно поврежден.
+
+    Если перед вызовами идет фраза ("Прочитаю файл: [...]"), ответ печатается как текст,
+    а finish() ищет вызовы в последнем блоке кода или в массиве после фразы.
+    """
+
+    def __init__(self):
+        self.mode = UNDECIDED
+        self.objects: List[Dict[str, Any]] = []
+        # finish() понадобился repair_json
+        self.repaired = False
+        self._pending = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._closed = False
+        self._damaged = False
+        # Куски текущего незакрытого объекта верхнего уровня
+        self._object_parts: Optional[List[str]] = None
+        # Глубина, на которой открылся текущий объект: 0 - одиночный объект, 1 - элемент массива
+        self._object_depth = 0
+        # Весь текст режима CALLS - нужен только для восстановления в finish()
+        self._calls_text: List[str] = []
+        # Весь текст режима PROSE - в нем finish() ищет вызовы после вступления
+        self._prose_text: List[str] = []
+
+    def feed(self, text: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Принимает очередной кусок ответа; возвращает текст для печати и завершенные объекты вызовов"""
+        if self.mode == PROSE:
+            self._prose_text.append(text)
+            return text, []
+        if self.mode == UNDECIDED:
+            self._pending += text
+            stripped = self._pending.lstrip()
+            if stripped.startswith("```"):
+                # Блок кода: решаем по первому символу после строки с ```json
+                newline = stripped.find("\n")
+                if newline == -1:
+                    return "", []
+                stripped = stripped[newline + 1:].lstrip()
+            # Пустой остаток или начало ``` / ```json, пришедшее по одному-два символа
+            if _FENCE_OPENING.startswith(stripped):
+                return "", []
+            if stripped[0] not in "[{":
+                self.mode = PROSE
+                prose, self._pending = self._pending, ""
+                self._prose_text.append(prose)
+                return prose, []
+            self.mode = CALLS
+            text, self._pending = stripped, ""
+        if self._closed:
+            return "", []
+        self._calls_text.append(text)
+        return "", self._scan(text)
+
+    def _scan(self, text: str) -> List[Dict[str, Any]]:
+        completed = []
+        pos = 0
+        if self._escape:
+            # Экранированный символ пришел первым в новом куске
+            self._escape = False
+            pos = 1
+        object_start = 0 if self._object_parts is not None else -1
+        n = len(text)
+        while pos < n:
+            match = (_STRING_SPECIAL if self._in_string else _SPECIAL).search(text, pos)
+            if match is None:
+                break
+            i = match.start()
+            c = text[i]
+            pos = i + 1
+            if self._in_string:
+                if c == "\\":
+                    if pos >= n:
+                        self._escape = True
+                    pos += 1
+                else:
+                    self._in_string = False
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in "[{":
+                if self._depth <= 1 and object_start == -1:
+                    if c == "{":
+                        object_start = i
+                        self._object_parts = []
+                        self._object_depth = self._depth
+                    elif self._depth == 1:
+                        # Вложенный массив вместо объекта вызова
+                        self._damaged = True
+                self._depth += 1
+            elif c in "]}":
+                self._depth -= 1
+                if object_start != -1 and self._depth == self._object_depth and c == "}":
+                    self._object_parts.append(text[object_start:pos])
+                    call = self._parse_object("".join(self._object_parts))
+                    if call is not None:
+                        completed.append(call)
+                    self._object_parts = None
+                    object_start = -1
+                if self._depth <= 0:
+                    self._closed = True
+                    break
+        if object_start != -1:
+            self._object_parts.append(text[object_start:])
+        self.objects.extend(completed)
+        return completed
+
+    def _parse_object(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._damaged = True
+            return None
+        if not isinstance(value, dict):
+            self._damaged = True
+            return None
+        return value
+
+    def finish(self) -> Optional[List[Any]]:
+        """Список объектов вызовов или None, если ответ - обычный текст"""
+        if self.mode == PROSE:
+            return self._calls_after_prose("".join(self._prose_text))
+        if self.mode != CALLS:
+            return None
+        if self._closed and not self._damaged:
+            return self.objects
+        # Массив оборван или содержит невалидный JSON - пробуем восстановить его целиком
+        from json_repair import repair_json
+
+        self.repaired = True
+        try:
+            value = json.loads(repair_json("".join(self._calls_text)))
+        except ValueError:
+            return None
+        if isinstance(value, dict):
+            return [value]
+        if isinstance(value, list) and value:
+            return value
+        return None
+
+    def _calls_after_prose(self, text: str) -> Optional[List[Any]]:
+        """Вызовы из последнего блока кода или из массива/объекта после вступительной фразы.
+
+        Кандидат сначала разбирается как есть (текст после JSON отбрасывается), и только
+        при ошибке - через repair_json. Найденное принимается, только если в нем есть
+        объект с "function": массив или словарь в обычном тексте вызовами не считаются.
+        """
+        fenced = _FENCED_BLOCK.findall(text)
+        candidates = [fenced[-1]] if fenced else []
+        candidates.extend(text[match.start():] for match in _CALLS_START.finditer(text))
+        for candidate in candidates:
+            candidate = candidate.strip()
+            try:
+                value, _ = _DECODER.raw_decode(candidate)
+            except ValueError:
+                # repair_json медленный на длинном тексте - чиним не больше одного кандидата
+                if self.repaired:
+                    continue
+                from json_repair import repair_json
+
+                self.repaired = True
+                try:
+                    value = json.loads(repair_json(candidate))
+                except ValueError:
+                    continue
+            calls = [value] if isinstance(value, dict) else value
+            if isinstance(calls, list) and any(isinstance(c, dict) and "function" in c for c in calls):
+                return calls
+        return None
+
+
+def parse_tool_calls(content: str) -> Optional[List[Any]]:
+    """Разбирает готовый ответ модели тем же инкрементальным парсером"""
+    stream = ToolCallStream()
+    stream.feed(content)
+    return stream.finish()
@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+from instrumentation import TRACER
+
+MAX_TOOL_WORKERS = 8
+
+# Инструменты, которые только читают; остальные известные - пишут по своим путям
+READ_ONLY_TOOLS = {"read_file", "list_files", "search_code", "grep", "find_symbol", "outline", "semantic_search"}
+# Аргументы с путями для каждого инструмента
+PATH_ARGS = {
+    "read_file": ("filename",),
+    "list_files": ("path",),
+    "outline": ("path",),
+    "edit_file": ("path",),
+}
+# Инструменты, читающие весь проект: конфликтуют с любой записью внутри него
+PROJECT_WIDE_TOOLS = {"search_code", "grep", "find_symbol", "semantic_search"}
+
+
+class _PlannedCall:
+    __slots__ = ("index", "call", "paths", "writes", "barrier", "deps")
+
+    def __init__(self, index: int, call: Dict[str, Any], paths: Set[str], writes: bool, barrier: bool):
+        self.index = index
+        self.call = call
+        self.paths = paths
+        self.writes = writes
+        # Неизвестный инструмент: не знаем, что он трогает, поэтому выполняем строго по порядку
+        self.barrier = barrier
+        self.deps: List[int] = []
+
+
+def _call_paths(call: Dict[str, Any], resolve_path: Callable[[str], Any]) -> Optional[Set[str]]:
+    """Пути, которые трогает вызов; None, если инструмент неизвестен"""
+    name = call["name"]
+    args = call.get("args") or {}
+    if name in PROJECT_WIDE_TOOLS:
+        return {str(resolve_path("."))}
+    if name == "edit_file_batch":
+        edits = args.get("edits") or []
+        return {str(resolve_path(e["path"])) for e in edits if isinstance(e, dict) and "path" in e}
+    if name not in PATH_ARGS:
+        return None
+    return {str(resolve_path(args[key])) for key in PATH_ARGS[name] if isinstance(args.get(key), str)}
+
+
+def _overlaps(a: Set[str], b: Set[str]) -> bool:
+    """Пересечение путей с учетом вложенности: list_files(dir) конфликтует с записью в dir/file"""
+    for x in a:
+        for y in b:
+            if x == y or x.startswith(y + os.sep) or y.startswith(x + os.sep):
+                return True
+    return False
+
+
+def plan_tool_calls(tool_calls: Sequence[Dict[str, Any]],
+                    resolve_path: Callable[[str], Any]) -> List[_PlannedCall]:
+    """Строит зависимости: вызов ждет более ранние вызовы, с которыми конфликтует по записи"""
+    planned = []
+    for i, call in enumerate(tool_calls):
+        try:
+            paths = _call_paths(call, resolve_path)
+        except Exception:
+            paths = None
+        barrier = paths is None
+        writes = call["name"] not in READ_ONLY_TOOLS
+        item = _PlannedCall(i, call, paths or set(), writes, barrier)
+        for prev in planned:
+            if item.barrier or prev.barrier:
+                item.deps.append(prev.index)
+            elif (item.writes or prev.writes) and _overlaps(item.paths, prev.paths):
+                item.deps.append(prev.index)
+        planned.append(item)
+    return planned
+
+
+def _execute(call: Dict[str, Any], tool: Optional[BaseTool], prefetched: bool = False) -> Tuple[str, str]:
+    """Выполняет один вызов; возвращает (content, status) в том же виде, что и ToolNode"""
+    with TRACER.span(call["name"], "tool", prefetched=prefetched) as span:
+        if tool is None:
+            content, status = f"Error: {call['name']} is not a valid tool.", "error"
+        else:
+            try:
+                output = tool.invoke(call.get("args") or {})
+                content = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False)
+                status = "success"
+            except Exception as e:
+                content, status = f"Error: {e!r}\n Please fix your mistakes.", "error"
+        span["result_bytes"] = len(content.encode("utf-8", "replace"))
+        span["tool_status"] = status
+    return content, status
+
+
+def _prefetch_key(call: Dict[str, Any]) -> Tuple[str, str]:
+    return call["name"], json.dumps(call.get("args") or {}, sort_keys=True, ensure_ascii=False)
+
+
+class ToolPrefetcher:
+    """Запускает вызовы только для чтения, пока модель еще дописывает ответ.
+
+    Узел инструментов потом забирает готовый результат по имени и аргументам вызова.
+    """
+
+    def __init__(self, max_workers: int = MAX_TOOL_WORKERS):
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def start(self, call: Dict[str, Any], tools: Sequence[BaseTool]) -> bool:
+        if call.get("name") not in READ_ONLY_TOOLS:
+            return False
+        tool = next((t for t in tools if t.name == call["name"]), None)
+        key = _prefetch_key(call)
+        with self._lock:
+            if key in self._futures:
+                return True
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+            # Копия контекста переносит в поток сессию для замеров
+            self._futures[key] = self._pool.submit(contextvars.copy_context().run, _execute, call, tool, True)
+        return True
+
+    def take(self, call: Dict[str, Any]) -> Optional[Future]:
+        with self._lock:
+            return self._futures.pop(_prefetch_key(call), None)
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+
+
+def _tool_message(call: Dict[str, Any], tool: Optional[BaseTool],
+                  prefetcher: Optional[ToolPrefetcher] = None) -> ToolMessage:
+    future = prefetcher.take(call) if prefetcher is not None else None
+    content, status = future.result() if future is not None else _execute(call, tool)
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status=status)
+
+
+def run_tool_calls(tool_calls: Sequence[Dict[str, Any]], tools: Sequence[BaseTool],
+                   resolve_path: Callable[[str], Any],
+                   max_workers: int = MAX_TOOL_WORKERS,
+                   prefetcher: Optional[ToolPrefetcher] = None) -> List[ToolMessage]:
+    """Выполняет вызовы инструментов одного шага: независимые чтения параллельно,
+    записи в один путь - в исходном порядке. Результаты возвращаются в порядке вызовов.
+    Уже запущенные через prefetcher вызовы не выполняются повторно.
+    """
+    tools_by_name = {t.name: t for t in tools}
+    if len(tool_calls) <= 1 or max_workers <= 1:
+        return [_tool_message(call, tools_by_name.get(call["name"]), prefetcher) for call in tool_calls]
+
+    planned = plan_tool_calls(tool_calls, resolve_path)
+    futures: List[Future] = []
+
+    def run(item: _PlannedCall) -> ToolMessage:
+        # Зависимости отправлены в пул раньше и уже запущены (очередь FIFO), поэтому ожидание не блокирует пул
+        for dep in item.deps:
+            futures[dep].result()
+        return _tool_message(item.call, tools_by_name.get(item.call["name"]), prefetcher)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(planned))) as pool:
+        for item in planned:
+            futures.append(pool.submit(contextvars.copy_context().run, run, item))
+        return [future.result() for future in futures]
+
+
+async def arun_tool_calls(tool_calls: Sequence[Dict[str, Any]], tools: Sequence[BaseTool],
+                          resolve_path: Callable[[str], Any],
+                          max_concurrency: int = MAX_TOOL_WORKERS) -> List[ToolMessage]:
+    """Асинхронный вариант run_tool_calls с теми же правилами порядка.
+
+    Инструменты работают с файлами синхронно, поэтому выполняются в пуле потоков
+    цикла событий и не блокируют другие сессии.
+    """
+    tools_by_name = {t.name: t for t in tools}
+    planned = plan_tool_calls(tool_calls, resolve_path)
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+    tasks: List[asyncio.Task] = []
+
+    async def run(item: _PlannedCall) -> ToolMessage:
+        if item.deps:
+            await asyncio.gather(*(tasks[dep] for dep in item.deps))
+        async with semaphore:
+            content, status = await asyncio.to_thread(_execute, item.call, tools_by_name.get(item.call["name"]))
+        return ToolMessage(content=content, name=item.call["name"], tool_call_id=item.call["id"], status=status)
+
+    for item in planned:
+        tasks.append(asyncio.ensure_future(run(item)))
+    return list(await asyncio.gather(*tasks))
@@ -0,0 +1,401 @@
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from code_search import MAX_INDEXED_FILE_BYTES, read_text
+from project_scanner import file_versions, load_project_scan
+from scan_cache import CACHE_DIR_NAME, RACY_MTIME_WINDOW_NS
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+TRIGRAM_INDEX_FILE_NAME = "trigram_index.sqlite"
+MAX_LINE_CHARS = 300
+# Файлы больше этого grep читает кусками по целым строкам
+GREP_PIECE_BYTES = 1024 * 1024
+# Полный перебор с таким числом файлов и больше идет в пуле процессов
+MIN_FILES_FOR_POOL = 64
+# Поиск вызывается из потоков агента; после fork блокировка, которую держал другой поток, осталась бы
+# захваченной навсегда, так что пул стартует чистые процессы
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+# files.trigrams - сжатая строка из отсортированных триграмм файла: по ней при изменении
+# файла вычисляется разница и переписываются только затронутые списки.
+# postings.ids - список id файлов с триграммой, array("I")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, rel TEXT UNIQUE, mtime_ns INTEGER, size INTEGER, trigrams BLOB);
+CREATE TABLE IF NOT EXISTS postings (tri TEXT PRIMARY KEY, ids BLOB) WITHOUT ROWID;
+"""
+
+# Запрос к индексу: None - подходит любой файл, str - триграмма, ("and"|"or", [подзапросы])
+TrigramQuery = Union[None, str, Tuple[str, List[Any]]]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы текста в нижнем регистре: индекс не зависит от регистра, запросы - надмножество"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def file_trigrams(path: str, max_bytes: int = MAX_INDEXED_FILE_BYTES) -> str:
+    """Отсортированные триграммы файла одной строкой; вызывается и в пуле процессов"""
+    text = read_text(Path(path), max_bytes)
+    return "".join(sorted(trigrams(text))) if text else ""
+
+
+def _pack(joined: str) -> bytes:
+    return zlib.compress(joined.encode("utf-8"), 1)
+
+
+def _unpack(blob: Optional[bytes]) -> Set[str]:
+    joined = zlib.decompress(blob).decode("utf-8") if blob else ""
+    return {joined[i:i + 3] for i in range(0, len(joined), 3)}
+
+
+def _and(parts: List[TrigramQuery]) -> TrigramQuery:
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", parts)
+
+
+def _or(parts: List[TrigramQuery]) -> TrigramQuery:
+    if not parts or any(p is None for p in parts):
+        return None
+    return parts[0] if len(parts) == 1 else ("or", parts)
+
+
+def _literal_query(run: List[str]) -> TrigramQuery:
+    return _and(sorted(trigrams("".join(run)))) if len(run) >= 3 else None
+
+
+def _analyze(items: Any) -> TrigramQuery:
+    """Триграммы, без которых совпадение регулярки невозможно, по разобранному шаблону.
+
+    Подряд идущие литералы дают свои триграммы, группы и повторы с min >= 1 -
+    требования своего тела, альтернатива - ИЛИ требований веток. Все остальное
+    (классы символов, точка, необязательные части) разрывает цепочку литералов.
+    """
+    required: List[TrigramQuery] = []
+    run: List[str] = []
+    for op, av in items:
+        name = str(op)
+        if name == "LITERAL":
+            run.append(chr(av))
+            continue
+        if name == "AT":
+            # ^, $, \b не занимают символов
+            continue
+        required.append(_literal_query(run))
+        run = []
+        if name == "SUBPATTERN":
+            required.append(_analyze(av[-1]))
+        elif name == "ATOMIC_GROUP":
+            required.append(_analyze(av))
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") and av[0] >= 1:
+            required.append(_analyze(av[2]))
+        elif name == "BRANCH":
+            required.append(_or([_analyze(branch) for branch in av[1]]))
+    required.append(_literal_query(run))
+    return _and(required)
+
+
+def regex_trigram_query(pattern: str) -> TrigramQuery:
+    """Запрос к индексу для регулярного выражения; None - сузить кандидатов нельзя"""
+    try:
+        return _analyze(sre_parse.parse(pattern))
+    except (re.error, RecursionError, TypeError, ValueError):
+        return None
+
+
+def text_pieces(path: str, piece_bytes: int = GREP_PIECE_BYTES) -> Iterator[str]:
+    """Текст файла кусками около piece_bytes, каждый кроме последнего кончается переводом строки.
+
+    Двоичные (нулевой байт в начале) и недоступные файлы не дают ничего. Строка длиннее
+    четырех кусков режется, чтобы не держать в памяти файл без переводов строк целиком.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return
+    with f:
+        tail = b""
+        first = True
+        while True:
+            try:
+                data = f.read(piece_bytes)
+            except OSError:
+                return
+            if first and b"\0" in data[:8192]:
+                return
+            first = False
+            if not data:
+                if tail:
+                    yield tail.decode("utf-8", errors="replace")
+                return
+            data = tail + data
+            cut = data.rfind(b"\n") + 1
+            if not cut:
+                if len(data) < 4 * piece_bytes:
+                    tail = data
+                    continue
+                cut = len(data)
+            yield data[:cut].decode("utf-8", errors="replace")
+            tail = data[cut:]
+
+
+def grep_file(path: str, rel: str, pattern: str, flags: int, max_matches: int) -> List[Tuple[str, int, str]]:
+    """Совпадения регулярки в файле: (rel, номер строки, строка); вызывается и в пуле процессов.
+
+    Файл любого размера читается кусками по целым строкам: совпадение, которое переходит
+    через границу куска, не найдется, но большой файл не пропускается молча.
+    """
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    matches: List[Tuple[str, int, str]] = []
+    first_line = 1
+    for text in text_pieces(path):
+        matches.extend(_grep_text(regex, text, rel, first_line, max_matches - len(matches)))
+        if len(matches) >= max_matches:
+            break
+        first_line += text.count("\n")
+    return matches
+
+
+def _grep_text(regex: re.Pattern, text: str, rel: str, line: int, max_matches: int) -> List[Tuple[str, int, str]]:
+    matches = []
+    line_pos = 0
+    for match in regex.finditer(text):
+        start = match.start()
+        if start < line_pos:
+            # Еще одно совпадение в уже найденной строке
+            continue
+        line += text.count("\n", line_pos, start)
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", start)
+        line_end = len(text) if line_end == -1 else line_end
+        matches.append((rel, line, text[line_start:line_end][:MAX_LINE_CHARS]))
+        line += 1
+        line_pos = line_end + 1
+        if len(matches) >= max_matches:
+            break
+    return matches
+
+
+def _grep_batch(args: Tuple[List[Tuple[str, str]], str, int, int]) -> List[Tuple[str, int, str]]:
+    files, pattern, flags, max_matches = args
+    matches = []
+    for path, rel in files:
+        matches.extend(grep_file(path, rel, pattern, flags, max_matches - len(matches)))
+        if len(matches) >= max_matches:
+            break
+    return matches
+
+
+class TrigramIndex:
+    """Постоянный триграммный индекс файлов проекта для поиска регулярками.
+
+    Для регулярки вычисляются триграммы, которые обязаны встретиться в совпадении;
+    пересечение их списков файлов дает кандидатов, и регулярка применяется только к
+    ним. Если обязательных триграмм нет (например, "a.*b" или "\\w+"), файлы проекта
+    просматриваются целиком. Много файлов просматривает пул процессов: он создается при
+    первом таком поиске и живет до close(), так что запуск процессов оплачивается один раз.
+    Файлы больше max_file_bytes в индекс не попадают и просматриваются при любом запросе.
+    """
+
+    def __init__(self, root: Path, index_path: Optional[Path] = None,
+                 exclude: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+                 max_file_bytes: int = MAX_INDEXED_FILE_BYTES):
+        self.root = root
+        self.index_path = index_path or root / CACHE_DIR_NAME / TRIGRAM_INDEX_FILE_NAME
+        self.exclude = exclude
+        self.workers = workers or os.cpu_count() or 1
+        self.max_file_bytes = max_file_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        # id -> rel всех проиндексированных файлов
+        self._files: Dict[int, str] = {}
+        # id файлов больше max_file_bytes: триграмм у них нет, и отсеять их нельзя
+        self._large: Set[int] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Обновления целиком идут по одному: иначе два параллельных grep при первом построении оба
+        # сочтут файл новым и второй упадет на UNIQUE(rel). Поиск этот замок не берет
+        self._update_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._files = dict(self._conn.execute("SELECT id, rel FROM files"))
+            self._large = {file_id for file_id, in self._conn.execute(
+                "SELECT id FROM files WHERE size > ?", (self.max_file_bytes,))}
+        return self._conn
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=POOL_CONTEXT)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def update(self, versions: Optional[Dict[str, Tuple[int, int]]] = None) -> Dict[str, int]:
+        """Переиндексирует файлы с изменившимися mtime или размером и удаляет пропавшие.
+
+        versions - готовые версии файлов (например, от ProjectWatcher) вместо обхода проекта.
+        """
+        if versions is None:
+            versions = file_versions(load_project_scan(self.root, exclude=self.exclude))
+        # Ждавший своей очереди вызов сверяется уже с обновленным индексом и обычно ничего не делает
+        with self._update_lock:
+            return self._update(versions)
+
+    def _update(self, versions: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+        racy_after = time.time_ns() - RACY_MTIME_WINDOW_NS
+        with self._lock:
+            conn = self._connect()
+            stored = {rel: (file_id, mtime_ns, size) for file_id, rel, mtime_ns, size
+                      in conn.execute("SELECT id, rel, mtime_ns, size FROM files")}
+        changed = [rel for rel, version in versions.items()
+                   if rel not in stored or stored[rel][1:] != version]
+        removed = [rel for rel in stored if rel not in versions]
+        if not changed and not removed:
+            return {"files": len(versions), "updated": 0, "removed": 0}
+
+        paths = [str(self.root / rel) for rel in changed]
+        if self.workers > 1 and len(paths) >= MIN_FILES_FOR_POOL:
+            joined = list(self._executor().map(file_trigrams, paths, [self.max_file_bytes] * len(paths),
+                                               chunksize=16))
+        else:
+            joined = [file_trigrams(path, self.max_file_bytes) for path in paths]
+
+        with self._lock:
+            added: Dict[str, List[int]] = defaultdict(list)
+            dropped: Dict[str, Set[int]] = defaultdict(set)
+            with conn:
+                for rel in removed:
+                    file_id = stored[rel][0]
+                    for tri in self._stored_trigrams(file_id):
+                        dropped[tri].add(file_id)
+                    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                    self._files.pop(file_id, None)
+                    self._large.discard(file_id)
+                for rel, new_joined in zip(changed, joined):
+                    mtime_ns, size = versions[rel]
+                    # Недавно измененный файл перепроверим при следующем обновлении
+                    row = (-1 if mtime_ns > racy_after else mtime_ns, size, _pack(new_joined))
+                    new = {new_joined[i:i + 3] for i in range(0, len(new_joined), 3)}
+                    if rel in stored:
+                        # id сохраняется, поэтому достаточно разницы старых и новых триграмм
+                        file_id = stored[rel][0]
+                        old = self._stored_trigrams(file_id)
+                        conn.execute("UPDATE files SET mtime_ns = ?, size = ?, trigrams = ? WHERE id = ?",
+                                     (*row, file_id))
+                    else:
+                        old = set()
+                        file_id = conn.execute("INSERT INTO files (rel, mtime_ns, size, trigrams) VALUES (?, ?, ?, ?)",
+                                               (rel, *row)).lastrowid
+                        self._files[file_id] = rel
+                    if size > self.max_file_bytes:
+                        self._large.add(file_id)
+                    else:
+                        self._large.discard(file_id)
+                    for tri in new - old:
+                        added[tri].append(file_id)
+                    for tri in old - new:
+                        dropped[tri].add(file_id)
+                self._write_postings(added, dropped)
+        return {"files": len(versions), "updated": len(changed), "removed": len(removed)}
+
+    def _stored_trigrams(self, file_id: int) -> Set[str]:
+        row = self._conn.execute("SELECT trigrams FROM files WHERE id = ?", (file_id,)).fetchone()
+        return _unpack(row[0] if row else None)
+
+    def _write_postings(self, added: Dict[str, List[int]], dropped: Dict[str, Set[int]]):
+        """Переписывает списки файлов только для затронутых триграмм"""
+        for tri in added.keys() | dropped.keys():
+            ids = self._posting(tri)
+            if tri in dropped:
+                ids = array("I", (i for i in ids if i not in dropped[tri]))
+            ids.extend(added.get(tri, ()))
+            if ids:
+                self._conn.execute("INSERT OR REPLACE INTO postings (tri, ids) VALUES (?, ?)", (tri, ids.tobytes()))
+            else:
+                self._conn.execute("DELETE FROM postings WHERE tri = ?", (tri,))
+
+    def _posting(self, tri: str) -> array:
+        ids = array("I")
+        row = self._conn.execute("SELECT ids FROM postings WHERE tri = ?", (tri,)).fetchone()
+        if row is not None:
+            ids.frombytes(row[0])
+        return ids
+
+    def _candidates(self, query: TrigramQuery) -> Optional[Set[int]]:
+        if query is None:
+            return None
+        if isinstance(query, str):
+            return set(self._posting(query))
+        op, parts = query
+        if op == "or":
+            result: Set[int] = set()
+            for part in parts:
+                result |= self._candidates(part)
+            return result
+        result = None
+        for part in parts:
+            ids = self._candidates(part)
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def grep(self, pattern: str, path_prefix: str = "", ignore_case: bool = False,
+             max_results: int = 50) -> Dict[str, Any]:
+        """Строки файлов проекта, совпавшие с регуляркой; path_prefix ограничивает поиск поддеревом"""
+        flags = re.IGNORECASE if ignore_case else 0
+        re.compile(pattern, flags)
+        query = regex_trigram_query(pattern)
+        prefix = path_prefix.strip("/")
+        with self._lock:
+            self._connect()
+            candidates = self._candidates(query)
+            ids = self._files.keys() if candidates is None else candidates | self._large
+            files = sorted(self._files[i] for i in ids if i in self._files)
+        if prefix and prefix != ".":
+            files = [rel for rel in files if rel == prefix or rel.startswith(prefix + "/")]
+        targets = [(str(self.root / rel), rel) for rel in files]
+        if self.workers > 1 and len(targets) >= MIN_FILES_FOR_POOL:
+            batches = [targets[i::self.workers] for i in range(self.workers)]
+            found = [m for batch in self._executor().map(_grep_batch, [(b, pattern, flags, max_results)
+                                                                        for b in batches])
+                     for m in batch]
+            found.sort()
+        else:
+            found = _grep_batch((targets, pattern, flags, max_results))
+        return {
+            "pattern": pattern,
+            "indexed": query is not None,
+            "files_searched": len(targets),
+            "matches": [{"path": rel, "line": line, "text": text} for rel, line, text in found[:max_results]],
+            "truncated": len(found) >= max_results,
+        }
@@ -0,0 +1,254 @@
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from code_search import read_text, tokenize
+from project_scanner import file_versions, load_project_scan
+from scan_cache import CACHE_DIR_NAME, RACY_MTIME_WINDOW_NS
+
+VECTOR_INDEX_DIR_NAME = "vectors"
+# Размерность хэшированных векторов
+EMBEDDING_DIM = 1024
+# Фрагменты по CHUNK_LINES строк с перекрытием CHUNK_LINES - CHUNK_STEP
+CHUNK_LINES = 40
+CHUNK_STEP = 30
+MAX_CHUNK_CHARS = 2000
+# Меньше файлов дешевле векторизовать в текущем процессе, чем поднимать пул
+MIN_FILES_FOR_POOL = 32
+# Индекс обновляется из процесса с потоками (наблюдатель, пул инструментов): fork скопировал бы
+# их захваченные блокировки в дочерний процесс, поэтому рабочие процессы запускаются с нуля
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (rel TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, rel TEXT, start_line INTEGER, end_line INTEGER);
+CREATE INDEX IF NOT EXISTS chunks_rel ON chunks (rel);
+"""
+
+# (start_line, end_line) фрагмента, 1-based, включительно
+ChunkRange = Tuple[int, int]
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Вектор текста без модели и сети: хэширование слов и пар соседних слов со знаком.
+
+    Частоты сглаживаются логарифмом, вектор нормируется, поэтому скалярное
+    произведение - косинусная близость. crc32 стабилен между процессами, в отличие от hash().
+    """
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter((1.0 + math.log(c) for c in features.values()), dtype=np.float32, count=len(features))
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+    np.add.at(vector, (hashes % dim).astype(np.intp), signs * weights)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def chunk_lines(lines: List[str]) -> List[ChunkRange]:
+    ranges = []
+    for start in range(0, max(len(lines), 1), CHUNK_STEP):
+        end = min(start + CHUNK_LINES, len(lines))
+        ranges.append((start + 1, end))
+        if end >= len(lines):
+            break
+    return ranges
+
+
+def embed_file(path: str, dim: int = EMBEDDING_DIM) -> Tuple[List[ChunkRange], Optional[np.ndarray]]:
+    """Фрагменты файла и их векторы; вызывается и в пуле процессов"""
+    text = read_text(Path(path))
+    if not text or not text.strip():
+        return [], None
+    lines = text.splitlines()
+    ranges = chunk_lines(lines)
+    matrix = np.stack([embed("\n".join(lines[s - 1:e]), dim) for s, e in ranges])
+    return ranges, matrix
+
+
+class VectorIndex:
+    """Офлайн-индекс фрагментов файлов проекта для семантического поиска.
+
+    Векторы лежат в файле float32-матрицы, открытом через np.memmap; запрос -
+    одно матричное умножение по всем строкам и выбор top-k. Метаданные фрагментов
+    и версии файлов - в SQLite рядом. Файлы добавляются и удаляются по одному:
+    строки удаленных фрагментов обнуляются и переиспользуются.
+    """
+
+    def __init__(self, root: Path, index_dir: Optional[Path] = None,
+                 exclude: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+                 dim: int = EMBEDDING_DIM):
+        self.root = root
+        self.index_dir = index_dir or root / CACHE_DIR_NAME / VECTOR_INDEX_DIR_NAME
+        self.exclude = exclude
+        self.workers = workers or os.cpu_count() or 1
+        self.dim = dim
+        self._conn: Optional[sqlite3.Connection] = None
+        self._matrix: Optional[np.memmap] = None
+        # Строки матрицы, занятые фрагментами
+        self._valid = np.zeros(0, dtype=bool)
+        self._chunks: Dict[int, Tuple[str, int, int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.index_dir / f"vectors_{self.dim}.f32"
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.index_dir / "chunks.sqlite"), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._chunks = {row: (rel, start, end) for row, rel, start, end
+                        in self._conn.execute("SELECT row, rel, start_line, end_line FROM chunks")}
+        capacity = self.vectors_path.stat().st_size // (4 * self.dim) if self.vectors_path.exists() else 0
+        self._map(max(capacity, max(self._chunks, default=-1) + 1))
+
+    def _map(self, capacity: int):
+        """Открывает матрицу на capacity строк, увеличивая файл при необходимости"""
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        size = capacity * 4 * self.dim
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = (np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+                        if capacity else None)
+        valid = np.zeros(capacity, dtype=bool)
+        valid[list(self._chunks)] = True
+        self._valid = valid
+
+    def _allocate(self, count: int) -> List[int]:
+        free = np.flatnonzero(~self._valid)[:count].tolist()
+        if len(free) < count:
+            capacity = len(self._valid)
+            new_capacity = max(capacity * 2, capacity + count - len(free), 256)
+            self._map(new_capacity)
+            free += list(range(capacity, capacity + count - len(free)))
+        return free
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _store(self, rel: str, version: Tuple[int, int], ranges: List[ChunkRange], matrix: Optional[np.ndarray]):
+        self._drop(rel)
+        if ranges:
+            rows = self._allocate(len(ranges))
+            self._matrix[rows] = matrix
+            self._valid[rows] = True
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                                   [(row, rel, s, e) for row, (s, e) in zip(rows, ranges)])
+            for row, (s, e) in zip(rows, ranges):
+                self._chunks[row] = (rel, s, e)
+        self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (rel, *version))
+
+    def _drop(self, rel: str):
+        rows = [row for (row,) in self._conn.execute("SELECT row FROM chunks WHERE rel = ?", (rel,))]
+        if rows:
+            self._matrix[rows] = 0.0
+            self._valid[rows] = False
+            for row in rows:
+                del self._chunks[row]
+            self._conn.execute("DELETE FROM chunks WHERE rel = ?", (rel,))
+        self._conn.execute("DELETE FROM files WHERE rel = ?", (rel,))
+
+    def add_file(self, rel: str):
+        """Индексирует (или переиндексирует) один файл проекта"""
+        st = os.stat(self.root / rel)
+        ranges, matrix = embed_file(str(self.root / rel), self.dim)
+        mtime_ns = -1 if st.st_mtime_ns > time.time_ns() - RACY_MTIME_WINDOW_NS else st.st_mtime_ns
+        with self._lock:
+            self._open()
+            self._store(rel, (mtime_ns, st.st_size), ranges, matrix)
+            self._commit()
+
+    def remove_file(self, rel: str):
+        with self._lock:
+            self._open()
+            self._drop(rel)
+            self._commit()
+
+    def _commit(self):
+        # Сначала векторы на диск, потом метаданные: фрагмент не может ссылаться на незаписанную строку
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._conn.commit()
+
+    def update(self, versions: Optional[Dict[str, Tuple[int, int]]] = None) -> Dict[str, int]:
+        """Переиндексирует измененные файлы проекта (параллельно в процессах) и удаляет пропавшие.
+
+        versions - готовые версии файлов (например, от ProjectWatcher) вместо обхода проекта.
+        """
+        if versions is None:
+            versions = file_versions(load_project_scan(self.root, exclude=self.exclude))
+        racy_after = time.time_ns() - RACY_MTIME_WINDOW_NS
+        with self._lock:
+            self._open()
+            stored = {rel: (mtime_ns, size) for rel, mtime_ns, size
+                      in self._conn.execute("SELECT rel, mtime_ns, size FROM files")}
+        changed = [rel for rel, version in versions.items() if stored.get(rel) != version]
+        removed = [rel for rel in stored if rel not in versions]
+        paths = [str(self.root / rel) for rel in changed]
+        if self.workers > 1 and len(paths) >= MIN_FILES_FOR_POOL:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=POOL_CONTEXT) as pool:
+                embedded = list(pool.map(embed_file, paths, [self.dim] * len(paths), chunksize=16))
+        else:
+            embedded = [embed_file(path, self.dim) for path in paths]
+        with self._lock:
+            for rel in removed:
+                self._drop(rel)
+            for rel, (ranges, matrix) in zip(changed, embedded):
+                mtime_ns, size = versions[rel]
+                # Недавно измененный файл перепроверим при следующем обновлении
+                self._store(rel, (-1 if mtime_ns > racy_after else mtime_ns, size), ranges, matrix)
+            self._commit()
+        return {"files": len(versions), "updated": len(changed), "removed": len(removed)}
+
+    def query(self, text: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Фрагменты, ближайшие к запросу по косинусу, с их текстом"""
+        vector = embed(text, self.dim)
+        with self._lock:
+            self._open()
+            if self._matrix is None or not self._valid.any():
+                return []
+            # Одно умножение по всей матрице; пустые строки нулевые и отсекаются маской
+            scores = self._matrix @ vector
+            scores[~self._valid] = -np.inf
+            k = min(max_results, int(self._valid.sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits = [(int(row), float(scores[row]), self._chunks[int(row)]) for row in top if scores[row] > 0]
+        results = []
+        for row, score, (rel, start, end) in hits:
+            text = read_text(self.root / rel) or ""
+            chunk = "\n".join(text.splitlines()[start - 1:end])
+            results.append({
+                "path": rel,
+                "start_line": start,
+                "end_line": end,
+                "score": round(score, 3),
+                "content": chunk[:MAX_CHUNK_CHARS],
+            })
+        return results
@@ -0,0 +1,227 @@
+"""Сквозной прогон цикла агента по сценариям на локальном фейковом сервере модели.
+
+Граф, инструменты, окно контекста и чекпоинтер - настоящие из agent.py, модель заменена
+benchmarks/fake_llm_server.py с заданной задержкой. Для каждого сценария выводятся
+задержка хода (p50/p95), время в модели, в узле инструментов, в остальных узлах
+(сжатие контекста, разбор ответа, дедупликация) и накладные расходы графа (все, что вне узлов:
+планировщик LangGraph, запись чекпоинтов), а также рост пиковой памяти процесса.
+
+Запуск: python benchmarks/bench_agent_loop.py [--latency 0.05] [--turns 20] [--no-stream]
+        [--tracemalloc] [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "Agent"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from langchain_core.messages import HumanMessage, SystemMessage  # noqa: E402
+
+from fake_llm_server import FakeLLMServer, ScriptedResponder  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def make_project(root: Path, modules: int = 30):
+    """Небольшой проект: пакет с модулями, у каждого функции и класс"""
+    package = root / "app"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    for i in range(modules):
+        body = [f'"""Модуль {i}"""', "import os", ""]
+        for j in range(20):
+            body += [f"def handler_{i}_{j}(value):", f"    return value * {j} + {i}", ""]
+        body += [f"class Service{i}:", "    def run(self, value):", f"        return handler_{i}_0(value)", ""]
+        (package / f"module_{i}.py").write_text("\n".join(body))
+    (root / "README.md").write_text("# demo\n")
+
+
+# Сценарии: запросы пользователя по ходам и ответы модели по шагам каждого хода
+SCENARIOS: Dict[str, Dict[str, List[Any]]] = {
+    "чтение файла": {
+        "Прочитай app/module_1.py": [
+            [{"name": "read_file", "arguments": {"filename": "app/module_1.py"}}],
+            "В модуле 20 функций handler_1_* и класс Service1.",
+        ],
+    },
+    "параллельные чтения": {
+        "Сравни первые пять модулей": [
+            [{"name": "read_file", "arguments": {"filename": f"app/module_{i}.py"}} for i in range(5)],
+            "Модули устроены одинаково.",
+        ],
+    },
+    "поиск и правка": {
+        "Найди Service3.run и поправь его": [
+            [{"name": "find_symbol", "arguments": {"name": "Service3.run"}}],
+            [{"name": "read_file", "arguments": {"filename": "app/module_3.py", "start_line": 64, "end_line": 66}}],
+            [{"name": "edit_file", "arguments": {"path": "app/module_3.py",
+                                                 "old_str": "return handler_3_0(value)",
+                                                 "new_str": "return handler_3_1(value)"}}],
+            "Исправил Service3.run.",
+        ],
+        "Где еще вызывается handler_3_0?": [
+            [{"name": "grep", "arguments": {"pattern": r"handler_3_0\("}}],
+            "Только в определении.",
+        ],
+    },
+    "только текст": {
+        "Привет": ["Привет! Чем помочь?"],
+    },
+}
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run_scenario(agent: Any, system_prompt: str, script: Dict[str, List[Any]], turns: int,
+                 server: FakeLLMServer) -> Dict[str, Any]:
+    """Повторяет запросы сценария по кругу turns ходов в одной сессии"""
+    session_id = uuid.uuid4().hex
+    config = {"configurable": {"thread_id": session_id}} if agent.CHECKPOINTER else None
+    messages = [SystemMessage(content=system_prompt)]
+    persisted = 0
+    prompts = list(script)
+    latencies, model, tools, nodes, overhead, parse, prompt_tokens = [], [], [], [], [], [], []
+    requests, received = server.requests, server.bytes_received
+    rss_before = peak_rss_mb()
+    for turn in range(turns):
+        messages.append(HumanMessage(content=prompts[turn % len(prompts)]))
+        seen = len(agent.TRACER.spans(session_id))
+        start = time.perf_counter()
+        # Инструменты и потоковый вывод печатают в stdout - в замерах это не нужно
+        with contextlib.redirect_stdout(io.StringIO()), agent.TRACER.session(session_id):
+            state = agent.app.invoke({"messages": messages[persisted:]}, config)
+        elapsed = time.perf_counter() - start
+        messages = state["messages"]
+        if agent.CHECKPOINTER:
+            persisted = len(messages)
+        # Замеры хода - из встроенного регистратора агента
+        totals: Dict[str, float] = {}
+        for span in agent.TRACER.spans(session_id)[seen:]:
+            key = span["name"] if span["kind"] in ("node", "llm", "parse") else span["kind"]
+            totals[key] = totals.get(key, 0.0) + span["ms"] / 1000
+            prompt_tokens.append(span["attrs"].get("prompt_tokens", 0))
+        in_nodes = totals.get("agent", 0.0) + totals.get("tools", 0.0) + totals.get("dedupe", 0.0)
+        latencies.append(elapsed)
+        model.append(totals.get("model", 0.0))
+        tools.append(totals.get("tools", 0.0))
+        parse.append(totals.get("tool_calls", 0.0))
+        nodes.append(in_nodes - totals.get("model", 0.0) - totals.get("tools", 0.0))
+        overhead.append(elapsed - in_nodes)
+    return {
+        "turns": turns,
+        "messages": len(messages),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "model_ms": statistics.mean(model) * 1000,
+        "tools_ms": statistics.mean(tools) * 1000,
+        "nodes_ms": statistics.mean(nodes) * 1000,
+        "graph_ms": statistics.mean(overhead) * 1000,
+        "parse_ms": statistics.mean(parse) * 1000,
+        "prompt_tokens": sum(prompt_tokens) / turns,
+        "requests": server.requests - requests,
+        "request_kb": (server.bytes_received - received) / max(server.requests - requests, 1) / 1024,
+        "rss_growth_mb": peak_rss_mb() - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа модели, s")
+    parser.add_argument("--turns", type=int, default=20, help="ходов в каждом сценарии")
+    parser.add_argument("--no-stream", action="store_true", help="без потокового ответа модели")
+    parser.add_argument("--no-checkpoint", action="store_true", help="без чекпоинтера")
+    parser.add_argument("--tracemalloc", action="store_true", help="пик памяти Python по tracemalloc (замедляет)")
+    parser.add_argument("--output", type=Path, help="записать результаты в JSON для сравнения между версиями")
+    args = parser.parse_args()
+
+    script = {prompt: steps for scenario in SCENARIOS.values() for prompt, steps in scenario.items()}
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(ScriptedResponder(script), latency=args.latency) as server:
+        project = Path(tmp) / "project"
+        project.mkdir()
+        make_project(project)
+        # agent.py читает настройки и корень проекта при импорте
+        os.chdir(project)
+        os.environ.update({
+            "AGENT_LLM_BASE_URL": server.base_url,
+            "AGENT_STREAM": "0" if args.no_stream else "1",
+            "AGENT_CHECKPOINT_DB": "0" if args.no_checkpoint else str(Path(tmp) / "checkpoints.sqlite"),
+            "AGENT_SPANS_FILE": str(Path(tmp) / "spans.jsonl"),
+        })
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+        start = time.perf_counter()
+        import agent
+        import_ms = (time.perf_counter() - start) * 1000
+        # LangChain, клиент модели и граф загружаются отдельно от импорта - в первый ход это не попадает
+        start = time.perf_counter()
+        agent.load_runtime()
+        runtime_ms = (time.perf_counter() - start) * 1000
+        from project_summary import summarize_project_structure
+
+        start = time.perf_counter()
+        summary = summarize_project_structure(token_budget=agent.PROJECT_CONTEXT_TOKENS)
+        scan_ms = (time.perf_counter() - start) * 1000
+        system_prompt = agent.build_system_prompt(summary.text)
+        print(f"импорт agent: {import_ms:.0f} ms, загрузка графа: {runtime_ms:.0f} ms, "
+              f"анализ проекта: {scan_ms:.0f} ms, "
+              f"задержка модели {args.latency * 1000:.0f} ms, поток: {'нет' if args.no_stream else 'да'}")
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        results = {}
+        header = (f"{'сценарий':<22}{'p50, ms':>9}{'p95, ms':>9}{'модель':>8}{'инстр.':>8}{'узлы':>7}"
+                  f"{'граф':>7}{'разбор':>8}{'токенов':>9}{'запрос, КБ':>12}{'RSS+, МБ':>10}")
+        if args.tracemalloc:
+            header += f"{'heap, МБ':>10}"
+        print(header)
+        for name, scenario in SCENARIOS.items():
+            if args.tracemalloc:
+                tracemalloc.reset_peak()
+            result = run_scenario(agent, system_prompt, scenario, args.turns, server)
+            line = (f"{name:<22}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['model_ms']:>8.1f}"
+                    f"{result['tools_ms']:>8.1f}{result['nodes_ms']:>7.1f}{result['graph_ms']:>7.1f}"
+                    f"{result['parse_ms']:>8.2f}{result['prompt_tokens']:>9.0f}"
+                    f"{result['request_kb']:>12.1f}{result['rss_growth_mb']:>10.1f}")
+            if args.tracemalloc:
+                result["heap_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                line += f"{result['heap_peak_mb']:>10.1f}"
+            print(line)
+            results[name] = result
+        if agent.CHECKPOINTER is not None:
+            agent.CHECKPOINTER.close()
+        os.chdir(BENCH_DIR)
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "latency": args.latency, "turns": args.turns, "stream": not args.no_stream,
+            "import_ms": import_ms, "runtime_ms": runtime_ms, "scan_ms": scan_ms, "scenarios": results,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
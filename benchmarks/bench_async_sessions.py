@@ -0,0 +1,85 @@
+"""Нагрузочный тест асинхронного графа: много сессий в одном процессе.
+
+Поднимает фейковый сервер модели (fake_llm_server.py) с заданной задержкой ответа и сравнивает
+последовательное обслуживание сессий с параллельным через общий пул соединений.
+
+Запуск: python benchmarks/bench_async_sessions.py [--sessions 1 10 50] [--turns 3] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+from fake_llm_server import FakeLLMServer, tool_calls  # noqa: E402
+
+
+def make_responder(list_path: str):
+    def respond(body):
+        # На сообщение пользователя - вызов list_files, на результат инструмента - текст
+        if body["messages"][-1]["role"] == "tool":
+            return "Готово: файлы перечислены."
+        return tool_calls({"name": "list_files", "arguments": {"path": list_path}})
+
+    return respond
+
+
+async def run_session(app, turns: int, latencies: list):
+    from async_agent import AgentSession
+
+    session = AgentSession(app, "Ты помощник в кодинге.")
+    for turn in range(turns):
+        start = time.perf_counter()
+        await session.ask(f"Покажи файлы, шаг {turn}")
+        latencies.append(time.perf_counter() - start)
+
+
+async def measure(app, sessions: int, turns: int, concurrent: bool):
+    latencies = []
+    start = time.perf_counter()
+    if concurrent:
+        await asyncio.gather(*(run_session(app, turns, latencies) for _ in range(sessions)))
+    else:
+        for _ in range(sessions):
+            await run_session(app, turns, latencies)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return elapsed, sessions * turns / elapsed, statistics.median(latencies), p95
+
+
+async def main_async(args, base_url: str):
+    from async_agent import build_async_app, build_async_llm
+
+    app = build_async_app(build_async_llm(base_url=base_url, api_key="bench"))
+    print(f"{'сессий':>7}{'режим':>14}{'время, s':>10}{'ходов/s':>10}{'p50, s':>9}{'p95, s':>9}")
+    for sessions in args.sessions:
+        for concurrent in (False, True):
+            elapsed, throughput, p50, p95 = await measure(app, sessions, args.turns, concurrent)
+            mode = "параллельно" if concurrent else "по очереди"
+            print(f"{sessions:>7}{mode:>14}{elapsed:>10.2f}{throughput:>10.1f}{p50:>9.3f}{p95:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа сервера, s")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(20):
+            Path(tmp, f"module_{i}.py").write_text("print('hello')\n")
+        with FakeLLMServer(make_responder(tmp), latency=args.latency) as server:
+            asyncio.run(main_async(args, server.base_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Пропускная способность пакетного режима (Agent/batch_runner.py) на фейковом сервере модели.
+
+Каждая задача - чтение файла и ответ (два запроса к модели). Для каждого числа исполнителей
+выводятся время пакета, задач в минуту, p50/p95 задачи и суммарное ожидание лимита; --rpm
+проверяет, что общий лимит запросов соблюдается при любом числе исполнителей.
+
+Запуск: python benchmarks/bench_batch.py [--tasks 100] [--workers 1 8 32] [--latency 0.2] [--rpm 0]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "Agent"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_llm_server import FakeLLMServer, tool_calls  # noqa: E402
+
+
+def respond(body):
+    # На запрос пользователя - чтение файла из текста задачи, на результат инструмента - ответ
+    last = body["messages"][-1]
+    if last["role"] == "tool":
+        return "Готово."
+    return tool_calls({"name": "read_file", "arguments": {"filename": last["content"].split()[-1]}})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа модели, s")
+    parser.add_argument("--rpm", type=float, default=0, help="общий лимит запросов к модели в минуту")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(respond, latency=args.latency) as server:
+        project = Path(tmp) / "project"
+        project.mkdir()
+        for i in range(10):
+            (project / f"module_{i}.py").write_text(f"def handler_{i}(value):\n    return value + {i}\n")
+        # agent.py читает настройки и корень проекта при импорте
+        os.chdir(project)
+        os.environ.update({
+            "AGENT_LLM_BASE_URL": server.base_url,
+            "AGENT_CHECKPOINT_DB": str(Path(tmp) / "checkpoints.sqlite"),
+            "AGENT_SPANS_FILE": "0",
+        })
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+        from agent import open_checkpointer
+        from async_agent import build_async_llm
+        from batch_runner import BatchRunner, BatchTask, ModelLimiter
+        from instrumentation import percentile
+
+        tasks = [BatchTask(f"t{i}", [f"Прочитай module_{i % 10}.py"]) for i in range(args.tasks)]
+        print(f"задач: {args.tasks}, задержка модели {args.latency * 1000:.0f} ms, "
+              f"лимит: {f'{args.rpm:.0f} в минуту' if args.rpm else 'нет'}")
+        print(f"{'исполнителей':>13}{'время, s':>10}{'задач/мин':>11}{'p50, s':>9}{'p95, s':>9}"
+              f"{'ожидание, s':>13}{'ошибок':>8}")
+
+        async def run_all():
+            # Один цикл событий на все прогоны: соединения пула httpx привязаны к циклу, в котором открыты
+            llm = build_async_llm()
+            checkpointer = open_checkpointer()
+            for workers in args.workers:
+                output = Path(tmp) / f"results_{workers}.jsonl"
+                runner = BatchRunner(tasks, output, "Ты помощник в кодинге.", llm,
+                                     checkpointer=checkpointer, workers=workers,
+                                     limiter=ModelLimiter(workers, args.rpm))
+                start = time.perf_counter()
+                # Инструменты и ход пакета печатают в stdout - в замерах это не нужно
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    results = await runner.run()
+                elapsed = time.perf_counter() - start
+                durations = [r["seconds"] for r in results]
+                print(f"{workers:>13}{elapsed:>10.2f}{len(results) / elapsed * 60:>11.0f}"
+                      f"{percentile(durations, 0.5):>9.2f}{percentile(durations, 0.95):>9.2f}"
+                      f"{sum(r['wait_ms'] for r in results) / 1000:>13.1f}"
+                      f"{sum(r['status'] != 'ok' for r in results):>8}")
+            checkpointer.close()
+
+        asyncio.run(run_all())
+        os.chdir(BENCH_DIR)
+
+
+if __name__ == "__main__":
+    main()
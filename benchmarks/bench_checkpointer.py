@@ -0,0 +1,88 @@
+"""Объем записи чекпоинтов на шаг по мере роста сессии и время продолжения сессии.
+
+Граф повторяет форму агента (ответ модели -> инструмент -> ответ), но без сети.
+Для сравнения показан размер полного снимка истории, который пишет чекпоинтер
+без дельт.
+
+Запуск: python benchmarks/bench_checkpointer.py [--turns 200] [--result-kb 8]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage  # noqa: E402
+from langgraph.graph import END, MessagesState, StateGraph  # noqa: E402
+
+from checkpointer import ZLIB_LEVEL, SqliteCheckpointSaver  # noqa: E402
+
+
+def build_app(saver: SqliteCheckpointSaver, result_chars: int):
+    def agent(state: MessagesState):
+        if isinstance(state["messages"][-1], HumanMessage):
+            call_id = f"call_{len(state['messages'])}"
+            return {"messages": [AIMessage(content="", tool_calls=[
+                {"name": "read_file", "args": {"filename": "a.py"}, "id": call_id, "type": "tool_call"}])]}
+        return {"messages": [AIMessage(content="Файл прочитан, функция возвращает значение.")]}
+
+    def tools(state: MessagesState):
+        call = state["messages"][-1].tool_calls[0]
+        body = "".join(f"line {i}: value = compute({i})\n" for i in range(result_chars // 30))
+        return {"messages": [ToolMessage(content=body, tool_call_id=call["id"], name=call["name"])]}
+
+    workflow = StateGraph(state_schema=MessagesState)
+    workflow.add_node("agent", agent)
+    workflow.add_node("tools", tools)
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges("agent", lambda s: "tools" if s["messages"][-1].tool_calls else END,
+                                   {"tools": "tools", END: END})
+    workflow.add_edge("tools", "agent")
+    return workflow.compile(checkpointer=saver)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--result-kb", type=int, default=8, help="размер результата инструмента, КБ")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "checkpoints.sqlite"
+        saver = SqliteCheckpointSaver(db)
+        app = build_app(saver, args.result_kb * 1024)
+        config = {"configurable": {"thread_id": "bench"}}
+        app.invoke({"messages": [SystemMessage(content="Ты помощник в кодинге.")]}, config)
+
+        print(f"{'ход':>6}{'сообщений':>11}{'запись, КБ':>12}{'снимок, КБ':>12}{'ход, ms':>9}")
+        step = max(args.turns // 8, 1)
+        for turn in range(1, args.turns + 1):
+            written = saver.bytes_written
+            start = time.perf_counter()
+            state = app.invoke({"messages": [HumanMessage(content=f"Прочитай a.py, шаг {turn}")]}, config)
+            elapsed = time.perf_counter() - start
+            if turn % step == 0 or turn == args.turns:
+                snapshot = len(zlib.compress(saver.serde.dumps_typed(state["messages"])[1], ZLIB_LEVEL))
+                print(f"{turn:>6}{len(state['messages']):>11}{(saver.bytes_written - written) / 1024:>12.1f}"
+                      f"{snapshot / 1024:>12.1f}{elapsed * 1000:>9.1f}")
+        saver.close()
+
+        # Новый процесс: история читается один раз, следующий ход пишет только новые сообщения
+        resumed = SqliteCheckpointSaver(db)
+        app = build_app(resumed, args.result_kb * 1024)
+        start = time.perf_counter()
+        app.invoke({"messages": [HumanMessage(content="Продолжим")]}, config)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        app.invoke({"messages": [HumanMessage(content="Еще раз")]}, config)
+        second = time.perf_counter() - start
+        print(f"продолжение: первый ход {first * 1000:.1f} ms, следующий {second * 1000:.1f} ms, "
+              f"строк сообщений записано {resumed.rows_written}, файл {db.stat().st_size / 1024:.0f} КБ")
+        resumed.close()
+
+
+if __name__ == "__main__":
+    main()
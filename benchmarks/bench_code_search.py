@@ -0,0 +1,48 @@
+"""Построение BM25-индекса проекта, повторное обновление без изменений и время запросов.
+
+Запуск: python benchmarks/bench_code_search.py [--root путь] [--query "add messages" ...]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from code_search import CodeSearchIndex  # noqa: E402
+
+DEFAULT_QUERIES = ["scan project", "read file range", "tool call parser", "atomic write journal"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=Path, default=Path(__file__).resolve().parent.parent)
+    parser.add_argument("--query", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = CodeSearchIndex(args.root, index_path=Path(tmp) / "search_index.sqlite")
+        start = time.perf_counter()
+        stats = index.update()
+        print(f"построение: {stats['files']} файлов за {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        stats = index.update()
+        print(f"обновление без изменений: {stats['updated']} файлов за {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        for query in args.query:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = index.search(query)
+                timings.append(time.perf_counter() - start)
+            best = results[0] if results else None
+            top = f"{best['path']}:{best['line']}" if best else "-"
+            print(f"{query!r:<28} медиана {statistics.median(timings) * 1000:6.2f} ms  лучший: {top}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
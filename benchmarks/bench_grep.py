@@ -0,0 +1,63 @@
+"""grep по триграммному индексу против полного просмотра всех файлов проекта.
+
+Запуск: python benchmarks/bench_grep.py [--root путь] [--pattern "def \\w+_file" ...] [--workers 4]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+import trigram_index  # noqa: E402
+from trigram_index import TrigramIndex  # noqa: E402
+
+DEFAULT_PATTERNS = [r"def \w+_file\(", r"class \w+Index", "TODO|FIXME", r"import (os|sys)$", r"\bx\s*=\s*\d+"]
+
+
+def median_ms(index: TrigramIndex, pattern: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = index.grep(pattern, max_results=1000)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=Path, default=Path(__file__).resolve().parent.parent)
+    parser.add_argument("--pattern", nargs="+", default=DEFAULT_PATTERNS)
+    parser.add_argument("--workers", type=int, default=0, help="процессы для полного просмотра (0 - по числу ядер)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = TrigramIndex(args.root, index_path=Path(tmp) / "trigram_index.sqlite", workers=args.workers or None)
+        start = time.perf_counter()
+        stats = index.update()
+        print(f"построение: {stats['files']} файлов за {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        index.update()
+        print(f"обновление без изменений: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        print(f"{'шаблон':<24}{'файлов':>8}{'индекс, ms':>12}{'полный, ms':>12}{'строк':>7}")
+        for pattern in args.pattern:
+            indexed_ms, result = median_ms(index, pattern, args.repeat)
+            # Тот же поиск без сужения кандидатов - как будто у шаблона нет триграмм
+            analyze = trigram_index.regex_trigram_query
+            trigram_index.regex_trigram_query = lambda _: None
+            try:
+                full_ms, full = median_ms(index, pattern, args.repeat)
+            finally:
+                trigram_index.regex_trigram_query = analyze
+            assert result["matches"] == full["matches"], pattern
+            print(f"{pattern:<24}{result['files_searched']:>8}{indexed_ms:>12.1f}{full_ms:>12.1f}"
+                  f"{len(result['matches']):>7}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
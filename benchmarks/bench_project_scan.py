@@ -0,0 +1,114 @@
+"""Сравнение старого трехпроходного сканера с однопроходным scandir-сканером и теплым стартом из кэша.
+
+Запуск: python benchmarks/bench_project_scan.py [--dirs 200] [--files 50] [--root PATH]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from project_scanner import analyze_project_structure  # noqa: E402
+
+
+def legacy_analyze_project_structure(root_path: Path) -> str:
+    """Исходная реализация: рекурсия по iterdir и два прохода rglob"""
+    project_context = [f"=== СТРУКТУРА ПРОЕКТА: {root_path.name} ===\n"]
+
+    def scan_directory(directory: Path, prefix: str = "", is_last: bool = True):
+        if directory.name.startswith('.') or directory.name == '__pycache__':
+            return
+        connector = "└── " if is_last else "├── "
+        project_context.append(f"{prefix}{connector}{directory.name}/")
+        try:
+            items = list(directory.iterdir())
+        except PermissionError:
+            return
+        dirs = sorted([i for i in items if i.is_dir()], key=lambda x: x.name.lower())
+        files = sorted([i for i in items if i.is_file()], key=lambda x: x.name.lower())
+        all_items = dirs + files
+        for i, item in enumerate(all_items):
+            is_last_item = (i == len(all_items) - 1)
+            extension = "    " if is_last else "│   "
+            if item.is_dir():
+                scan_directory(item, prefix + extension, is_last_item)
+            else:
+                file_size = item.stat().st_size if item.exists() else 0
+                size_str = f" ({file_size} bytes)" if file_size > 0 else ""
+                file_connector = "└── " if is_last_item else "├── "
+                project_context.append(f"{prefix}{extension}{file_connector}{item.name}{size_str}")
+
+    scan_directory(root_path)
+
+    file_types = {}
+    for file_path in root_path.rglob('*'):
+        if file_path.is_file() and '__pycache__' not in str(file_path):
+            suffix = file_path.suffix or 'no_extension'
+            file_types[suffix] = file_types.get(suffix, 0) + 1
+
+    key_files = [p for p in root_path.rglob('*') if p.is_file() and p.suffix == '.py']
+    key_files.sort(key=lambda x: x.stat().st_size, reverse=True)
+    for i, file_path in enumerate(key_files[:5]):
+        project_context.append(f"{i+1}. {file_path.relative_to(root_path)} ({file_path.stat().st_size} bytes)")
+    return '\n'.join(project_context)
+
+
+def build_tree(root: Path, dirs: int, files: int):
+    for d in range(dirs):
+        sub = root / f"pkg{d % 10}" / f"module{d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for f in range(files):
+            ext = (".py", ".txt", ".json", "")[f % 4]
+            (sub / f"file{f}{ext}").write_text("x" * (f * 7 % 500))
+    # Сдвигаем mtime директорий в прошлое, иначе кэш считает их только что измененными
+    old = time.time() - 3600
+    for path in [root, *root.rglob("*")]:
+        if path.is_dir():
+            os.utime(path, (old, old))
+
+
+def best_of(func, root: Path, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(root)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8, help="потоки для параллельного обхода")
+    parser.add_argument("--root", type=Path, default=None, help="готовое дерево вместо синтетического")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.root
+        if root is None:
+            root = Path(tmp) / "project"
+            build_tree(root, args.dirs, args.files)
+        legacy = best_of(legacy_analyze_project_structure, root, args.repeat)
+        current = best_of(lambda r: analyze_project_structure(r, use_cache=False), root, args.repeat)
+        parallel = best_of(lambda r: analyze_project_structure(r, use_cache=False, workers=args.workers),
+                           root, args.repeat)
+        # Первый вызов с кэшем заполняет его, дальше меряем теплый старт
+        analyze_project_structure(root)
+        warm = best_of(analyze_project_structure, root, args.repeat)
+
+    print(f"legacy (iterdir + 2x rglob): {legacy * 1000:8.1f} ms")
+    print(f"scandir single pass:         {current * 1000:8.1f} ms")
+    print(f"speedup:                     {legacy / current:8.2f}x")
+    print(f"thread pool ({args.workers:2d} workers):   {parallel * 1000:8.1f} ms")
+    print(f"speedup:                     {legacy / parallel:8.2f}x")
+    print(f"warm start (mtime cache):    {warm * 1000:8.1f} ms")
+    print(f"speedup:                     {legacy / warm:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
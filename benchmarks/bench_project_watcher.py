@@ -0,0 +1,97 @@
+"""Обновление индекса и описания проекта: обход диска перед каждым поиском против ProjectWatcher.
+
+На синтетическом дереве меняются --changed файлов, после чего замеряется:
+- задержка от записи до пачки изменений у наблюдателя (inotify или опрос);
+- TrigramIndex.update() с обходом проекта (mtime-кэш сканера) и update(versions=...) от наблюдателя;
+- то же без изменений - так выглядит каждый поиск, пока пользователь ничего не трогает;
+- описание проекта: summarize_project_structure() против summarize_scan(watcher.snapshot()).
+
+Запуск: python benchmarks/bench_project_watcher.py [--dirs 200] [--files 50] [--changed 5]
+        [--rounds 5] [--backend auto|inotify|poll]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "Agent"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_project_scan import build_tree  # noqa: E402
+from project_summary import summarize_project_structure, summarize_scan  # noqa: E402
+from project_watcher import ProjectWatcher  # noqa: E402
+from trigram_index import TrigramIndex  # noqa: E402
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--changed", type=int, default=5, help="файлов меняется за раунд")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--backend", default="auto", choices=("auto", "inotify", "poll"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        build_tree(root, args.dirs, args.files)
+        watcher = ProjectWatcher(root, backend=args.backend, poll_interval=0.1).start()
+        start = time.perf_counter()
+        watcher.wait_ready()
+        print(f"первый обход наблюдателя: {(time.perf_counter() - start) * 1000:.0f} ms, {watcher.stats()}")
+
+        full_index = TrigramIndex(root, index_path=Path(tmp) / "full.sqlite")
+        watched_index = TrigramIndex(root, index_path=Path(tmp) / "watched.sqlite")
+        full_index.update()
+        watched_index.update()
+        summarize_project_structure(root)
+
+        latency, full, watched, full_idle, watched_idle, summary_full, summary_watched = [], [], [], [], [], [], []
+        for round_no in range(args.rounds):
+            generation = watcher.generation
+            written = time.perf_counter()
+            for i in range(args.changed):
+                (root / f"pkg{i % 10}" / f"module{i}" / "file1.py").write_text(f"changed = {round_no}\n")
+            while watcher.generation == generation:
+                time.sleep(0.001)
+            latency.append((time.perf_counter() - written) * 1000)
+            # Наблюдатель мог отдать первую пачку раньше, чем пришли события о всех файлах
+            time.sleep(max(watcher.debounce, 0.2 if watcher.live else watcher.poll_interval * 2))
+
+            full.append(timed(full_index.update))
+            versions = watcher.versions()
+            if versions is None:
+                # Опрос не дает точных версий: индекс все равно обходит проект
+                watched.append(timed(watched_index.update))
+            else:
+                watched.append(timed(lambda: watched_index.update(versions=versions)))
+            full_idle.append(timed(full_index.update))
+            # Без изменений поколение то же, и agent.refresh_index индекс вообще не трогает
+            watched_idle.append(0.0 if watcher.live else timed(watched_index.update))
+            summary_full.append(timed(lambda: summarize_project_structure(root)))
+            summary_watched.append(timed(lambda: summarize_scan(watcher.snapshot())))
+        backend = watcher.stats()["backend"]
+        watcher.stop()
+        full_index.close()
+        watched_index.close()
+
+    print(f"наблюдатель: {backend}, версии от наблюдателя: {'да' if versions else 'нет'}")
+    print(f"задержка события:               {statistics.median(latency):8.1f} ms")
+    print(f"{'':<32}{'обход':>10}{'наблюдатель':>14}")
+    for title, left, right in (("индекс после изменений", full, watched),
+                               ("индекс без изменений", full_idle, watched_idle),
+                               ("описание проекта", summary_full, summary_watched)):
+        print(f"{title:<32}{statistics.median(left):>8.1f} ms{statistics.median(right):>11.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
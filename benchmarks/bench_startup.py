@@ -0,0 +1,146 @@
+"""Время запуска CLI агента: импорты по -X importtime и время до приглашения ввода.
+
+1. python -X importtime -c "import agent" - что стоит на пути к приглашению, и то же
+   с agent.load_runtime() - что CLI загружает в фоне (LangChain, LangGraph, клиент модели, граф).
+   Выводятся суммы и самые дорогие модули верхнего уровня.
+2. Agent/agent.py на синтетическом проекте и фейковом сервере модели: время до приглашения
+   "You:" и до ответа на первый запрос, отправленный через --think секунд после приглашения
+   (0 - пользователь отправил запрос мгновенно и ждет фоновую загрузку целиком).
+
+Запуск: python benchmarks/bench_startup.py [--dirs 200] [--files 50] [--root PATH] [--repeat 3]
+        [--think 0 2] [--top 8]
+"""
+import argparse
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+AGENT_DIR = BENCH_DIR.parent / "Agent"
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_project_scan import build_tree  # noqa: E402
+from fake_llm_server import FakeLLMServer  # noqa: E402
+
+PROMPT_MARKER = b"You:"
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """Модули верхнего уровня и их суммарное время импорта в мкс; вместо самого agent - его прямые импорты"""
+    modules, children = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Вложенные импорты сдвинуты вправо на два пробела за уровень; дочерние печатаются раньше родителя
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children.append((f"agent > {name.strip()}", int(cumulative)))
+        elif level == 0:
+            if name.strip() == "agent":
+                own = int(cumulative) - sum(us for _, us in children)
+                modules.extend(children + [("agent (сам модуль)", own)])
+            else:
+                modules.append((name.strip(), int(cumulative)))
+            children = []
+    return modules
+
+
+def measure_imports(code: str, cwd: Path, env: Dict[str, str], repeat: int) -> Tuple[float, List[Tuple[str, int]]]:
+    """Медиана суммарного времени импортов (мс) и модули последнего запуска"""
+    totals, modules = [], []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True)
+        modules = parse_importtime(result.stderr)
+        totals.append(sum(us for _, us in modules) / 1000)
+    return statistics.median(totals), modules
+
+
+def read_until(proc: subprocess.Popen, output: bytearray, count: int, timeout: float = 120.0):
+    """Читает stdout процесса, пока приглашение не встретится count раз"""
+    deadline = time.monotonic() + timeout
+    fd = proc.stdout.fileno()
+    while output.count(PROMPT_MARKER) < count:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or proc.poll() is not None:
+            raise RuntimeError(f"agent.py не дошел до приглашения:\n{output.decode(errors='replace')}")
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if ready:
+            output.extend(os.read(fd, 65536))
+
+
+def run_cli(cwd: Path, env: Dict[str, str], think: float) -> Tuple[float, float]:
+    """(до приглашения, до ответа на первый запрос от момента отправки) в секундах"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, str(AGENT_DIR / "agent.py")], cwd=cwd, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = bytearray()
+    try:
+        read_until(proc, output, 1)
+        to_prompt = time.perf_counter() - start
+        time.sleep(think)
+        sent = time.perf_counter()
+        proc.stdin.write("Привет\n".encode("utf-8"))
+        proc.stdin.flush()
+        read_until(proc, output, 2)
+        first_reply = time.perf_counter() - sent
+        proc.stdin.close()
+        proc.wait(timeout=30)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    return to_prompt, first_reply
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--root", type=Path, default=None, help="готовое дерево вместо синтетического")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--think", type=float, nargs="+", default=[0.0, 2.0],
+                        help="пауза между приглашением и первым запросом, s")
+    parser.add_argument("--top", type=int, default=8, help="сколько самых дорогих модулей показать")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer() as server:
+        root = args.root
+        if root is None:
+            root = Path(tmp) / "project"
+            build_tree(root, args.dirs, args.files)
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(AGENT_DIR),
+            "PYTHONUNBUFFERED": "1",
+            "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY", "bench"),
+            "AGENT_LLM_BASE_URL": server.base_url,
+            "AGENT_STREAM": "0",
+            "AGENT_CHECKPOINT_DB": str(Path(tmp) / "checkpoints.sqlite"),
+            "AGENT_SPANS_FILE": "0",
+        }
+        # Первый запуск компилирует .pyc и прогревает кэши ФС
+        measure_imports("import agent", root, env, 1)
+
+        for title, code in (("import agent", "import agent"),
+                            ("import agent + load_runtime()", "import agent; agent.load_runtime()")):
+            total_ms, modules = measure_imports(code, root, env, args.repeat)
+            print(f"{title}: {total_ms:.0f} ms (-X importtime, медиана {args.repeat})")
+            for name, us in sorted(modules, key=lambda m: -m[1])[:args.top]:
+                print(f"    {name:<40}{us / 1000:>8.1f} ms")
+
+        print(f"\n{'пауза, s':>9}{'до приглашения, ms':>21}{'первый ответ, ms':>19}")
+        for think in args.think:
+            runs = [run_cli(root, env, think) for _ in range(args.repeat)]
+            print(f"{think:>9.1f}{statistics.median(r[0] for r in runs) * 1000:>21.0f}"
+                  f"{statistics.median(r[1] for r in runs) * 1000:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Построение таблицы символов проекта, повторное обновление и время find_symbol/outline.
+
+Для сравнения показан объем, который пришлось бы прочитать без индекса: весь файл
+с определением против его диапазона строк.
+
+Запуск: python benchmarks/bench_symbol_index.py [--root путь] [--name read_file_range ...] [--workers 4]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from symbol_index import SymbolIndex  # noqa: E402
+
+DEFAULT_NAMES = ["read_file_range", "CodeSearchIndex.search", "ContextWindow.fit", "collect_tree"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=Path, default=Path(__file__).resolve().parent.parent)
+    parser.add_argument("--name", nargs="+", default=DEFAULT_NAMES)
+    parser.add_argument("--workers", type=int, default=0, help="процессы для разбора (0 - по числу ядер)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SymbolIndex(args.root, index_path=Path(tmp) / "symbol_index.sqlite", workers=args.workers or None)
+        start = time.perf_counter()
+        stats = index.update()
+        print(f"построение: {stats['files']} Python-файлов за {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        index.update()
+        print(f"обновление без изменений: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        print(f"{'имя':<28}{'find, ms':>10}{'outline, ms':>13}{'файл, Б':>10}{'диапазон, Б':>13}")
+        for name in args.name:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = index.find(name)
+                timings.append(time.perf_counter() - start)
+            if not result["definitions"]:
+                print(f"{name:<28}{statistics.median(timings) * 1000:>10.2f}  не найдено")
+                continue
+            best = result["definitions"][0]
+            start = time.perf_counter()
+            index.outline(best["path"])
+            outline_ms = (time.perf_counter() - start) * 1000
+            lines = (args.root / best["path"]).read_text(encoding="utf-8").splitlines(keepends=True)
+            ranged = "".join(lines[best["start_line"] - 1:best["end_line"]])
+            print(f"{name:<28}{statistics.median(timings) * 1000:>10.2f}{outline_ms:>13.2f}"
+                  f"{len(''.join(lines).encode()):>10}{len(ranged.encode()):>13}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
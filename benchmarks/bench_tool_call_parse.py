@@ -0,0 +1,82 @@
+"""Сравнение старого разбора ответа (repair_json + json.loads на каждом ответе)
+с инкрементальным ToolCallStream на больших ответах.
+
+Запуск: python benchmarks/bench_tool_call_parse.py [--size 200000] [--repeat 20]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from tool_call_stream import ToolCallStream, parse_tool_calls  # noqa: E402
+
+try:
+    from json_repair import repair_json
+except ImportError:
+    repair_json = None
+
+
+def legacy_parse(content: str):
+    """Путь из старого call_model"""
+    fixed_content = repair_json(content)
+    if not fixed_content.strip():
+        return None
+    try:
+        parsed = json.loads(fixed_content)
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def make_responses(size: int):
+    sentence = "Функция scan_project обходит дерево один раз и собирает статистику. "
+    prose = sentence * (size // len(sentence))
+    body = "def f():\n    return \"value\"\n" * (size // 60)
+    calls = json.dumps([
+        {"id": "call_1", "type": "function",
+         "function": {"name": "edit_file", "arguments": {"path": "a.py", "old_str": "", "new_str": body}}},
+        {"id": "call_2", "type": "function",
+         "function": {"name": "read_file", "arguments": {"filename": "b.py"}}},
+    ])
+    return {"prose": prose, "tool calls": calls, "truncated calls": calls[: len(calls) // 2]}
+
+
+def best_of(func, content: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def streamed(content: str, chunk: int = 16):
+    stream = ToolCallStream()
+    for i in range(0, len(content), chunk):
+        stream.feed(content[i:i + chunk])
+    return stream.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if repair_json is None:
+        print("json_repair не установлен - старый путь не измеряется")
+    print(f"{'ответ':<18}{'legacy, ms':>12}{'parser, ms':>12}{'stream, ms':>12}")
+    for name, content in make_responses(args.size).items():
+        if name == "truncated calls" and repair_json is None:
+            continue
+        current = best_of(parse_tool_calls, content, args.repeat)
+        stream = best_of(streamed, content, args.repeat)
+        legacy = best_of(legacy_parse, content, args.repeat) if repair_json else float("nan")
+        print(f"{name:<18}{legacy * 1000:>12.2f}{current * 1000:>12.2f}{stream * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Векторный индекс: построение в одном процессе и в пуле процессов, время top-k запроса.
+
+Запуск: python benchmarks/bench_vector_index.py [--root путь] [--workers 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
+
+from vector_index import VectorIndex  # noqa: E402
+
+DEFAULT_QUERIES = ["walk the project tree and skip ignored directories",
+                   "replace text in a file without losing data on crash",
+                   "parse tool calls from a streamed model response"]
+
+
+def build(root: Path, workers: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(root, index_dir=Path(tmp), workers=workers)
+        start = time.perf_counter()
+        index.update()
+        elapsed = time.perf_counter() - start
+        index.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=Path, default=Path(__file__).resolve().parent.parent)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--query", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"построение, 1 процесс: {build(args.root, 1):.2f} s")
+    if args.workers > 1:
+        print(f"построение, {args.workers} процессов: {build(args.root, args.workers):.2f} s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(args.root, index_dir=Path(tmp), workers=args.workers)
+        index.update()
+        print(f"фрагментов: {int(index._valid.sum())}")
+        for query in args.query:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = index.query(query)
+                timings.append(time.perf_counter() - start)
+            top = f"{results[0]['path']}:{results[0]['start_line']}" if results else "-"
+            print(f"медиана {statistics.median(timings) * 1000:6.2f} ms  {top:<40} {query}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Локальный OpenAI-совместимый сервер, который отвечает по сценарию вместо модели.
+
+Отвечает на POST .../chat/completions обычным JSON или потоком SSE (stream=true),
+с задержкой до первого токена и между кусками ответа. Ответ выбирается по последнему
+сообщению пользователя и номеру шага в текущем ходе, поэтому один сервер обслуживает
+сколько угодно параллельных сессий. Вызовы инструментов возвращаются текстом - JSON-массивом,
+который разбирает call_model.
+
+Запуск для ручной проверки агента без сети:
+    python benchmarks/fake_llm_server.py --port 8765 --latency 0.2 [--script script.json]
+    AGENT_LLM_BASE_URL=http://127.0.0.1:8765/v1 OPENROUTER_API_KEY=fake python Agent/agent.py
+
+script.json: {"текст запроса пользователя": [ответ шага 1, ответ шага 2, ...]}, где ответ -
+строка или список вызовов [{"name": "read_file", "arguments": {"filename": "a.py"}}].
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+DEFAULT_REPLY = "Готово."
+
+# Ответ шага: текст или список вызовов {"name": ..., "arguments": {...}}
+ScriptStep = Union[str, List[Dict[str, Any]]]
+Responder = Callable[[Dict[str, Any]], str]
+
+
+def tool_calls(*calls: Dict[str, Any]) -> str:
+    """Ответ модели с вызовами инструментов в формате, который понимает call_model"""
+    return json.dumps([
+        {"id": f"call_{i}", "type": "function",
+         "function": {"name": call["name"], "arguments": call.get("arguments", {})}}
+        for i, call in enumerate(calls, 1)
+    ], ensure_ascii=False)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+class ScriptedResponder:
+    """Выбирает ответ по тексту последнего запроса пользователя и числу ответов модели после него.
+
+    Шаги хода после конца сценария (и запросы не из сценария) получают default.
+    """
+
+    def __init__(self, script: Dict[str, Sequence[ScriptStep]], default: str = DEFAULT_REPLY):
+        self.script = {
+            prompt: [step if isinstance(step, str) else tool_calls(*step) for step in steps]
+            for prompt, steps in script.items()
+        }
+        self.default = default
+
+    def __call__(self, body: Dict[str, Any]) -> str:
+        messages = body.get("messages") or []
+        step = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                steps = self.script.get(message_text(message).strip(), ())
+                return steps[step] if step < len(steps) else self.default
+            if message.get("role") == "assistant":
+                step += 1
+        return self.default
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл keep-alive соединение из своего пула - для фейковой модели это норма
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeLLMServer:
+    """ThreadingHTTPServer с ответами от responder; base_url подставляется в ChatOpenAI"""
+
+    def __init__(self, responder: Optional[Responder] = None, latency: float = 0.0,
+                 chunk_chars: int = 16, chunk_delay: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.responder = responder or (lambda body: DEFAULT_REPLY)
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.bytes_received = 0
+        self._stats_lock = threading.Lock()
+        self._server = _QuietServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Обслуживает запросы в текущем потоке до KeyboardInterrupt"""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, size: int):
+        with self._stats_lock:
+            self.requests += 1
+            self.bytes_received += size
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят разными send: без этого задержанный ACK добавляет ~40 ms к ответу
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._count(len(raw))
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                body = json.loads(raw)
+                content = server.responder(body)
+                usage = {
+                    "prompt_tokens": sum(estimate_tokens(message_text(m)) for m in body.get("messages") or []),
+                    "completion_tokens": estimate_tokens(content),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                time.sleep(server.latency)
+                if body.get("stream"):
+                    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+                    self._send_stream(body.get("model", ""), content, usage if include_usage else None)
+                else:
+                    self._send_json(200, {
+                        "id": "fake", "object": "chat.completion", "created": int(time.time()),
+                        "model": body.get("model", ""),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, content: str, usage: Optional[Dict[str, int]]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(choices: List[Dict[str, Any]], **extra: Any):
+                    chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": choices, **extra}
+                    self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+
+                def delta(value: Dict[str, Any], finish_reason: Optional[str] = None):
+                    event([{"index": 0, "delta": value, "finish_reason": finish_reason}])
+
+                delta({"role": "assistant", "content": ""})
+                for i in range(0, len(content), server.chunk_chars):
+                    if i and server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                    delta({"content": content[i:i + server.chunk_chars]})
+                delta({}, "stop")
+                if usage is not None:
+                    event([], usage=usage)
+                self._write_chunk("data: [DONE]\n\n")
+                # Пустой кусок завершает chunked-ответ
+                self._write_chunk("")
+
+            def _write_chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка до первого токена, s")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="задержка между кусками потока, s")
+    parser.add_argument("--script", help="JSON-файл {запрос пользователя: [ответы по шагам]}")
+    args = parser.parse_args()
+
+    script = {}
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    server = FakeLLMServer(ScriptedResponder(script), latency=args.latency, chunk_delay=args.chunk_delay,
+                           host=args.host, port=args.port)
+    print(f"fake LLM: {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули агента лежат плоско в Agent/ и импортируются по имени, как в benchmarks/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Agent"))
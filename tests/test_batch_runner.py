@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from batch_runner import load_tasks, read_results
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return path
+
+
+def test_load_tasks(tmp_path):
+    path = write_lines(tmp_path / "tasks.jsonl", [
+        json.dumps({"id": "a", "prompt": "Прочитай a.py"}),
+        "",
+        json.dumps({"prompts": ["Шаг 1", "Шаг 2"]}),
+    ])
+    tasks = load_tasks(path)
+    assert [(t.id, t.prompts) for t in tasks] == [("a", ["Прочитай a.py"]), ("line-3", ["Шаг 1", "Шаг 2"])]
+
+
+@pytest.mark.parametrize("line, message", [
+    ("{не json", "не JSON"),
+    ('"просто строка"', "объектом JSON"),
+    ("[1, 2]", "объектом JSON"),
+    ("42", "объектом JSON"),
+    ('{"id": "x"}', "prompt"),
+    ('{"prompts": "не список"}', "prompt"),
+    ('{"prompts": ["ok", ""]}', "prompt"),
+])
+def test_load_tasks_reports_bad_line(tmp_path, line, message):
+    path = write_lines(tmp_path / "tasks.jsonl", [json.dumps({"id": "ok", "prompt": "p"}), line])
+    with pytest.raises(ValueError, match=rf":2: .*{message}"):
+        load_tasks(path)
+
+
+def test_load_tasks_rejects_duplicate_ids(tmp_path):
+    path = write_lines(tmp_path / "tasks.jsonl", [json.dumps({"id": "a", "prompt": "p"})] * 2)
+    with pytest.raises(ValueError, match=":2: id 'a'"):
+        load_tasks(path)
+
+
+def test_read_results_keeps_last_record_and_skips_torn_line(tmp_path):
+    path = write_lines(tmp_path / "results.jsonl", [
+        json.dumps({"id": "a", "status": "error"}),
+        json.dumps({"id": "a", "status": "ok"}),
+        '{"id": "b", "sta',
+    ])
+    assert read_results(path) == {"a": {"id": "a", "status": "ok"}}
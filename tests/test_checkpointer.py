@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, MessagesState, StateGraph
+
+from checkpointer import SqliteCheckpointSaver
+
+
+def build_app(saver):
+    # Форма графа агента без сети: вызов инструмента на запрос, затем ответ
+    def agent(state: MessagesState):
+        last = state["messages"][-1]
+        if isinstance(last, HumanMessage):
+            return {"messages": [AIMessage(content="", tool_calls=[
+                {"name": "read_file", "args": {"filename": last.content}, "id": "call_1", "type": "tool_call"}])]}
+        return {"messages": [AIMessage(content=f"прочитан {last.content[:20]}")]}
+
+    def tools(state: MessagesState):
+        call = state["messages"][-1].tool_calls[0]
+        return {"messages": [ToolMessage(content=f"{call['args']['filename']}: " + "x" * 2000,
+                                         tool_call_id=call["id"], name=call["name"])]}
+
+    workflow = StateGraph(state_schema=MessagesState)
+    workflow.add_node("agent", agent)
+    workflow.add_node("tools", tools)
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges("agent", lambda s: "tools" if s["messages"][-1].tool_calls else END,
+                                   {"tools": "tools", END: END})
+    workflow.add_edge("tools", "agent")
+    return workflow.compile(checkpointer=saver)
+
+
+def config(thread_id="t1"):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def contents(messages):
+    return [(type(m).__name__, m.content) for m in messages]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "checkpoints.sqlite"
+
+
+def test_round_trip_after_reopen(db):
+    saver = SqliteCheckpointSaver(db)
+    app = build_app(saver)
+    for name in ("a.py", "b.py", "c.py"):
+        app.invoke({"messages": [HumanMessage(content=name)]}, config())
+    expected = app.get_state(config()).values["messages"]
+    assert len(expected) == 12
+    saver.close()
+
+    saver = SqliteCheckpointSaver(db)
+    restored = build_app(saver).get_state(config()).values["messages"]
+    assert contents(restored) == contents(expected)
+    assert [m.id for m in restored] == [m.id for m in expected]
+    assert saver.latest_thread() == "t1"
+    saver.close()
+
+
+def test_every_checkpoint_restores_its_own_history(db):
+    saver = SqliteCheckpointSaver(db)
+    app = build_app(saver)
+    for name in ("a.py", "b.py"):
+        app.invoke({"messages": [HumanMessage(content=name)]}, config())
+    history = list(app.get_state_history(config()))
+    # Каждый снимок хранит историю своей длины, а не последнюю
+    for snapshot in history:
+        restored = app.get_state(snapshot.config).values.get("messages", [])
+        assert contents(restored) == contents(snapshot.values.get("messages", []))
+    saver.close()
+
+
+def test_branch_from_earlier_checkpoint(db):
+    saver = SqliteCheckpointSaver(db)
+    app = build_app(saver)
+    app.invoke({"messages": [HumanMessage(content="a.py")]}, config())
+    after_first = app.get_state(config())
+    app.invoke({"messages": [HumanMessage(content="b.py")]}, config())
+    before_branch = app.get_state(config())
+
+    app.invoke({"messages": [HumanMessage(content="other.py")]}, after_first.config)
+    branch = app.get_state(config()).values["messages"]
+    assert [m.content for m in branch if isinstance(m, HumanMessage)] == ["a.py", "other.py"]
+    # Старая ветка не испорчена записью новой
+    old = app.get_state(before_branch.config).values["messages"]
+    assert [m.content for m in old if isinstance(m, HumanMessage)] == ["a.py", "b.py"]
+    assert contents(old) == contents(before_branch.values["messages"])
+    saver.close()
+
+
+def test_threads_are_separate_and_deletable(db):
+    saver = SqliteCheckpointSaver(db)
+    app = build_app(saver)
+    app.invoke({"messages": [HumanMessage(content="a.py")]}, config("t1"))
+    app.invoke({"messages": [HumanMessage(content="b.py")]}, config("t2"))
+    assert app.get_state(config("t1")).values["messages"][0].content == "a.py"
+    saver.delete_thread("t2")
+    assert saver.get_tuple(config("t2")) is None
+    assert saver.get_tuple(config("t1")) is not None
+    saver.close()
+
+
+def test_async_methods(db):
+    saver = SqliteCheckpointSaver(db)
+    app = build_app(saver)
+
+    async def run():
+        await app.ainvoke({"messages": [HumanMessage(content="a.py")]}, config())
+        state = await app.aget_state(config())
+        return state.values["messages"]
+
+    messages = asyncio.run(run())
+    assert contents(messages) == contents(app.get_state(config()).values["messages"])
+    saver.close()
@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+import context_window
+from context_window import SUMMARY_HEADER, ContextWindow
+
+
+def history(turns):
+    messages = [SystemMessage(content="system prompt " * 50, id="sys")]
+    for i in range(turns):
+        messages += [HumanMessage(content=f"question {i} " * 20, id=f"h{i}"),
+                     AIMessage(content=f"answer {i} " * 40, id=f"a{i}")]
+    return messages
+
+
+def test_small_history_is_unchanged():
+    messages = history(2)
+    assert ContextWindow(token_budget=100_000).fit(messages) == messages
+
+
+def test_long_history_fits_budget_with_summary():
+    messages = history(100)
+    window = ContextWindow(token_budget=3000, keep_turns=3)
+    view = window.fit(messages)
+    assert window.total(view) <= 3000
+    assert view[0].content.startswith(messages[0].content)
+    assert SUMMARY_HEADER in view[0].content
+    # Последние ходы идут без изменений
+    assert view[-6:] == messages[-6:]
+
+
+def test_summary_tokens_are_not_recounted(monkeypatch):
+    counted = []
+    count_tokens = context_window.count_tokens
+    monkeypatch.setattr(context_window, "count_tokens", lambda text: counted.append(len(text)) or count_tokens(text))
+    messages = history(120)
+    ContextWindow(token_budget=3000, keep_turns=3).fit(messages)
+    # Каждое сообщение и каждая строка сводки считаются по разу, а не на каждом шаге свертки
+    assert sum(counted) < 3 * sum(len(m.content) for m in messages)
+
+
+def test_old_tool_results_are_elided_before_summarizing():
+    messages = [SystemMessage(content="sys", id="sys"), HumanMessage(content="read", id="h0"),
+                AIMessage(content="", id="a0", tool_calls=[{"name": "read_file", "args": {"filename": "a.py"},
+                                                              "id": "c0"}]),
+                ToolMessage(content="x = 1\n" * 500, tool_call_id="c0", name="read_file", id="t0"),
+                AIMessage(content="done", id="a1")]
+    messages += history(3)[1:]
+    view = ContextWindow(token_budget=900, keep_turns=3).fit(messages)
+    elided = [m for m in view if isinstance(m, ToolMessage)]
+    assert elided and elided[0].content.startswith("[elided: read_file result")
@@ -0,0 +1,91 @@
+import os
+import stat
+
+from file_editor import EditJournal, atomic_write, edit_files
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_atomic_write_new_file_uses_umask(tmp_path):
+    atomic_write(tmp_path / "new.txt", "text")
+    assert (tmp_path / "new.txt").read_text() == "text"
+    # Маска читается при импорте модуля, сравниваем с тем, что дал бы обычный open()
+    (tmp_path / "plain.txt").write_text("text")
+    assert mode(tmp_path / "new.txt") == mode(tmp_path / "plain.txt")
+
+
+def test_atomic_write_keeps_existing_mode(tmp_path):
+    path = tmp_path / "script.sh"
+    path.write_text("old")
+    os.chmod(path, 0o750)
+    atomic_write(path, "new")
+    assert path.read_text() == "new"
+    assert mode(path) == 0o750
+
+
+def test_atomic_write_through_symlink(tmp_path):
+    target = tmp_path / "real.txt"
+    target.write_text("old")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target.name)
+    atomic_write(link, "new")
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    atomic_write(tmp_path / "a.txt", "a")
+    atomic_write(tmp_path / "a.txt", "b")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.txt"]
+
+
+def test_edit_files_applies_all_or_nothing(tmp_path):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("x = 1\n")
+    b.write_text("y = 2\n")
+    journal_dir = tmp_path / "journal"
+
+    result = edit_files([(a, "x = 1", "x = 10"), (b, "missing", "y = 20")], journal_dir)
+    assert result["applied"] is False
+    assert result["action"] == "old_str not found"
+    assert a.read_text() == "x = 1\n"
+
+    result = edit_files([(a, "x = 1", "x = 10"), (b, "y = 2", "y = 20"), (a, "x = 10", "x = 11")], journal_dir)
+    assert result["applied"] is True
+    assert a.read_text() == "x = 11\n"
+    assert b.read_text() == "y = 20\n"
+    assert list(journal_dir.glob("*.journal")) == []
+
+
+def test_recover_rolls_back_abandoned_journal(tmp_path):
+    existing, created = tmp_path / "a.py", tmp_path / "new.py"
+    existing.write_text("original\n")
+    journal_dir = tmp_path / "journal"
+    journal = EditJournal(journal_dir)
+    journal.begin([(existing, "original\n"), (created, None)])
+    existing.write_text("half-written")
+    created.write_text("new")
+    # Процесс "упал": блокировка снята, журнал остался на диске
+    os.close(journal._fd)
+    journal._fd = None
+
+    restored = EditJournal.recover(journal_dir)
+    assert sorted(restored) == sorted([str(existing), str(created)])
+    assert existing.read_text() == "original\n"
+    assert not created.exists()
+    assert list(journal_dir.glob("*.journal")) == []
+
+
+def test_recover_skips_journal_of_live_owner(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("original\n")
+    journal_dir = tmp_path / "journal"
+    journal = EditJournal(journal_dir)
+    journal.begin([(path, "original\n")])
+    path.write_text("in progress\n")
+    # flock привязан к открытому файлу: второй дескриптор того же процесса его не получит
+    assert EditJournal.recover(journal_dir) == []
+    assert path.read_text() == "in progress\n"
+    journal.commit()
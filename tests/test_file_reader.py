@@ -0,0 +1,81 @@
+import pytest
+
+from file_cache import FileContentCache
+from file_reader import read_file_range
+
+
+@pytest.fixture(params=["cache", "mmap"])
+def cache(request):
+    # Одни и те же срезы должны получаться и из кэша, и через mmap
+    return FileContentCache() if request.param == "cache" else None
+
+
+def lines(n):
+    return "".join(f"line {i}\n" for i in range(1, n + 1))
+
+
+def test_full_read_small_file(tmp_path, cache):
+    path = tmp_path / "a.txt"
+    path.write_text(lines(3))
+    result = read_file_range(path, cache=cache)
+    assert result["content"] == lines(3)
+    assert "truncated" not in result
+
+
+def test_line_range(tmp_path, cache):
+    path = tmp_path / "a.txt"
+    path.write_text(lines(10))
+    result = read_file_range(path, start_line=3, end_line=4, cache=cache)
+    assert result["content"] == "line 3\nline 4\n"
+    assert (result["start_line"], result["end_line"]) == (3, 4)
+    assert "truncated" not in result
+
+
+def test_line_range_past_end(tmp_path, cache):
+    path = tmp_path / "a.txt"
+    path.write_text(lines(2))
+    result = read_file_range(path, start_line=5, cache=cache)
+    assert result["content"] == ""
+
+
+def test_line_range_respects_limit_and_continues(tmp_path, cache):
+    path = tmp_path / "a.txt"
+    path.write_text(lines(100))
+    result = read_file_range(path, start_line=1, limit=50, cache=cache)
+    assert len(result["content"].encode()) <= 50
+    assert result["truncated"] is True
+    rest = read_file_range(path, start_line=result["next_line"], limit=10_000, cache=cache)
+    assert result["content"] + rest["content"] == lines(100)
+
+
+def test_first_line_longer_than_limit_is_cut(tmp_path, cache):
+    path = tmp_path / "one_line.txt"
+    path.write_text("x" * 1000 + "\nnext\n")
+    result = read_file_range(path, start_line=1, limit=100, cache=cache)
+    assert result["content"] == "x" * 100
+    assert result["truncated"] is True
+    assert result["next_offset"] == 100
+    rest = read_file_range(path, offset=result["next_offset"], limit=10_000, cache=cache)
+    assert result["content"] + rest["content"] == "x" * 1000 + "\nnext\n"
+
+
+def test_byte_range(tmp_path, cache):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"0123456789")
+    result = read_file_range(path, offset=2, length=3, cache=cache)
+    assert result["content"] == "234"
+    assert "truncated" not in result
+    result = read_file_range(path, offset=2, limit=4, cache=cache)
+    assert result["content"] == "2345"
+    assert result["next_offset"] == 6
+
+
+def test_large_full_read_returns_head_and_tail(tmp_path, cache):
+    path = tmp_path / "big.txt"
+    path.write_text(lines(1000))
+    result = read_file_range(path, limit=200, cache=cache)
+    assert result["truncated"] is True
+    assert result["content"].startswith("line 1\n")
+    assert result["content"].endswith("line 1000\n")
+    assert len(result["content"]) < 400
+    assert f"offset={result['next_offset']}" in result["content"]
@@ -0,0 +1,35 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from payload_store import MIN_DEDUP_CHARS, PayloadStore, reference_target
+
+BIG = "x" * (MIN_DEDUP_CHARS * 2)
+
+
+def step(call_id, message_id, content):
+    return [
+        AIMessage(content="", tool_calls=[{"name": "read_file", "args": {}, "id": call_id}]),
+        ToolMessage(content=content, tool_call_id=call_id, name="read_file", id=message_id),
+    ]
+
+
+def test_repeated_result_references_original_message():
+    # Модель повторяет id вызова, ссылка должна вести на сообщение, а не на call_1
+    messages = [HumanMessage(content="q"), *step("call_1", "t1", BIG), *step("call_1", "t2", BIG)]
+    [replacement] = PayloadStore().dedupe(messages)
+    assert replacement.id == "t2"
+    assert reference_target(replacement) == "t1"
+
+
+def test_short_and_different_results_are_kept():
+    messages = [HumanMessage(content="q"), *step("a", "t1", "short"), *step("b", "t2", "short")]
+    assert PayloadStore().dedupe(messages) == []
+    messages = [HumanMessage(content="q"), *step("a", "t1", BIG), *step("b", "t2", BIG + "y")]
+    assert PayloadStore().dedupe(messages) == []
+
+
+def test_digest_cache_is_bounded():
+    store = PayloadStore(max_digests=5)
+    for i in range(50):
+        messages = [HumanMessage(content="q"), *step("c", f"a{i}", BIG), *step("c", f"b{i}", BIG)]
+        assert len(store.dedupe(messages)) == 1
+    assert len(store._digests) == 5
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from tool_call_stream import CALLS, PROSE, ToolCallStream, parse_tool_calls
+
+CALLS_JSON = json.dumps([
+    {"id": "call_1", "function": {"name": "read_file", "arguments": {"filename": "a.py"}}},
+    {"id": "call_2", "function": {"name": "grep", "arguments": {"pattern": '\\d+ "x" [a-z]{2}'}}},
+])
+
+
+def feed_in_chunks(text, size):
+    stream = ToolCallStream()
+    prose, completed = "", []
+    for i in range(0, len(text), size):
+        printed, done = stream.feed(text[i:i + size])
+        prose += printed
+        completed.extend(done)
+    return stream, prose, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize("text", [CALLS_JSON, f"```json\n{CALLS_JSON}\n```", f"  \n```\n{CALLS_JSON}\n```"])
+def test_calls_in_any_chunking(text, size):
+    stream, prose, completed = feed_in_chunks(text, size)
+    assert stream.mode == CALLS
+    assert prose == ""
+    # Каждый объект отдается сразу, как закрылась его скобка
+    assert completed == json.loads(CALLS_JSON)
+    assert stream.finish() == json.loads(CALLS_JSON)
+    assert stream.repaired is False
+
+
+@pytest.mark.parametrize("size", [1, 2, 1000])
+def test_prose_is_printed_as_it_arrives(size):
+    text = "Функция `read_file` читает файл.\nГотово."
+    stream, prose, completed = feed_in_chunks(text, size)
+    assert stream.mode == PROSE
+    assert prose == text
+    assert completed == []
+    assert stream.finish() is None
+
+
+def test_single_object_call():
+    call = {"id": "c", "function": {"name": "list_files", "arguments": {"path": "."}}}
+    assert parse_tool_calls(json.dumps(call)) == [call]
+
+
+def test_truncated_array_is_repaired():
+    stream = ToolCallStream()
+    stream.feed(CALLS_JSON[:-10])
+    calls = stream.finish()
+    assert stream.repaired is True
+    assert calls[0] == json.loads(CALLS_JSON)[0]
+
+
+def test_text_after_array_is_ignored():
+    assert parse_tool_calls(CALLS_JSON + "\nИ еще текст") == json.loads(CALLS_JSON)
+
+
+@pytest.mark.parametrize("size", [1, 1000])
+@pytest.mark.parametrize("text", [
+    f"Прочитаю файл.\n```json\n{CALLS_JSON}\n```",
+    f"Прочитаю файл: {CALLS_JSON}",
+    f"Прочитаю файл.\n```json\n{CALLS_JSON[:-10]}",
+])
+def test_calls_after_preface(text, size):
+    stream, prose, completed = feed_in_chunks(text, size)
+    # Вступление уже напечатано как текст, вызовы находит finish()
+    assert stream.mode == PROSE
+    assert prose == text
+    calls = stream.finish()
+    assert [c["function"]["name"] for c in calls] == ["read_file", "grep"]
+
+
+@pytest.mark.parametrize("text", [
+    "Список [1, 2, 3] и словарь {\"a\": 1} - это не вызовы.",
+    "Пример:\n```python\nconfig = {\"debug\": True}\n```",
+])
+def test_json_in_prose_is_not_a_call(text):
+    assert parse_tool_calls(text) is None
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.tools import tool
+
+from tool_runner import arun_tool_calls, plan_tool_calls, run_tool_calls
+
+events = []
+barrier = threading.Barrier(2, timeout=5)
+
+
+@tool
+def read_file(filename: str) -> str:
+    """Reads a file."""
+    if filename.startswith("parallel"):
+        # Оба чтения должны дойти сюда одновременно, иначе барьер сломается по таймауту
+        barrier.wait()
+    events.append(("read", filename))
+    return f"content of {filename}"
+
+
+@tool
+def edit_file(path: str, old_str: str, new_str: str) -> str:
+    """Edits a file."""
+    time.sleep(0.05)
+    events.append(("edit", path))
+    return f"edited {path}"
+
+
+TOOLS = [read_file, edit_file]
+
+
+def call(name, call_id, **args):
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+def resolve(path):
+    return f"/project/{path}"
+
+
+def setup_function():
+    events.clear()
+    barrier.reset()
+
+
+def test_independent_reads_run_in_parallel_and_keep_order():
+    calls = [call("read_file", "c1", filename="parallel_a.py"), call("read_file", "c2", filename="parallel_b.py")]
+    messages = run_tool_calls(calls, TOOLS, resolve, max_workers=4)
+    assert [m.tool_call_id for m in messages] == ["c1", "c2"]
+    assert [m.content for m in messages] == ["content of parallel_a.py", "content of parallel_b.py"]
+
+
+def test_write_waits_for_earlier_calls_on_same_path():
+    calls = [call("edit_file", "c1", path="a.py", old_str="1", new_str="2"),
+             call("read_file", "c2", filename="a.py"),
+             call("read_file", "c3", filename="b.py")]
+    planned = plan_tool_calls(calls, resolve)
+    assert [p.deps for p in planned] == [[], [0], []]
+    messages = run_tool_calls(calls, TOOLS, resolve, max_workers=4)
+    assert [m.tool_call_id for m in messages] == ["c1", "c2", "c3"]
+    assert events.index(("edit", "a.py")) < events.index(("read", "a.py"))
+
+
+def test_unknown_tool_is_a_barrier_and_an_error():
+    calls = [call("read_file", "c1", filename="a.py"), call("mystery", "c2"), call("read_file", "c3", filename="b.py")]
+    # Вызов после неизвестного инструмента ждет его, а тот - все более ранние
+    assert [p.deps for p in plan_tool_calls(calls, resolve)] == [[], [0], [1]]
+    messages = run_tool_calls(calls, TOOLS, resolve, max_workers=4)
+    assert messages[1].status == "error"
+    assert "not a valid tool" in messages[1].content
+
+
+def test_async_runner_follows_same_rules():
+    calls = [call("edit_file", "c1", path="a.py", old_str="1", new_str="2"),
+             call("read_file", "c2", filename="a.py"),
+             call("read_file", "c3", filename="parallel_x.py"),
+             call("read_file", "c4", filename="parallel_y.py")]
+    messages = asyncio.run(arun_tool_calls(calls, TOOLS, resolve, max_concurrency=4))
+    assert [m.tool_call_id for m in messages] == ["c1", "c2", "c3", "c4"]
+    assert events.index(("edit", "a.py")) < events.index(("read", "a.py"))
@@ -0,0 +1,131 @@
+import re
+
+import pytest
+
+from trigram_index import TrigramIndex, regex_trigram_query
+
+FILES = {
+    "pkg/parser.py": "import json\n\ndef parse_value(text):\n    return json.loads(text)\n",
+    "pkg/reader.py": "import os\n\ndef read_file(path):\n    with open(path) as f:\n        return f.read()\n",
+    "pkg/nested/writer.py": "def write_file(path, text):\n    open(path, 'w').write(text)  # TODO: atomic\n",
+    "docs/notes.md": "Parse errors are logged.\nFIXME: describe the reader.\n",
+    "main.py": "from pkg.parser import parse_value\nprint(parse_value('1'))\n",
+}
+
+PATTERNS = [
+    r"def \w+_file\(",
+    r"parse_value",
+    r"TODO|FIXME",
+    r"import (os|json)$",
+    r"(?:read|write)_file",
+    r"colou?r",
+    r"^\s+return",
+    r"\w+",
+    r"no_such_text_anywhere",
+]
+
+
+def brute_force(root, pattern, flags=0, prefix=""):
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    found = []
+    for rel in sorted(FILES):
+        if prefix and not rel.startswith(prefix + "/"):
+            continue
+        for line_no, line in enumerate((root / rel).read_text().split("\n"), 1):
+            if regex.search(line):
+                found.append((rel, line_no, line))
+    return found
+
+
+def as_tuples(result):
+    return [(m["path"], m["line"], m["text"]) for m in result["matches"]]
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    for rel, text in FILES.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_text(text)
+    index = TrigramIndex(root, index_path=tmp_path / "index.sqlite", workers=1)
+    index.update()
+    yield root, index
+    index.close()
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_grep_matches_brute_force(project, pattern):
+    root, index = project
+    result = index.grep(pattern, max_results=1000)
+    assert sorted(as_tuples(result)) == brute_force(root, pattern)
+
+
+@pytest.mark.parametrize("pattern", ["PARSE_VALUE", "fixme|todo"])
+def test_grep_ignore_case(project, pattern):
+    root, index = project
+    result = index.grep(pattern, ignore_case=True, max_results=1000)
+    assert sorted(as_tuples(result)) == brute_force(root, pattern, re.IGNORECASE)
+    assert result["matches"]
+
+
+def test_indexed_query_narrows_candidates(project):
+    _, index = project
+    assert regex_trigram_query(r"\w+") is None
+    result = index.grep("parse_value")
+    assert result["indexed"] is True
+    assert result["files_searched"] < len(FILES)
+
+
+def test_path_prefix(project):
+    root, index = project
+    result = index.grep(r"def ", path_prefix="pkg/nested", max_results=1000)
+    assert sorted(as_tuples(result)) == brute_force(root, r"def ", prefix="pkg/nested")
+
+
+def test_update_sees_changed_and_removed_files(project):
+    root, index = project
+    (root / "pkg/reader.py").write_text("def load_file(path):\n    pass\n")
+    (root / "main.py").unlink()
+    (root / "new.py").write_text("value = parse_value('2')\n")
+    stats = index.update()
+    assert stats["removed"] == 1
+    assert as_tuples(index.grep("read_file")) == []
+    assert [m["path"] for m in index.grep("parse_value")["matches"]] == ["new.py", "pkg/parser.py"]
+    assert as_tuples(index.grep("load_file")) == [("pkg/reader.py", 1, "def load_file(path):")]
+
+
+def test_max_results_truncates(project):
+    _, index = project
+    result = index.grep(r"\w+", max_results=3)
+    assert len(result["matches"]) == 3
+    assert result["truncated"] is True
+
+
+def test_file_over_size_limit_is_searched(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    (root / "big.log").write_text("filler line\n" * 2000 + "needle_here\n")
+    (root / "small.py").write_text("x = 1\n")
+    index = TrigramIndex(root, index_path=tmp_path / "index.sqlite", workers=1, max_file_bytes=1024)
+    index.update()
+    # Триграмм у большого файла нет, но он все равно кандидат и читается целиком
+    assert as_tuples(index.grep("needle_here")) == [("big.log", 2001, "needle_here")]
+    index.close()
+
+
+def test_process_pool_gives_same_results(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    for i in range(80):
+        (root / f"m{i:02}.py").write_text(f"import os\ndef f{i}(x):\n    return x + {i}\n")
+    serial = TrigramIndex(root, index_path=tmp_path / "serial.sqlite", workers=1)
+    pooled = TrigramIndex(root, index_path=tmp_path / "pooled.sqlite", workers=2)
+    try:
+        serial.update()
+        pooled.update()
+        for pattern in (r"return x \+ \d+", r"[a-z]+\(", "import os"):
+            expected = as_tuples(serial.grep(pattern, max_results=1000))
+            assert as_tuples(pooled.grep(pattern, max_results=1000)) == expected
+    finally:
+        serial.close()
+        pooled.close()